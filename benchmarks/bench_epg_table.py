@@ -0,0 +1,82 @@
+"""Фильтрация EPG: проход по списку словарей против масок колоночной таблицы.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_epg_table.py [--channels-dir data/epg_channels] [--copies 20] [--repeat 3]
+
+Программы всех каналов повторяются `--copies` раз (как отдельные каналы),
+чтобы измерение было на объёме, близком к полному прогону.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from epg_collector.epg_table import EPGTable  # noqa: E402
+from epg_collector.filters import (  # noqa: E402
+    extract_epg_items,
+    filter_movies_by_category,
+    filter_movies_epg,
+)
+from epg_collector.serialization import read_json  # noqa: E402
+
+MIN_DURATION = 80
+
+
+def best_of(repeat: int, fn: Callable[[], Any]) -> Tuple[float, Any]:
+    times, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return min(times), result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--channels-dir", type=Path, default=PROJECT_ROOT / "data" / "epg_channels")
+    parser.add_argument("--copies", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    channels: List[Tuple[str, List[Dict[str, Any]]]] = []
+    for p in sorted(args.channels_dir.glob("*.json")):
+        obj = read_json(p)
+        channels.append((str(obj.get("our_id") or p.stem), extract_epg_items(obj) or []))
+    channels = [(f"{cid}-{n}", items) for n in range(args.copies) for cid, items in channels]
+    items = [it for _, items in channels for it in items]
+    if not items:
+        raise SystemExit(f"Нет программ в {args.channels_dir}")
+
+    t_load, table = best_of(1, lambda: EPGTable.from_channels(channels))
+    cases = [
+        (
+            "категория Х/ф",
+            lambda: filter_movies_by_category(items),
+            lambda: table.to_items(table.category_mask(["Х/ф"])),
+        ),
+        (
+            f"длительность >= {MIN_DURATION} мин, не сериал",
+            lambda: filter_movies_epg(items, keywords=["\0"], min_duration_minutes=MIN_DURATION),
+            lambda: table.to_items(table.long_non_series_mask(MIN_DURATION)),
+        ),
+    ]
+    print(f"Программ: {len(items)}, уникальных названий: {len(table.titles)}, категорий: {len(table.categories)}")
+    print(f"Построение таблицы: {t_load:.2f} с")
+    print(f"{'Фильтр':<36} {'dict, с':>9} {'маски, с':>9} {'ускорение':>10}")
+    for name, legacy, vectorized in cases:
+        t_old, expected = best_of(args.repeat, legacy)
+        t_new, got = best_of(args.repeat, vectorized)
+        if [id(x) for x in expected] != [id(x) for x in got]:
+            raise SystemExit(f"Результаты расходятся: {name}")
+        print(f"{name:<36} {t_old:>9.3f} {t_new:>9.3f} {t_old / t_new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
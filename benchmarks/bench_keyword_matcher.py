@@ -0,0 +1,104 @@
+"""Стоимость filter_movies_epg на элемент: исходная реализация против MovieEPGMatcher.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_keyword_matcher.py [--channels-dir data/epg_channels] [--min-items 1000000] [--repeat 3]
+
+Элементы всех каналов повторяются до `--min-items`, чтобы измерение было
+на объёме, близком к полному прогону.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from epg_collector.filters import MovieEPGMatcher, extract_epg_items  # noqa: E402
+from epg_collector.serialization import read_json  # noqa: E402
+
+
+def legacy_filter_movies_epg(items: Iterable[Dict[str, Any]], keywords: List[str] | None = None) -> List[Dict[str, Any]]:
+    """Исходная реализация (без эвристики по длительности): casefold + `any(k in t)`."""
+    if keywords is None:
+        keywords = ["Х/ф", "х/ф", "Художественный фильм", "фильм", "кино", "movie", "feature film"]
+    kw = [k.casefold() for k in keywords if isinstance(k, str) and k.strip()]
+
+    def text_has_movie_markers(text: str) -> bool:
+        t = text.casefold()
+        return any(k in t for k in kw)
+
+    result: List[Dict[str, Any]] = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        category_keys = ("category", "categories", "genre", "genres", "tags", "program_type", "type")
+        matched = False
+        for key in category_keys:
+            v = item.get(key)
+            if isinstance(v, list):
+                texts = [str(x) for x in v if isinstance(x, (str, int, float))]
+                if any(text_has_movie_markers(s) for s in texts):
+                    matched = True
+                    break
+            elif isinstance(v, (str, int, float)):
+                if text_has_movie_markers(str(v)):
+                    matched = True
+                    break
+        if not matched:
+            title = item.get("title") or item.get("name") or ""
+            desc = item.get("description") or item.get("desc") or item.get("short_desc") or ""
+            if isinstance(title, str) and text_has_movie_markers(title):
+                matched = True
+            elif isinstance(desc, str) and text_has_movie_markers(desc):
+                matched = True
+        if matched:
+            result.append(item)
+    return result
+
+
+def best_of(repeat: int, fn: Callable[[], Any]) -> float:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--channels-dir", type=Path, default=PROJECT_ROOT / "data" / "epg_channels")
+    parser.add_argument("--min-items", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    base: List[Dict[str, Any]] = []
+    for p in sorted(args.channels_dir.glob("*.json")):
+        base.extend(extract_epg_items(read_json(p)) or [])
+    if not base:
+        raise SystemExit(f"Нет программ в {args.channels_dir}")
+    items = base * max(1, -(-args.min_items // len(base)))
+
+    matcher = MovieEPGMatcher()
+    legacy = legacy_filter_movies_epg(base)
+    compiled = matcher.select(base)
+    if [id(x) for x in legacy] != [id(x) for x in compiled]:
+        raise SystemExit("Результаты реализаций расходятся")
+
+    t_old = best_of(args.repeat, lambda: legacy_filter_movies_epg(items))
+    t_new = best_of(args.repeat, lambda: matcher.select(items))
+    n = len(items)
+    print(f"Элементов: {n} (уникальных {len(base)}), отобрано фильмов: {len(compiled) * (n // len(base))}")
+    print(f"{'Реализация':<28} {'всего, с':>10} {'на элемент, мкс':>16}")
+    print(f"{'casefold + any(k in t)':<28} {t_old:>10.2f} {t_old / n * 1e6:>16.2f}")
+    print(f"{'MovieEPGMatcher (regex)':<28} {t_new:>10.2f} {t_new / n * 1e6:>16.2f}")
+    print(f"Ускорение: {t_old / t_new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Сравнение стандартного json (indent=2) и epg_collector.serialization по этапам пайплайна.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_serialization.py [--channels-dir data/epg_channels] [--repeat 5]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from epg_collector import serialization  # noqa: E402
+from epg_collector.filters import filter_movies_by_category  # noqa: E402
+
+
+def best_of(repeat: int, fn: Callable[[], Any]) -> float:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def flatten(obj: Dict[str, Any]) -> List[Dict[str, Any]]:
+    items: List[Dict[str, Any]] = []
+    for elem in obj.get("epg") or []:
+        if isinstance(elem, dict) and isinstance(elem.get("data"), list):
+            items.extend(x for x in elem["data"] if isinstance(x, dict))
+        elif isinstance(elem, dict):
+            items.append(elem)
+    return items
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--channels-dir", type=Path, default=PROJECT_ROOT / "data" / "epg_channels")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    files = sorted(args.channels_dir.glob("*.json"))
+    if not files:
+        raise SystemExit(f"Нет файлов в {args.channels_dir}")
+    channels = [json.loads(p.read_text(encoding="utf-8")) for p in files]
+    movies = [dict(m, our_id=c["our_id"]) for c in channels for m in filter_movies_by_category(flatten(c))]
+    total_mb = sum(p.stat().st_size for p in files) / 1e6
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp)
+
+        def stdlib_write_channels() -> None:
+            for i, c in enumerate(channels):
+                (out / f"{i}.json").write_text(json.dumps(c, ensure_ascii=False, indent=2), encoding="utf-8")
+
+        def fast_write_channels() -> None:
+            for i, c in enumerate(channels):
+                serialization.write_json(out / f"{i}.json", c, pretty=False)
+
+        stages = [
+            (
+                "fetch: запись файлов каналов",
+                stdlib_write_channels,
+                fast_write_channels,
+            ),
+            (
+                "filter: чтение файлов каналов",
+                lambda: [json.loads(p.read_text(encoding="utf-8")) for p in files],
+                lambda: [serialization.read_json(p) for p in files],
+            ),
+            (
+                "filter: запись агрегата фильмов",
+                lambda: (out / "agg.json").write_text(json.dumps(movies, ensure_ascii=False, indent=2), encoding="utf-8"),
+                lambda: serialization.write_json(out / "agg.json", movies, pretty=False),
+            ),
+            (
+                "enrich: чтение агрегата фильмов",
+                lambda: json.loads((out / "agg.json").read_text(encoding="utf-8")),
+                lambda: serialization.read_json(out / "agg.json"),
+            ),
+        ]
+
+        print(f"Бэкенд: {serialization.BACKEND}; каналов: {len(files)} ({total_mb:.1f} МБ); фильмов: {len(movies)}")
+        print(f"{'Этап':<34} {'json, мс':>10} {serialization.BACKEND + ', мс':>14} {'выигрыш':>9}")
+        total_old = total_new = 0.0
+        for name, old, new in stages:
+            t_old = best_of(args.repeat, old)
+            t_new = best_of(args.repeat, new)
+            total_old += t_old
+            total_new += t_new
+            print(f"{name:<34} {t_old * 1000:>10.1f} {t_new * 1000:>14.1f} {t_old / t_new:>8.1f}x")
+        print(f"{'Итого':<34} {total_old * 1000:>10.1f} {total_new * 1000:>14.1f} {total_old / total_new:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,10 @@
 from __future__ import annotations
 
-import json
 import pathlib
 from typing import Any, Dict, List, Optional, Tuple
 
 from epg_collector.api.models import EPGData, KinoData, Metadata, Movie
+from epg_collector.serialization import read_json
 
 
 class MoviesRepository:
@@ -19,7 +19,7 @@ class MoviesRepository:
             self._raw = []
             self._mtime = None
             return
-        self._raw = json.loads(self._path.read_text(encoding="utf-8"))
+        self._raw = read_json(self._path)
         try:
             self._mtime = self._path.stat().st_mtime
         except Exception:
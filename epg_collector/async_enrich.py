@@ -0,0 +1,406 @@
+"""Асинхронный движок обогащения (`enrich --async-engine`).
+
+TMDB, КиноПоиск и CDN постеров опрашиваются через httpx.AsyncClient в одном
+цикле событий; одновременных запросов к каждому источнику не больше его
+семафора (ASYNC_TMDB_CONCURRENCY, ASYNC_KINOPOISK_CONCURRENCY,
+ASYNC_POSTER_CONCURRENCY). Разбор ответов, хранилище метаданных,
+предохранитель веб-поиска КиноПоиска, ограничитель частоты по хостам и выбор
+постера — общие с синхронными клиентами, поэтому результат для произведения
+тот же, что у `cli._enrich_work`. Блокирующие вызовы (SQLite хранилища
+метаданных, разбор HTML КиноПоиска, запись файлов постеров) выполняются в
+потоках через `asyncio.to_thread`, чтобы не останавливать цикл событий.
+
+httpx — необязательная зависимость: без него модуль импортируется, но
+`AsyncHTTP` выбрасывает RuntimeError.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+try:  # pragma: no cover - зависит от окружения
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None  # type: ignore[assignment]
+
+from .config import Config
+from .http_client import RETRY_STATUSES
+from .kinopoisk import FILM_HEADERS, SEARCH_HEADERS, KinoPoiskClient, _ScrapeBlocked
+from .metadata_store import MetadataStore, TransientLookupError, get_metadata_store
+from .posters import download_poster_async, poster_candidates, poster_year
+from .rate_limit import get_rate_limiter
+from .tmdb import TMDBClient
+
+logger = logging.getLogger(__name__)
+
+
+def _require_httpx() -> None:
+    if httpx is None:
+        raise RuntimeError("Для асинхронного обогащения требуется httpx (pip install httpx)")
+
+
+class AsyncHTTP:
+    """httpx.AsyncClient с политикой синхронных сессий.
+
+    Каждый запрос проходит через общий на процесс `HostRateLimiter`
+    (RATE_LIMITS, паузы по Retry-After). На 429 хост приостанавливается и
+    запрос повторяется; ошибки сети и 5xx повторяются до HTTP_RETRIES раз
+    (5xx с Retry-After приостанавливает хост, как 429; иначе — экспоненциальная
+    пауза), так же как в `http_client.RateLimitedAdapter`. HTTP-кэш (CACHE_ENABLED) не используется —
+    результаты поиска и так хранятся в хранилище метаданных.
+    """
+
+    def __init__(self, cfg: Config, transport: Any = None):
+        _require_httpx()
+        self.retries = cfg.http_retries
+        self.backoff = cfg.http_backoff
+        self.limiter = get_rate_limiter()
+        self.limiter.configure(cfg.rate_limits, cfg.rate_limit_default)
+        self.client = httpx.AsyncClient(
+            timeout=cfg.http_timeout,
+            headers={"User-Agent": cfg.iptv_headers.get("User-Agent", "Mozilla/5.0")},
+            follow_redirects=True,
+            transport=transport,
+        )
+
+    async def get(self, url: str, *, headers: Optional[Dict[str, str]] = None, params: Any = None) -> "httpx.Response":
+        attempt = 0
+        while True:
+            delay = self.backoff * (2 ** attempt)
+            await self.limiter.acquire_async(url)
+            try:
+                resp = await self.client.get(url, headers=headers, params=params)
+            except httpx.TransportError:
+                if attempt >= self.retries:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            if resp.status_code == 429 and attempt < self.retries:
+                # Пауза общая для хоста: её выдержит acquire_async следующей попытки
+                self.limiter.throttled(url, resp.headers.get("Retry-After"), default=max(1.0, delay))
+                attempt += 1
+                continue
+            if resp.status_code in RETRY_STATUSES and attempt < self.retries:
+                retry_after = resp.headers.get("Retry-After")
+                if retry_after is not None:
+                    # Как у 429 и RateLimitedAdapter: пауза по Retry-After общая для хоста
+                    self.limiter.throttled(url, retry_after, default=delay, status=resp.status_code)
+                else:
+                    await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            return resp
+
+    @asynccontextmanager
+    async def stream(self, url: str) -> AsyncIterator["httpx.Response"]:
+        """Потоковый GET (для постеров) — без повторов, как и в `posters.download_poster`."""
+        await self.limiter.acquire_async(url)
+        async with self.client.stream("GET", url) as resp:
+            yield resp
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+class AsyncLookupMemo:
+    """`tmdb.TMDBLookupMemo` для цикла событий.
+
+    Одновременные запросы с одним ключом ждут одну и ту же задачу; ошибки не
+    запоминаются. `stats()` — в том же формате, что у синхронного мемо.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self.requests = 0
+        self.saved = 0
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._tasks.get(key)
+        if task is not None:
+            self.saved += 1
+        else:
+            self.requests += 1
+            task = self._tasks[key] = asyncio.ensure_future(fetch())
+            task.add_done_callback(lambda t: self._forget_failed(key, t))
+        return await asyncio.shield(task)
+
+    def _forget_failed(self, key: Hashable, task: "asyncio.Future[Any]") -> None:
+        if (task.cancelled() or task.exception() is not None) and self._tasks.get(key) is task:
+            del self._tasks[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"requests": self.requests, "saved": self.saved}
+
+
+async def _stored(
+    store: Optional[MetadataStore],
+    source: str,
+    title: str,
+    year: Optional[int],
+    fetch: Callable[[], Awaitable[Any]],
+) -> Any:
+    """`MetadataStore.lookup` для корутин: исключения `fetch` не сохраняются.
+
+    Запросы к SQLite (до busy_timeout) выполняются в потоке.
+    """
+    if store is None:
+        return await fetch()
+    hit, data = await asyncio.to_thread(store.get, source, title, year)
+    if hit:
+        return data
+    data = await fetch()
+    await asyncio.to_thread(store.put, source, title, year, data)
+    return data
+
+
+class AsyncTMDBClient:
+    """Асинхронный TMDB с теми же ключами хранилища и форматом ответа, что у `TMDBClient`."""
+
+    def __init__(
+        self,
+        cfg: Config,
+        http: AsyncHTTP,
+        store: Optional[MetadataStore],
+        limit: asyncio.Semaphore,
+        memo: Optional[AsyncLookupMemo] = None,
+    ):
+        # Синхронный клиент — источник URL, настроек и разбора ответов; в сеть он не ходит
+        self.sync = TMDBClient(cfg, session=None, store=store)
+        self.store = store
+        self.http = http
+        self.limit = limit
+        self.memo = memo if memo is not None else AsyncLookupMemo()
+
+    def is_enabled(self) -> bool:
+        return self.sync.is_enabled()
+
+    async def _get_json(self, url: str) -> Dict[str, Any]:
+        async with self.limit:
+            resp = await self.http.get(url)
+        resp.raise_for_status()
+        return resp.json()
+
+    async def _search(self, title: str, year: Optional[int], language: str) -> List[Dict[str, Any]]:
+        async def fetch() -> List[Dict[str, Any]]:
+            return (await self._get_json(self.sync._search_url(title, year, language))).get("results") or []
+
+        return await self.memo.get(("search", title.strip().casefold(), year or None, language), fetch)
+
+    async def genre_names(self, language: str = "ru-RU") -> Dict[int, str]:
+        async def fetch() -> Optional[Dict[str, str]]:
+            return self.sync._parse_genres(await self._get_json(self.sync._genres_url(language)))
+
+        data = await self.memo.get(
+            ("genres", language), lambda: _stored(self.store, "tmdb_genres", language, None, fetch)
+        )
+        return {int(k): v for k, v in (data or {}).items()}
+
+    async def get_movie_info(self, title: str, year: Optional[int] = None, language: str = "ru-RU") -> Optional[Dict[str, Any]]:
+        if not self.is_enabled() or not title:
+            return None
+        try:
+            return await _stored(
+                self.store, f"tmdb:{language}", title, year, lambda: self._fetch_movie_info(title, year, language)
+            )
+        except TransientLookupError as e:
+            return e.partial
+        except Exception:
+            return None
+
+    async def _fetch_movie_info(self, title: str, year: Optional[int], language: str) -> Optional[Dict[str, Any]]:
+        results = await self._search(title, year, language)
+        if not results:
+            return None
+        first = results[0]
+        names: Dict[int, str] = {}
+        failed = None
+        if isinstance(first.get("genre_ids"), list):
+            try:
+                names = await self.genre_names(language)
+            except Exception as e:
+                failed = f"genre list: {e}"
+        details = None
+        movie_id = first.get("id")
+        if self.sync.fetch_details and movie_id:
+            try:
+                details = await self.memo.get(
+                    ("movie", movie_id, language), lambda: self._get_json(self.sync._details_url(movie_id, language))
+                )
+            except Exception as e:
+                failed = f"details: {e}"
+        return self.sync._complete_info(self.sync._movie_info(first, title, year, names, details), failed)
+
+    async def get_poster_url(self, title: str, year: Optional[int] = None, language: str = "ru-RU") -> Optional[str]:
+        if not self.is_enabled() or not title:
+            return None
+
+        async def fetch() -> Optional[Dict[str, Any]]:
+            return self.sync._poster_from_results(await self._search(title, year, language))
+
+        try:
+            data = await _stored(self.store, f"tmdb_poster:{language}", title, year, fetch)
+        except Exception:
+            return None
+        return data.get("poster_url") if isinstance(data, dict) else None
+
+
+class AsyncKinoPoiskClient:
+    """Асинхронный КиноПоиск: API, затем веб-поиск под общим предохранителем, как у `KinoPoiskClient`."""
+
+    def __init__(self, cfg: Config, http: AsyncHTTP, store: Optional[MetadataStore], limit: asyncio.Semaphore):
+        # Синхронный клиент — предохранитель, перенесённый кэш и разбор страниц; в сеть он не ходит
+        self.sync = KinoPoiskClient(cfg, session=None, store=store)
+        self.cfg = cfg
+        self.http = http
+        self.limit = limit
+
+    async def get_movie_info(self, title: str) -> Optional[Dict[str, Any]]:
+        try:
+            return await _stored(self.sync.store, "kinopoisk", title, None, lambda: self._fetch_movie_info(title))
+        except TransientLookupError as e:
+            logger.debug("Kinopoisk lookup for '%s' not cached: %s", title, e)
+            return None
+
+    async def _fetch_movie_info(self, title: str) -> Optional[Dict[str, Any]]:
+        cached = await asyncio.to_thread(self.sync._load_legacy, title)
+        if cached is not None:
+            logger.debug("Kinopoisk legacy cache hit for '%s'", title)
+            return cached
+        data: Optional[Dict[str, Any]] = None
+        definitive = True
+        if self.cfg.kinopoisk_api_key:
+            data, definitive = await self._query_api_result(title)
+        if data is None:
+            data, web_definitive = await self._scrape_web_result(title)
+            definitive = definitive and web_definitive
+        return self.sync._finalize(title, data, definitive)
+
+    async def _query_api_result(self, title: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        url, headers, params = self.sync._api_request(title)
+        try:
+            async with self.limit:
+                resp = await self.http.get(url, headers=headers, params=params)
+            if resp.status_code == 401:
+                logger.error("Kinopoisk API unauthorized. Check KINOPOISK_API_KEY")
+                return None, False
+            resp.raise_for_status()
+            return self.sync._api_result(title, resp.json())
+        except Exception as e:
+            logger.exception("Kinopoisk API error for '%s': %s", title, e)
+            return None, False
+
+    async def _scrape_web_result(self, title: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        breaker = self.sync.web_breaker
+        if not breaker.allow():
+            logger.debug("Kinopoisk scraping skipped for '%s': circuit open", title)
+            return None, False
+        try:
+            result = await self._scrape_web_once(title)
+        except _ScrapeBlocked as e:
+            logger.warning("Kinopoisk %s for '%s'", e, title)
+            breaker.record_failure()
+            return None, False
+        except Exception as e:
+            logger.exception("Kinopoisk scraping error for '%s': %s", title, e)
+            breaker.record_failure()
+            return None, False
+        breaker.record_success()
+        return result, True
+
+    async def _fetch_soup(self, url: str, headers: Dict[str, str], what: str) -> Any:
+        async with self.limit:
+            resp = await self.http.get(url, headers=headers)
+        resp.raise_for_status()
+        # BeautifulSoup/lxml — CPU-работа, в цикле событий она задержала бы остальные запросы
+        return await asyncio.to_thread(self.sync._parse_html, resp.text, what)
+
+    async def _scrape_web_once(self, title: str) -> Optional[Dict[str, Any]]:
+        soup = await self._fetch_soup(self.sync._search_url(title), SEARCH_HEADERS, "search")
+        film_url = await asyncio.to_thread(self.sync._film_url, title, soup)
+        if film_url is None:
+            return None
+        soup2 = await self._fetch_soup(film_url, FILM_HEADERS, "film page")
+        return await asyncio.to_thread(self.sync._parse_film_page, title, film_url, soup2)
+
+
+class AsyncEnricher:
+    """Обогащение произведений в одном цикле событий; объекты создаются внутри работающего цикла."""
+
+    def __init__(self, cfg: Config, posters_dir: Path, store: Optional[MetadataStore] = None, transport: Any = None):
+        self.posters_dir = posters_dir
+        self.http = AsyncHTTP(cfg, transport=transport)
+        store = store if store is not None else get_metadata_store(cfg)
+        self.tmdb = AsyncTMDBClient(cfg, self.http, store, asyncio.Semaphore(max(1, cfg.async_tmdb_concurrency)))
+        self.kp = AsyncKinoPoiskClient(cfg, self.http, store, asyncio.Semaphore(max(1, cfg.async_kinopoisk_concurrency)))
+        self.poster_limit = asyncio.Semaphore(max(1, cfg.async_poster_concurrency))
+
+    async def enrich_work(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """То же, что `cli._enrich_work`: данные TMDB/КиноПоиска и постер по первому показу."""
+        title = item.get("title") or item.get("name")
+        tmdb_info = await self.tmdb.get_movie_info(title)
+        info = tmdb_info if tmdb_info else await self.kp.get_movie_info(title)
+
+        tmdb_url = None
+        if self.tmdb.is_enabled():
+            year_hint = None
+            if not tmdb_info and isinstance(info, dict) and isinstance(info.get("year"), int):
+                year_hint = info.get("year")
+            tmdb_url = await self.tmdb.get_poster_url(title, year=year_hint)
+        year_for_name = poster_year(info, item)
+
+        poster_local: Any = None
+        poster_source: Any = None
+        for cand in poster_candidates(info, tmdb_url, item.get("preview")):
+            async with self.poster_limit:
+                poster_local = await download_poster_async(
+                    self.http,
+                    cand["url"],
+                    self.posters_dir,
+                    title=title,
+                    epg_id=item.get("id"),
+                    year=year_for_name,
+                    source=cand.get("source"),
+                )
+            if poster_local:
+                poster_source = cand.get("source")
+                break
+        return {"kinopoisk": info, "poster_local": poster_local, "poster_source": poster_source}
+
+    async def run(self, items: List[Dict[str, Any]], on_done: Optional[Callable[[], None]] = None) -> List[Dict[str, Any]]:
+        """Результаты в порядке `items`; `on_done` вызывается по готовности каждого."""
+
+        async def one(item: Dict[str, Any]) -> Dict[str, Any]:
+            try:
+                return await self.enrich_work(item)
+            finally:
+                if on_done is not None:
+                    on_done()
+
+        try:
+            return list(await asyncio.gather(*(one(item) for item in items)))
+        finally:
+            await self.http.aclose()
+
+
+def run_async_enrichment(
+    cfg: Config,
+    items: List[Dict[str, Any]],
+    posters_dir: Path,
+    on_done: Optional[Callable[[], None]] = None,
+    transport: Any = None,
+) -> Tuple[List[Dict[str, Any]], AsyncLookupMemo]:
+    """Обогатить произведения (по одному показу на каждое) асинхронно.
+
+    Возвращает результаты в порядке `items` и мемо запросов TMDB (для сводки).
+    """
+
+    async def main() -> Tuple[List[Dict[str, Any]], AsyncLookupMemo]:
+        enricher = AsyncEnricher(cfg, posters_dir, transport=transport)
+        results = await enricher.run(items, on_done)
+        return results, enricher.tmdb.memo
+
+    return asyncio.run(main())
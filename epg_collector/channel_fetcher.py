@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .config import Config
+from .epg_merge import held_days, incremental_window, is_day_grouped, merge_day_groups, today_for_tz
+from .fetch_journal import FetchJournal
+from .serialization import dumps, read_json
+from .iptv_api import iter_epg_for_channel, open_epg_for_channel
+from .validators import ValidatorStore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ChannelFetchResult:
+    """Результат загрузки EPG одного канала."""
+
+    channel_id: str
+    items: int = 0
+    elapsed: float = 0.0
+    error: Optional[str] = None
+    # False — ответ не изменился (304 или тот же хэш), файл канала не перезаписывался
+    changed: bool = True
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class FetchSummary:
+    """Итог параллельной загрузки EPG по каналам."""
+
+    results: List[ChannelFetchResult] = field(default_factory=list)
+    elapsed: float = 0.0
+    workers: int = 1
+    # Пропущено по журналу (`resume`) и повторено в конце запуска
+    skipped: int = 0
+    retried: int = 0
+
+    @property
+    def saved(self) -> int:
+        return sum(1 for r in self.results if r.ok)
+
+    @property
+    def unchanged(self) -> int:
+        return sum(1 for r in self.results if r.ok and not r.changed)
+
+    @property
+    def failed(self) -> List[ChannelFetchResult]:
+        return [r for r in self.results if not r.ok]
+
+    @property
+    def throughput(self) -> float:
+        """Пропускная способность, каналов в секунду."""
+        if self.elapsed <= 0:
+            return 0.0
+        return len(self.results) / self.elapsed
+
+
+def write_channel_file(
+    path: Path,
+    channel_id: str,
+    items: Iterable[Any],
+    discard_if: Optional[Callable[[], bool]] = None,
+) -> Optional[int]:
+    """Потоково записать `{"our_id": ..., "epg": [...]}` через временный файл.
+
+    Элементы пишутся по мере поступления, память не растёт с размером канала.
+    Если после записи `discard_if()` истинно (тело не изменилось), временный
+    файл удаляется, существующий остаётся нетронутым, и возвращается None.
+    Иначе файл атомарно заменяется и возвращается число элементов.
+    """
+    tmp = path.with_name(path.name + ".tmp")
+    count = 0
+    try:
+        with open(tmp, "wb") as f:
+            f.write(b'{"our_id": ' + dumps(channel_id, pretty=False) + b', "epg": [')
+            for item in items:
+                f.write(b",\n" if count else b"\n")
+                f.write(dumps(item, pretty=False))
+                count += 1
+            f.write(b"\n]}\n")
+        if discard_if is not None and discard_if():
+            tmp.unlink()
+            return None
+        os.replace(tmp, path)
+        return count
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def _load_day_groups(path: Path) -> Optional[List[Dict[str, Any]]]:
+    """Прочитать суточные группы из локального файла канала (или None)."""
+    try:
+        obj = read_json(path)
+    except Exception:
+        return None
+    items = obj.get("epg") if isinstance(obj, dict) else None
+    return items if is_day_grouped(items) else None
+
+
+def fetch_channel_to_file(
+    cfg: Config,
+    session,
+    channel_id: str,
+    out_dir: Path,
+    grouping: Optional[int] = None,
+    store: Optional[ValidatorStore] = None,
+    incremental: bool = False,
+) -> ChannelFetchResult:
+    """Загрузить EPG одного канала и потоково записать в `{out_dir}/{id}.json`.
+
+    С `store` запрос выполняется условно: если сервер ответил 304 или тело
+    совпало по хэшу, существующий файл не перезаписывается: его размер и
+    mtime не меняются, и манифест `filter-epg` (`FilterManifest`) берёт
+    сохранённый хэш файла, не перечитывая его.
+
+    С `incremental` и существующим файлом в суточной группировке запрашиваются
+    только недостающие дни окна (или его хвост); дни из ответа заменяют те же
+    дни файла, дни старше окна хранения отбрасываются.
+
+    Ошибки не пробрасываются, а возвращаются в `ChannelFetchResult.error`,
+    чтобы сбой одного канала не останавливал остальные.
+    """
+    started = time.perf_counter()
+    out_path = out_dir / f"{channel_id}.json"
+    try:
+        existing: Optional[List[Dict[str, Any]]] = None
+        extra_params: Optional[Dict[str, Any]] = None
+        epg_from = int(cfg.iptv_params.get("epg_from", -7))
+        epg_limit = int(cfg.iptv_params.get("epg_limit", 14))
+        today = today_for_tz(cfg.iptv_params.get("tz"))
+        if incremental and out_path.exists():
+            existing = _load_day_groups(out_path)
+            if existing is not None:
+                start, limit = incremental_window(
+                    held_days(existing), today, epg_from, epg_limit, cfg.iptv_incremental_overlap
+                )
+                extra_params = {"epg_from": start, "epg_limit": limit}
+
+        # Без локального файла условный запрос бессмыслен — нужен полный ответ
+        known = store.get(channel_id) if store is not None and out_path.exists() else None
+        stream = open_epg_for_channel(
+            cfg, session, channel_id, grouping=grouping, extra_params=extra_params, validator=known
+        )
+        try:
+            if existing is None:
+                count = write_channel_file(out_path, channel_id, stream, discard_if=lambda: stream.unchanged)
+            else:
+                fresh = list(stream)
+                if stream.unchanged:
+                    count = None
+                elif fresh and not is_day_grouped(fresh):
+                    # Сервер вернул не суточные группы — слить нельзя, берём полное окно
+                    logger.warning("Channel %s: incremental response is not day-grouped, refetching full window", channel_id)
+                    count = write_channel_file(out_path, channel_id, iter_epg_for_channel(cfg, session, channel_id, grouping=grouping))
+                else:
+                    merged = merge_day_groups(existing, fresh, today + timedelta(days=epg_from))
+                    count = write_channel_file(out_path, channel_id, merged)
+        finally:
+            stream.close()
+        if store is not None:
+            store.set(channel_id, stream.validator)
+        if count is None:
+            return ChannelFetchResult(channel_id, elapsed=time.perf_counter() - started, changed=False)
+        return ChannelFetchResult(channel_id, items=count, elapsed=time.perf_counter() - started)
+    except Exception as e:
+        logger.warning("EPG fetch failed for channel %s: %s", channel_id, e)
+        return ChannelFetchResult(channel_id, elapsed=time.perf_counter() - started, error=str(e))
+
+
+def _run_pool(
+    cfg: Config,
+    session,
+    channel_ids: List[str],
+    out_dir: Path,
+    grouping: Optional[int],
+    workers: int,
+    progress: Optional[Callable[[Iterable[Any], int], Iterable[Any]]],
+    store: Optional[ValidatorStore],
+    incremental: bool,
+    journal: Optional[FetchJournal],
+    attempt: int,
+) -> List[ChannelFetchResult]:
+    results: List[ChannelFetchResult] = []
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = [
+            ex.submit(fetch_channel_to_file, cfg, session, cid, out_dir, grouping, store, incremental)
+            for cid in channel_ids
+        ]
+        done: Iterable[Any] = as_completed(futures)
+        if progress is not None:
+            done = progress(done, len(futures))
+        for fut in done:
+            result = fut.result()
+            if journal is not None:
+                journal.record(result, attempt=attempt)
+            results.append(result)
+    return results
+
+
+def fetch_channels(
+    cfg: Config,
+    session,
+    channel_ids: List[str],
+    out_dir: Path,
+    grouping: Optional[int] = None,
+    workers: int = 1,
+    progress: Optional[Callable[[Iterable[Any], int], Iterable[Any]]] = None,
+    store: Optional[ValidatorStore] = None,
+    incremental: bool = False,
+    journal: Optional[FetchJournal] = None,
+    resume: bool = False,
+    retry_rounds: int = 0,
+    retry_backoff: float = 5.0,
+) -> FetchSummary:
+    """Загрузить EPG для списка каналов пулом из `workers` потоков.
+
+    Сессия разделяется между потоками; ограничение соединений на хост задаётся
+    при её создании (`create_session(cfg, pool_size=workers)`). Каждый канал
+    записывается на диск по мере готовности. `progress` — обёртка над
+    итератором завершённых задач (например, `rich.progress.track`).
+    `store` включает условные запросы (см. `fetch_channel_to_file`) и
+    сохраняется по завершении. `incremental` — догрузка только новых дней
+    окна со слиянием в существующие файлы.
+
+    Завершение каждого канала пишется в `journal`; с `resume` каналы, успешно
+    загруженные в пределах IPTV_RESUME_WINDOW, пропускаются. Неудачные каналы
+    повторяются в конце до `retry_rounds` раз с паузой `retry_backoff`,
+    удваивающейся с каждым раундом.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    workers = max(1, int(workers))
+    summary = FetchSummary(workers=workers)
+    started = time.perf_counter()
+
+    if journal is not None:
+        journal.compact()
+        if resume:
+            fresh = journal.completed_since(cfg.iptv_resume_window)
+            pending = [cid for cid in channel_ids if str(cid) not in fresh]
+            summary.skipped = len(channel_ids) - len(pending)
+            channel_ids = pending
+            if summary.skipped:
+                logger.info("Resume: skipping %d channels fetched within %ss", summary.skipped, cfg.iptv_resume_window)
+
+    summary.results = _run_pool(
+        cfg, session, channel_ids, out_dir, grouping, workers, progress, store, incremental, journal, attempt=1
+    )
+    for round_no in range(1, max(0, int(retry_rounds)) + 1):
+        failed_ids = [r.channel_id for r in summary.results if not r.ok]
+        if not failed_ids:
+            break
+        delay = retry_backoff * (2 ** (round_no - 1))
+        logger.warning("Retrying %d failed channels in %.0fs (round %d/%d)", len(failed_ids), delay, round_no, retry_rounds)
+        time.sleep(delay)
+        retried = _run_pool(
+            cfg, session, failed_ids, out_dir, grouping, workers, None, store, incremental, journal, attempt=round_no + 1
+        )
+        summary.retried += len(failed_ids)
+        by_id = {r.channel_id: r for r in retried}
+        summary.results = [by_id.get(r.channel_id, r) for r in summary.results]
+
+    if store is not None:
+        store.save()
+    summary.elapsed = time.perf_counter() - started
+    logger.info(
+        "Fetched EPG for %d channels in %.1fs (%.2f ch/s, workers=%d, unchanged=%d, failed=%d, skipped=%d, retried=%d)",
+        len(summary.results),
+        summary.elapsed,
+        summary.throughput,
+        workers,
+        summary.unchanged,
+        len(summary.failed),
+        summary.skipped,
+        summary.retried,
+    )
+    return summary
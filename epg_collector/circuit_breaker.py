@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Предохранитель для нестабильного источника.
+
+    - closed: вызовы разрешены; после `failure_threshold` неудач подряд — open.
+    - open: вызовы отклоняются `cooldown` секунд, затем — half_open.
+    - half_open: пропускается ровно один пробный вызов; успех закрывает
+      предохранитель, неудача снова открывает его на `cooldown`.
+
+    `on_change(name, old_state, new_state, snapshot)` вызывается при каждом переходе.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        cooldown: float = 300.0,
+        on_change: Optional[Callable[[str, str, str, Dict[str, Any]], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown = float(cooldown)
+        self.on_change = on_change
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.stats: Dict[str, int] = {"calls": 0, "failures": 0, "short_circuited": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def allow(self) -> bool:
+        """Можно ли выполнить вызов сейчас. В half_open разрешает только один пробный."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                self.stats["calls"] += 1
+                return True
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                self.stats["calls"] += 1
+                return True
+            self.stats["short_circuited"] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            if self._state != CLOSED:
+                self._transition(CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.stats["failures"] += 1
+            self._failures += 1
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._probe_in_flight = False
+                self._opened_at = self._clock()
+                self.stats["opened"] += 1
+                self._transition(OPEN)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._maybe_half_open()
+            return self._snapshot()
+
+    def _snapshot(self) -> Dict[str, Any]:
+        return dict(self.stats, state=self._state, consecutive_failures=self._failures)
+
+    def _maybe_half_open(self) -> None:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.cooldown:
+            self._transition(HALF_OPEN)
+
+    def _transition(self, new_state: str) -> None:
+        old_state, self._state = self._state, new_state
+        if new_state == OPEN:
+            logger.warning(
+                "Circuit '%s' opened after %d consecutive failures; pausing for %.0fs",
+                self.name, self._failures, self.cooldown,
+            )
+        else:
+            logger.info("Circuit '%s': %s -> %s", self.name, old_state, new_state)
+        if self.on_change is not None:
+            try:
+                self.on_change(self.name, old_state, new_state, self._snapshot())
+            except Exception as e:
+                logger.debug("Circuit '%s' on_change failed: %s", self.name, e)
@@ -1,25 +1,38 @@
 from __future__ import annotations
 
-import json
+import os
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import time
-from datetime import datetime, timezone
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import replace
 
 import typer
 from rich import print
-from rich.progress import track
-
-from .config import load_config
-from .http_client import create_session
-from .iptv_api import fetch_epg, fetch_epg_for_channel
+from rich.progress import Progress, track
+
+from .async_enrich import run_async_enrichment
+from .channel_fetcher import fetch_channels
+from .fetch_journal import FetchJournal
+from .filter_manifest import FilterManifest
+from .concurrency import get_concurrency_controller
+from .config import Config, json_pretty_from_env, load_config
+from .dedup import group_by_work, work_key
+from .epg_classifier import BucketSpec, classify_channels
+from .http_client import SessionPool, create_session
+from .iptv_api import iter_epg
 from .playlist_api import fetch_playlist
-from .filters import filter_movies_by_category, filter_cartoons_by_category, filter_movies_epg
+from .filters import DEFAULT_BUCKETS, filter_movies_by_category, filter_movies_epg, parse_buckets
 from .kinopoisk import KinoPoiskClient
 from .logging_config import setup_logging
-from .posters import download_poster, is_valid_image_file
-from .tmdb import TMDBClient
+from .logging_enhanced import metrics_logger
+from .metadata_store import get_metadata_store
+from .pipeline import Pipeline, Stage
+from .posters import download_poster, is_valid_image_file, poster_candidates, poster_year
+from .posters import year_from_timestamp as _compute_year_from_ts
+from .serialization import JsonStreamWriter, read_json, set_pretty, write_json
+from .tmdb import TMDBClient, TMDBLookupMemo
+from .validators import ValidatorStore
 
 app = typer.Typer(help="IPTV EPG Collector CLI")
 
@@ -54,6 +67,15 @@ CHANNEL_MOVIES_DIR.mkdir(parents=True, exist_ok=True)
 CHANNEL_CARTOONS_DIR.mkdir(parents=True, exist_ok=True)
 
 
+@app.callback()
+def main(
+    pretty: bool = typer.Option(False, "--pretty", help="Писать JSON-артефакты с отступами (по умолчанию компактно; также JSON_PRETTY=true)"),
+) -> None:
+    """IPTV EPG Collector CLI."""
+    # Только JSON_PRETTY: полную конфигурацию каждая команда загружает сама
+    set_pretty(pretty or json_pretty_from_env())
+
+
 @app.command()
 def fetch_epg_cmd() -> None:
     """Загрузить EPG из IPTV API и сохранить в data/raw_epg.json."""
@@ -61,9 +83,10 @@ def fetch_epg_cmd() -> None:
     setup_logging(cfg.log_level)
     session = create_session(cfg)
 
-    epg = fetch_epg(cfg, session)
-    RAW_PATH.write_text(json.dumps(epg, ensure_ascii=False, indent=2), encoding="utf-8")
-    print(f"[green]Сохранено[/green] {len(epg)} элементов в {RAW_PATH}")
+    # Элементы пишутся по мере разбора ответа — весь EPG в памяти не держится
+    with JsonStreamWriter(RAW_PATH) as writer:
+        writer.extend(iter_epg(cfg, session))
+    print(f"[green]Сохранено[/green] {writer.count} элементов в {RAW_PATH}")
 
 
 @app.command()
@@ -74,8 +97,8 @@ def fetch_playlist_cmd() -> None:
     session = create_session(cfg)
 
     data = fetch_playlist(cfg, session)
-    # Сохраняем как есть (словарь или список), с Unicode и отступами
-    RAW_PLAYLIST_PATH.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    # Сохраняем как есть (словарь или список)
+    write_json(RAW_PLAYLIST_PATH, data)
     # Пытаемся вывести краткую статистику
     size = 0
     try:
@@ -91,13 +114,64 @@ def fetch_playlist_cmd() -> None:
     print(f"[green]Сохранено[/green] {size} элементов (если применимо) в {RAW_PLAYLIST_PATH}")
 
 
-def _compute_year_from_ts(ts: Any) -> Optional[int]:
-    """Безопасно получить год из Unix timestamp в UTC."""
-    try:
-        if isinstance(ts, (int, float)) and ts > 0:
-            return datetime.fromtimestamp(int(ts), tz=timezone.utc).year
-    except Exception:
-        return None
+def _resolve_workers(cfg: Config, workers: Optional[int]) -> int:
+    """Число потоков обработки: явное `--workers` или, при адаптивном параллелизме, CONCURRENCY_MAX.
+
+    Потоки задают лишь верхнюю границу; сколько запросов реально идёт к хосту
+    одновременно, решает адаптивный контроллер.
+    """
+    if workers is not None:
+        return max(1, int(workers))
+    return max(1, cfg.concurrency_max) if cfg.adaptive_concurrency else 6
+
+
+def _print_concurrency_summary() -> None:
+    """Вывести подобранные пределы параллелизма по хостам."""
+    for host, st in get_concurrency_controller().summary().items():
+        print(
+            f"[cyan]Параллелизм[/cyan] {host}: предел {st['limit']} "
+            f"(диапазон {st['min_seen']}–{st['max_seen']}, запросов {int(st['requests'])}, "
+            f"перегрузок {int(st['overloaded'])})"
+        )
+
+
+def _print_connection_summary(sessions: SessionPool) -> None:
+    """Вывести переиспользование соединений пула сессий по хостам."""
+    for host, st in sorted(sessions.connection_stats().items()):
+        reqs, conns = st["requests"], st["connections"]
+        reuse = (1 - conns / reqs) * 100 if reqs else 0.0
+        print(
+            f"[cyan]Соединения[/cyan] {host}: запросов {reqs}, новых соединений {conns} "
+            f"(переиспользование {reuse:.0f}%)"
+        )
+
+
+def _print_metadata_summary(cfg: Config) -> None:
+    """Вывести, сколько поисков метаданных обслужено хранилищем без обращения к сети."""
+    store = get_metadata_store(cfg)
+    if store is None:
+        return
+    st = store.stats
+    if st["hits"] or st["negative_hits"] or st["misses"]:
+        print(
+            f"[cyan]Метаданные[/cyan]: из хранилища {st['hits']} (+{st['negative_hits']} «не найдено»), "
+            f"запросов в сеть {st['misses']}"
+        )
+
+
+def _print_tmdb_summary(memo: TMDBLookupMemo) -> None:
+    """Вывести, сколько запросов к TMDB выполнено и сколько повторов обслужено из памяти прогона."""
+    st = memo.stats()
+    metrics_logger.record_metric("tmdb_lookup", st)
+    if st["requests"] or st["saved"]:
+        print(f"[cyan]TMDB[/cyan]: запросов {st['requests']}, повторных не понадобилось {st['saved']}")
+
+
+def _print_pipeline_summary(pipeline: Pipeline) -> None:
+    """Вывести пропускную способность и глубину очередей стадий конвейера обогащения."""
+    metrics_logger.record_metric("enrich_pipeline", pipeline.metrics())
+    for line in pipeline.describe():
+        print(f"[cyan]Стадия[/cyan] {line}")
 
 
 def _static_url_from_local(local_path: Optional[str]) -> Optional[str]:
@@ -170,10 +244,25 @@ def _extract_channel_ids_from_playlist(obj: Any) -> List[str]:
 def fetch_epg_for_playlist(
     limit: Optional[int] = typer.Option(None, help="Ограничить количество каналов для запроса"),
     grouping: int = typer.Option(2, help="Параметр grouping для EPG-запроса"),
+    workers: Optional[int] = typer.Option(None, help="Сколько каналов загружать параллельно (по умолчанию IPTV_CONCURRENCY)"),
+    conditional: bool = typer.Option(True, help="Условные запросы (ETag/Last-Modified/хэш тела): не перезаписывать неизменённые каналы"),
+    incremental: bool = typer.Option(False, help="Догружать только отсутствующие дни окна и сливать их с локальными файлами"),
+    resume: bool = typer.Option(False, help="Пропустить каналы, уже загруженные в пределах IPTV_RESUME_WINDOW (по журналу)"),
 ) -> None:
     """Пройти по каналам из data/raw_playlist.json, запросить EPG и
     сохранить каждый канал в data/epg_channels/{id}.json.
 
+    Каналы загружаются пулом потоков; число одновременных запросов (и соединений
+    к хосту IPTV) ограничено `--workers`. Файлы пишутся по мере готовности.
+    Валидаторы ответов хранятся в cache/epg_validators.json; неизменённые
+    каналы не перезаписываются. С `--incremental` запрашиваются только новые
+    дни окна (или его хвост, IPTV_INCREMENTAL_OVERLAP дней); полученные дни
+    заменяют соответствующие дни существующего файла.
+
+    Завершение каждого канала записывается в cache/epg_fetch_journal.jsonl;
+    `--resume` продолжает прерванный запуск. Неудачные каналы повторяются
+    в конце (IPTV_RETRY_ROUNDS, IPTV_RETRY_BACKOFF), а не прерывают запуск.
+
     Формат файла: {"our_id": "<id>", "epg": [...]}.
     """
     cfg = load_config()
@@ -184,7 +273,7 @@ def fetch_epg_for_playlist(
         raise typer.Exit(code=1)
 
     try:
-        playlist_obj: Any = json.loads(RAW_PLAYLIST_PATH.read_text(encoding="utf-8"))
+        playlist_obj: Any = read_json(RAW_PLAYLIST_PATH)
     except Exception as e:
         print(f"[red]Не удалось прочитать {RAW_PLAYLIST_PATH}: {e}[/red]")
         raise typer.Exit(code=1)
@@ -197,16 +286,37 @@ def fetch_epg_for_playlist(
     if limit is not None:
         channel_ids = channel_ids[:limit]
 
-    session = create_session(cfg)
-    saved = 0
-    for cid in track(channel_ids, description="Загрузка EPG по каналам"):
-        epg_items = fetch_epg_for_channel(cfg, session, cid, grouping=grouping)
-        out = {"our_id": cid, "epg": epg_items}
-        out_path = EPG_CHANNELS_DIR / f"{cid}.json"
-        out_path.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
-        saved += 1
-
-    print(f"[green]Сохранено[/green] EPG файлов: {saved} в {EPG_CHANNELS_DIR}")
+    n_workers = max(1, int(workers if workers is not None else cfg.iptv_concurrency))
+    session = create_session(cfg, pool_size=n_workers)
+    summary = fetch_channels(
+        cfg,
+        session,
+        channel_ids,
+        EPG_CHANNELS_DIR,
+        grouping=grouping,
+        workers=n_workers,
+        progress=lambda it, total: track(it, description="Загрузка EPG по каналам", total=total),
+        store=ValidatorStore() if conditional else None,
+        incremental=incremental,
+        journal=FetchJournal(),
+        resume=resume,
+        retry_rounds=cfg.iptv_retry_rounds,
+        retry_backoff=cfg.iptv_retry_backoff,
+    )
+
+    print(
+        f"[green]Сохранено[/green] EPG файлов: {summary.saved - summary.unchanged} в {EPG_CHANNELS_DIR}, "
+        f"без изменений: {summary.unchanged} "
+        f"за {summary.elapsed:.1f} с ({summary.throughput:.2f} каналов/с, потоков: {summary.workers})"
+    )
+    if summary.skipped:
+        print(f"[cyan]Пропущено[/cyan] (--resume, уже загружены): {summary.skipped}")
+    if summary.retried:
+        print(f"[cyan]Повторных попыток[/cyan] для неудачных каналов: {summary.retried}")
+    if summary.failed:
+        failed_ids = ", ".join(r.channel_id for r in summary.failed[:20])
+        print(f"[yellow]Ошибки загрузки[/yellow]: {len(summary.failed)} ({failed_ids})")
+    _print_concurrency_summary()
 
 
 @app.command()
@@ -219,7 +329,7 @@ def filter_movies_cmd() -> None:
         print(f"[yellow]{RAW_PATH} не найден. Сначала выполните fetch-epg[/yellow]")
         raise typer.Exit(code=1)
 
-    data = json.loads(RAW_PATH.read_text(encoding="utf-8"))
+    data = read_json(RAW_PATH)
     if not isinstance(data, list):
         print("[red]Ожидался список в raw_epg.json[/red]")
         raise typer.Exit(code=1)
@@ -237,20 +347,43 @@ def filter_movies_cmd() -> None:
             items.append(elem)
 
     movies = filter_movies_by_category(items)
-    MOVIES_PATH.write_text(json.dumps(movies, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(MOVIES_PATH, movies)
     print(f"[green]Сохранено[/green] отфильтрованных фильмов: {len(movies)} в {MOVIES_PATH}")
 
 
-@app.command()
-def filter_epg_movies(
-    skip_empty: bool = typer.Option(True, help="Не сохранять файлы, где после фильтрации нет фильмов"),
-) -> None:
-    """Отфильтровать EPG каждого канала в data/epg_channels/ и сохранить только фильмы.
+def _bucket_specs(cfg: Config, names: Optional[List[str]] = None) -> List[BucketSpec]:
+    """Корзины из EPG_BUCKETS с путями результатов.
 
-    - Критерий: category == "Х/ф" (как в filter_movies_by_category)
-    - Результат: data/epg_channels_filtered/{id}.movies.json
-      Формат: {"our_id": "<id>", "epg": [только фильмы]}
+    Фильмы и мультфильмы пишутся в исторические каталоги; новые корзины —
+    в data/epg_channels_{name}/ и data/epg_{name}.json.
     """
+    known = {
+        "movies": (EPG_FILTERED_DIR, EPG_MOVIES_PATH),
+        "cartoons": (EPG_CARTOONS_DIR, EPG_CARTOONS_PATH),
+    }
+    buckets = cfg.epg_buckets or {}
+    # Явно запрошенные стандартные корзины доступны, даже если их нет в EPG_BUCKETS
+    defaults = parse_buckets(DEFAULT_BUCKETS)
+    specs: List[BucketSpec] = []
+    for name in names or list(buckets):
+        if name not in buckets and names and name in defaults:
+            buckets = {**buckets, name: defaults[name]}
+        if name not in buckets:
+            print(f"[red]Корзина '{name}' не задана в EPG_BUCKETS ({', '.join(buckets)})[/red]")
+            raise typer.Exit(code=1)
+        out_dir, aggregate_path = known.get(name, (DATA_DIR / f"epg_channels_{name}", DATA_DIR / f"epg_{name}.json"))
+        specs.append(BucketSpec(name, tuple(buckets[name]), out_dir, aggregate_path))
+    return specs
+
+
+def _run_filter_epg(
+    names: Optional[List[str]],
+    skip_empty: bool,
+    description: str,
+    jobs: int = 1,
+    jsonl: bool = False,
+    incremental: bool = True,
+) -> None:
     cfg = load_config()
     setup_logging(cfg.log_level)
 
@@ -263,73 +396,82 @@ def filter_epg_movies(
         print(f"[yellow]Нет файлов в {EPG_CHANNELS_DIR}[/yellow]")
         raise typer.Exit(code=1)
 
-    saved = 0
-    aggregated: List[Dict[str, Any]] = []
-    processed = 0
-    for path in track(files, description="Фильтрация EPG по фильмам"):
-        processed += 1
-        try:
-            obj = json.loads(path.read_text(encoding="utf-8"))
-        except Exception as e:
-            print(f"[red]Ошибка чтения {path.name}: {e}[/red]")
-            continue
+    specs = _bucket_specs(cfg, names)
+    if jsonl:
+        specs = [replace(s, aggregate_path=s.aggregate_path.with_suffix(".jsonl")) for s in specs]
+    summary = classify_channels(
+        files,
+        specs,
+        skip_empty=skip_empty,
+        progress=lambda it, total: track(it, description=description, total=total),
+        jobs=jobs if jobs > 0 else (os.cpu_count() or 1),
+        lines=jsonl,
+        manifest=FilterManifest() if incremental else None,
+    )
+    for err in summary.errors:
+        print(f"[yellow]{err}[/yellow]")
+    if summary.skipped:
+        print(f"[cyan]Без изменений[/cyan] (по манифесту, не разбирались): {summary.skipped} из {summary.processed}")
+    for spec in specs:
+        st = summary.buckets[spec.name]
+        print(
+            f"[green]Готово[/green] ({spec.name}): обработано {summary.processed} файлов, "
+            f"сохранено {st.saved} в {spec.out_dir}; агрегировано {st.aggregated} элементов в {spec.aggregate_path}"
+        )
 
-        our_id = str(obj.get("our_id") or path.stem)
-        items = obj.get("epg")
-        if not isinstance(items, list):
-            # Пытаемся найти альтернативные ключи
-            for k in ("items", "results", "data"):
-                v = obj.get(k)
-                if isinstance(v, list):
-                    items = v
-                    break
 
-        if not isinstance(items, list):
-            print(f"[yellow]{path.name}: пропуск (не найден список EPG)[/yellow]")
-            continue
+@app.command()
+def filter_epg(
+    bucket: Optional[List[str]] = typer.Option(None, "--bucket", help="Ограничиться указанными корзинами (по умолчанию все из EPG_BUCKETS)"),
+    skip_empty: bool = typer.Option(True, help="Не сохранять файлы каналов, где корзина пуста"),
+    jobs: int = typer.Option(1, "--jobs", "-j", help="Число процессов для разбора файлов каналов (0 — по числу ядер)"),
+    jsonl: bool = typer.Option(False, "--jsonl", help="Писать агрегат в JSON Lines (.jsonl) вместо JSON-массива"),
+    incremental: bool = typer.Option(True, help="Разбирать только каналы, изменённые с прошлого запуска (cache/epg_filter_manifest.json)"),
+) -> None:
+    """Разложить EPG каналов из data/epg_channels/ по всем корзинам за один проход.
 
-        # Разворачиваем суточные группы, если формат: [{"date":..., "title":..., "data": [...]}]
-        flat_items: List[Dict[str, Any]] = []
-        for elem in items:
-            if isinstance(elem, dict) and isinstance(elem.get("data"), list):
-                for sub in elem["data"]:
-                    if isinstance(sub, dict):
-                        flat_items.append(sub)
-            elif isinstance(elem, dict):
-                flat_items.append(elem)
-
-        # Строгая фильтрация: только элементы, где в category есть "Х/ф"
-        movies = filter_movies_by_category(flat_items)
-        if not movies:
-            # Не создаём файл; если существовал ранее — удаляем
-            out_path = EPG_FILTERED_DIR / f"{our_id}.movies.json"
-            if out_path.exists():
-                try:
-                    out_path.unlink()
-                except Exception:
-                    pass
-            if skip_empty:
-                continue
+    Корзины задаются EPG_BUCKETS (по умолчанию `movies=Х/ф;cartoons=М/ф`).
+    Каждый файл канала читается один раз; для каждой корзины пишутся
+    `{каталог}/{id}.{корзина}.json` и агрегат (для фильмов — data/epg_movies.json,
+    для мультфильмов — data/epg_cartoons.json).
 
-        out = {"our_id": our_id, "epg": movies}
-        out_path = EPG_FILTERED_DIR / f"{our_id}.movies.json"
-        out_path.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
-        saved += 1
-        # Агрегируем с добавлением идентификатора канала внутрь каждого элемента
-        for m in movies:
-            if isinstance(m, dict):
-                m_with_id = dict(m)
-                m_with_id.setdefault("our_id", our_id)
-                aggregated.append(m_with_id)
+    С `--jobs N` файлы разбираются N процессами; порядок элементов в агрегатах
+    тот же, что и при последовательной обработке.
+
+    Агрегаты пишутся потоково по мере обработки каналов; с `--jsonl` — в JSON
+    Lines рядом с обычным агрегатом (data/epg_movies.jsonl и т.д.).
+
+    Размер, mtime и хэш входов запоминаются в cache/epg_filter_manifest.json:
+    повторный запуск разбирает только изменённые каналы, а агрегаты собирает
+    из уже записанных файлов остальных (`--no-incremental` — полный прогон).
+    """
+    _run_filter_epg(bucket, skip_empty, "Классификация EPG по корзинам", jobs, jsonl, incremental)
 
-    # Сохраняем агрегированный список фильмов из EPG
-    EPG_MOVIES_PATH.write_text(json.dumps(aggregated, ensure_ascii=False, indent=2), encoding="utf-8")
-    print(f"[green]Готово[/green]: обработано {processed} файлов, сохранено {saved} в {EPG_FILTERED_DIR}; агрегировано {len(aggregated)} фильмов в {EPG_MOVIES_PATH}")
+
+@app.command()
+def filter_epg_movies(
+    skip_empty: bool = typer.Option(True, help="Не сохранять файлы, где после фильтрации нет фильмов"),
+    jobs: int = typer.Option(1, "--jobs", "-j", help="Число процессов для разбора файлов каналов (0 — по числу ядер)"),
+    jsonl: bool = typer.Option(False, "--jsonl", help="Писать агрегат в JSON Lines (.jsonl) вместо JSON-массива"),
+    incremental: bool = typer.Option(True, help="Разбирать только каналы, изменённые с прошлого запуска (cache/epg_filter_manifest.json)"),
+) -> None:
+    """Отфильтровать EPG каждого канала в data/epg_channels/ и сохранить только фильмы.
+
+    - Критерий: category == "Х/ф" (как в filter_movies_by_category)
+    - Результат: data/epg_channels_filtered/{id}.movies.json
+      Формат: {"our_id": "<id>", "epg": [только фильмы]}
+
+    Для фильмов и мультфильмов сразу удобнее `filter-epg` (один проход по файлам).
+    """
+    _run_filter_epg(["movies"], skip_empty, "Фильтрация EPG по фильмам", jobs, jsonl, incremental)
 
 
 @app.command()
 def filter_epg_cartoons(
     skip_empty: bool = typer.Option(True, help="Не сохранять файлы, где после фильтрации нет мультфильмов"),
+    jobs: int = typer.Option(1, "--jobs", "-j", help="Число процессов для разбора файлов каналов (0 — по числу ядер)"),
+    jsonl: bool = typer.Option(False, "--jsonl", help="Писать агрегат в JSON Lines (.jsonl) вместо JSON-массива"),
+    incremental: bool = typer.Option(True, help="Разбирать только каналы, изменённые с прошлого запуска (cache/epg_filter_manifest.json)"),
 ) -> None:
     """Отфильтровать EPG каждого канала и сохранить только мультфильмы (категория содержит "М/ф").
 
@@ -337,81 +479,13 @@ def filter_epg_cartoons(
       Формат: {"our_id": "<id>", "epg": [только мультфильмы]}
     - Агрегация: data/epg_cartoons.json
     """
-    cfg = load_config()
-    setup_logging(cfg.log_level)
-
-    if not EPG_CHANNELS_DIR.exists():
-        print(f"[yellow]{EPG_CHANNELS_DIR} не найден. Сначала выполните fetch-epg-for-playlist[/yellow]")
-        raise typer.Exit(code=1)
-
-    files = sorted([p for p in EPG_CHANNELS_DIR.glob("*.json") if p.is_file()])
-    if not files:
-        print(f"[yellow]Нет файлов в {EPG_CHANNELS_DIR}[/yellow]")
-        raise typer.Exit(code=1)
-
-    saved = 0
-    aggregated: List[Dict[str, Any]] = []
-    processed = 0
-    for path in track(files, description="Фильтрация EPG по мультфильмам"):
-        processed += 1
-        try:
-            obj = json.loads(path.read_text(encoding="utf-8"))
-        except Exception as e:
-            print(f"[red]Ошибка чтения {path.name}: {e}[/red]")
-            continue
-
-        our_id = str(obj.get("our_id") or path.stem)
-        items = obj.get("epg")
-        if not isinstance(items, list):
-            for k in ("items", "results", "data"):
-                v = obj.get(k)
-                if isinstance(v, list):
-                    items = v
-                    break
-
-        if not isinstance(items, list):
-            print(f"[yellow]{path.name}: пропуск (не найден список EPG)[/yellow]")
-            continue
-
-        # Разворачиваем суточные группы, если формат: [{"date":..., "title":..., "data": [...]}]
-        flat_items: List[Dict[str, Any]] = []
-        for elem in items:
-            if isinstance(elem, dict) and isinstance(elem.get("data"), list):
-                for sub in elem["data"]:
-                    if isinstance(sub, dict):
-                        flat_items.append(sub)
-            elif isinstance(elem, dict):
-                flat_items.append(elem)
-
-        cartoons = filter_cartoons_by_category(flat_items)
-        if not cartoons:
-            out_path = EPG_CARTOONS_DIR / f"{our_id}.cartoons.json"
-            if out_path.exists():
-                try:
-                    out_path.unlink()
-                except Exception:
-                    pass
-            if skip_empty:
-                continue
-
-        out = {"our_id": our_id, "epg": cartoons}
-        out_path = EPG_CARTOONS_DIR / f"{our_id}.cartoons.json"
-        out_path.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
-        saved += 1
-        for m in cartoons:
-            if isinstance(m, dict):
-                m_with_id = dict(m)
-                m_with_id.setdefault("our_id", our_id)
-                aggregated.append(m_with_id)
-
-    EPG_CARTOONS_PATH.write_text(json.dumps(aggregated, ensure_ascii=False, indent=2), encoding="utf-8")
-    print(f"[green]Готово[/green]: обработано {processed} файлов, сохранено {saved} в {EPG_CARTOONS_DIR}; агрегировано {len(aggregated)} элементов в {EPG_CARTOONS_PATH}")
+    _run_filter_epg(["cartoons"], skip_empty, "Фильтрация EPG по мультфильмам", jobs, jsonl, incremental)
 
 
 @app.command()
 def download_posters_epg_movies(
     limit_per_channel: Optional[int] = typer.Option(None, help="Ограничить количество элементов на канал для скачивания постеров"),
-    workers: int = typer.Option(6, help="Количество параллельно обрабатываемых файлов каналов"),
+    workers: Optional[int] = typer.Option(None, help="Количество параллельно обрабатываемых файлов каналов (по умолчанию CONCURRENCY_MAX при адаптивном параллелизме, иначе 6)"),
 ) -> None:
     """Скачать постеры из TMDB для отфильтрованных фильмов по каждому каналу.
 
@@ -441,11 +515,17 @@ def download_posters_epg_movies(
     skipped: List[Dict[str, Any]] = []
     total_saved = 0
 
+    n_workers = _resolve_workers(cfg, workers)
+    sessions = SessionPool(cfg, n_workers)
+
     def process_file(p: Path) -> Dict[str, Any]:
-        local_session = create_session(cfg)
-        local_tmdb = TMDBClient(cfg, local_session)
+        with sessions.session() as local_session:
+            return _process_file(p, local_session)
+
+    def _process_file(p: Path, local_session) -> Dict[str, Any]:
+        local_tmdb = TMDBClient(cfg, local_session, memo=tmdb.memo)
         try:
-            obj = json.loads(p.read_text(encoding="utf-8"))
+            obj = read_json(p)
         except Exception as e:
             return {"mapped": [], "saved": 0, "skipped": [{"file": p.name, "reason": f"read_error: {e}"}]}
         our_id = str(obj.get("our_id") or p.stem.replace(".movies", ""))
@@ -467,16 +547,16 @@ def download_posters_epg_movies(
                 loc_skipped.append({"our_id": our_id, "id": it.get("id"), "reason": "no_title"})
                 continue
             year = _compute_year_from_ts(it.get("timestart"))
-            # Ретраи получения URL постера
+            # Ретраи только при ошибках сети: «не найдено» — окончательный ответ,
+            # он хранится в хранилище метаданных и повторно не запрашивается
             url = None
             for attempt in range(3):
                 try:
-                    url = local_tmdb.get_poster_url(title, year=year)
-                    if isinstance(url, str) and url.startswith("http"):
-                        break
+                    url = local_tmdb.find_poster_url(title, year=year)
+                    break
                 except Exception:
                     url = None
-                time.sleep(0.4 * (attempt + 1))
+                    time.sleep(0.4 * (attempt + 1))
             if not isinstance(url, str) or not url.startswith("http"):
                 loc_skipped.append({"our_id": our_id, "id": it.get("id"), "title": title, "reason": "no_tmdb_url"})
                 continue
@@ -498,7 +578,7 @@ def download_posters_epg_movies(
                 loc_skipped.append({"our_id": our_id, "id": it.get("id"), "title": title, "reason": "download_failed", "poster_url": url})
         return {"mapped": loc_mapped, "saved": saved, "skipped": loc_skipped}
 
-    with ThreadPoolExecutor(max_workers=max(1, int(workers))) as ex:
+    with ThreadPoolExecutor(max_workers=n_workers) as ex:
         futures = {ex.submit(process_file, p): p for p in files}
         for fut in track(as_completed(futures), description="Скачивание постеров (фильмы)", total=len(futures)):
             res = fut.result()
@@ -506,15 +586,20 @@ def download_posters_epg_movies(
             total_saved += int(res.get("saved", 0))
             skipped.extend(res.get("skipped", []))
 
-    EPG_MOVIES_POSTERS_PATH.write_text(json.dumps(mapped, ensure_ascii=False, indent=2), encoding="utf-8")
-    EPG_MOVIES_POSTERS_SKIPPED_PATH.write_text(json.dumps(skipped, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(EPG_MOVIES_POSTERS_PATH, mapped)
+    write_json(EPG_MOVIES_POSTERS_SKIPPED_PATH, skipped)
     print(f"[green]Готово[/green]: скачано {total_saved} постеров. Маппинг: {EPG_MOVIES_POSTERS_PATH}. Пропуски: {len(skipped)} → {EPG_MOVIES_POSTERS_SKIPPED_PATH}")
+    _print_concurrency_summary()
+    _print_metadata_summary(cfg)
+    _print_tmdb_summary(tmdb.memo)
+    _print_connection_summary(sessions)
+    sessions.close()
 
 
 @app.command()
 def download_posters_epg_cartoons(
     limit_per_channel: Optional[int] = typer.Option(None, help="Ограничить количество элементов на канал для скачивания постеров"),
-    workers: int = typer.Option(6, help="Количество параллельно обрабатываемых файлов каналов"),
+    workers: Optional[int] = typer.Option(None, help="Количество параллельно обрабатываемых файлов каналов (по умолчанию CONCURRENCY_MAX при адаптивном параллелизме, иначе 6)"),
 ) -> None:
     """Скачать постеры из TMDB для отфильтрованных мультфильмов по каждому каналу.
 
@@ -544,11 +629,17 @@ def download_posters_epg_cartoons(
     skipped: List[Dict[str, Any]] = []
     total_saved = 0
 
+    n_workers = _resolve_workers(cfg, workers)
+    sessions = SessionPool(cfg, n_workers)
+
     def process_file(p: Path) -> Dict[str, Any]:
-        local_session = create_session(cfg)
-        local_tmdb = TMDBClient(cfg, local_session)
+        with sessions.session() as local_session:
+            return _process_file(p, local_session)
+
+    def _process_file(p: Path, local_session) -> Dict[str, Any]:
+        local_tmdb = TMDBClient(cfg, local_session, memo=tmdb.memo)
         try:
-            obj = json.loads(p.read_text(encoding="utf-8"))
+            obj = read_json(p)
         except Exception as e:
             return {"mapped": [], "saved": 0, "skipped": [{"file": p.name, "reason": f"read_error: {e}"}]}
         our_id = str(obj.get("our_id") or p.stem.replace(".cartoons", ""))
@@ -570,16 +661,16 @@ def download_posters_epg_cartoons(
                 loc_skipped.append({"our_id": our_id, "id": it.get("id"), "reason": "no_title"})
                 continue
             year = _compute_year_from_ts(it.get("timestart"))
-            # Ретраи получения URL постера
+            # Ретраи только при ошибках сети: «не найдено» — окончательный ответ,
+            # он хранится в хранилище метаданных и повторно не запрашивается
             url = None
             for attempt in range(3):
                 try:
-                    url = local_tmdb.get_poster_url(title, year=year)
-                    if isinstance(url, str) and url.startswith("http"):
-                        break
+                    url = local_tmdb.find_poster_url(title, year=year)
+                    break
                 except Exception:
                     url = None
-                time.sleep(0.4 * (attempt + 1))
+                    time.sleep(0.4 * (attempt + 1))
             if not isinstance(url, str) or not url.startswith("http"):
                 loc_skipped.append({"our_id": our_id, "id": it.get("id"), "title": title, "reason": "no_tmdb_url"})
                 continue
@@ -601,7 +692,7 @@ def download_posters_epg_cartoons(
                 loc_skipped.append({"our_id": our_id, "id": it.get("id"), "title": title, "reason": "download_failed", "poster_url": url})
         return {"mapped": loc_mapped, "saved": saved, "skipped": loc_skipped}
 
-    with ThreadPoolExecutor(max_workers=max(1, int(workers))) as ex:
+    with ThreadPoolExecutor(max_workers=n_workers) as ex:
         futures = {ex.submit(process_file, p): p for p in files}
         for fut in track(as_completed(futures), description="Скачивание постеров (мультфильмы)", total=len(futures)):
             res = fut.result()
@@ -609,20 +700,205 @@ def download_posters_epg_cartoons(
             total_saved += int(res.get("saved", 0))
             skipped.extend(res.get("skipped", []))
 
-    EPG_CARTOONS_POSTERS_PATH.write_text(json.dumps(mapped, ensure_ascii=False, indent=2), encoding="utf-8")
-    EPG_CARTOONS_POSTERS_SKIPPED_PATH.write_text(json.dumps(skipped, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(EPG_CARTOONS_POSTERS_PATH, mapped)
+    write_json(EPG_CARTOONS_POSTERS_SKIPPED_PATH, skipped)
     print(f"[green]Готово[/green]: скачано {total_saved} постеров. Маппинг: {EPG_CARTOONS_POSTERS_PATH}. Пропуски: {len(skipped)} → {EPG_CARTOONS_POSTERS_SKIPPED_PATH}")
+    _print_concurrency_summary()
+    _print_metadata_summary(cfg)
+    _print_tmdb_summary(tmdb.memo)
+    _print_connection_summary(sessions)
+    sessions.close()
+
+
+def _airing_title(it: Dict[str, Any]) -> Optional[str]:
+    title = it.get("title") or it.get("name")
+    return title if isinstance(title, str) and title.strip() else None
+
+
+def _build_channel_json(
+    cfg: Config,
+    files: List[Path],
+    suffix: str,
+    posters_root: Path,
+    out_dir: Path,
+    limit_per_channel: Optional[int],
+    workers: Optional[int],
+    description: str,
+    download_workers: Optional[int] = None,
+) -> None:
+    """Общая часть build-channel-json-*: дедупликация показов, обогащение, раздача по каналам.
+
+    Показы всех каналов группируются по произведению (нормализованное название +
+    год показа); TMDB и загрузка постера выполняются один раз на произведение,
+    после чего результат раздаётся каждому показу в per-channel JSON.
+
+    Произведения проходят конвейер (`pipeline.Pipeline`) из стадий поиска,
+    выбора постера, загрузки и записи с отдельными пулами потоков (`workers`,
+    `download_workers`) и ограниченными очередями между ними: медленный CDN
+    не тормозит поиск метаданных. Файл канала пишется, как только готовы все
+    его произведения.
+    """
+    errors: List[str] = []
+    channels: List[Tuple[str, List[Dict[str, Any]]]] = []
+    for p in files:
+        try:
+            obj = read_json(p)
+        except Exception as e:
+            errors.append(f"{p.name}: read_error: {e}")
+            continue
+        our_id = str(obj.get("our_id") or p.stem.replace(suffix, ""))
+        items = obj.get("epg")
+        if not isinstance(items, list):
+            errors.append(f"{p.name}: no_epg_list")
+            continue
+        if limit_per_channel is not None:
+            items = items[:limit_per_channel]
+        channels.append((our_id, [it for it in items if isinstance(it, dict) and _airing_title(it)]))
+
+    groups, stats = group_by_work(
+        ((our_id, it) for our_id, items in channels for it in items),
+        key=lambda e: work_key(_airing_title(e[1]), _compute_year_from_ts(e[1].get("timestart"))),
+    )
+
+    n_workers = _resolve_workers(cfg, workers)
+    n_download = _resolve_workers(cfg, download_workers) if download_workers is not None else n_workers
+    sessions = SessionPool(cfg, n_workers + n_download)
+    memo = TMDBLookupMemo()
+
+    def airing_key(it: Dict[str, Any]) -> Any:
+        return work_key(_airing_title(it), _compute_year_from_ts(it.get("timestart")))
+
+    # Стадии конвейера: поиск (TMDB) -> выбор постера -> загрузка -> запись каналов
+    def lookup(entry: Tuple[Any, List[Tuple[str, Dict[str, Any]]]]) -> Dict[str, Any]:
+        key, airings = entry
+        first = airings[0][1]
+        year_hint = _compute_year_from_ts(first.get("timestart"))
+        with sessions.session() as session:
+            info = TMDBClient(cfg, session, memo=memo).get_movie_info(_airing_title(first), year=year_hint)
+        return {"key": key, "airings": airings, "info": info, "year_hint": year_hint}
+
+    def select(state: Dict[str, Any]) -> Dict[str, Any]:
+        # Подбор URL постера: TMDB -> превью из EPG (первого показа, где оно есть)
+        info, airings = state["info"], state["airings"]
+        candidate_urls: List[Dict[str, Any]] = []
+        if isinstance(info, dict):
+            pu = info.get("poster_url")
+            if isinstance(pu, str) and pu.startswith("http"):
+                candidate_urls.append({"url": pu, "source": "tmdb", "airing": airings[0]})
+        for a_our_id, a in airings:
+            prev_url = a.get("preview")
+            if isinstance(prev_url, str) and prev_url.startswith("http"):
+                candidate_urls.append({"url": prev_url, "source": "preview", "airing": (a_our_id, a)})
+                break
+        state["candidates"] = candidate_urls
+        return state
+
+    def download(state: Dict[str, Any]) -> Dict[str, Any]:
+        info = state["info"]
+        poster_local: Optional[str] = None
+        poster_source: Optional[str] = None
+        poster_ext_url: Optional[str] = None
+        if state["candidates"]:
+            with sessions.session() as session:
+                for cand in state["candidates"]:
+                    poster_ext_url = cand["url"]
+                    # Постер кладётся туда же, куда и раньше для этого показа: повторно не скачивается
+                    owner_id, owner = cand["airing"]
+                    local = download_poster(
+                        session=session,
+                        url=poster_ext_url,
+                        posters_dir=posters_root / owner_id,
+                        title=_airing_title(owner),
+                        epg_id=owner.get("id"),
+                        year=info.get("year") if isinstance(info, dict) else state["year_hint"],
+                        source=cand.get("source"),
+                    )
+                    if local:
+                        poster_local = local
+                        poster_source = cand.get("source")
+                        break
+        state["work"] = {
+            "kinopoisk": info,  # TMDB-совместимая структура
+            "poster_url": poster_ext_url,
+            "poster_local": poster_local,
+            "poster_static": _static_url_from_local(poster_local),
+            "poster_source": poster_source,
+        }
+        return state
+
+    # Канал записывается, как только готовы все его произведения
+    works: Dict[Any, Dict[str, Any]] = {}
+    waiting: Dict[str, set] = {our_id: {airing_key(it) for it in items} for our_id, items in channels}
+    channels_by_key: Dict[Any, List[str]] = {}
+    for our_id, keys in waiting.items():
+        for key in keys:
+            channels_by_key.setdefault(key, []).append(our_id)
+    items_by_channel = dict(channels)
+    written = {"airings": 0}
+
+    def write_channel(our_id: str) -> None:
+        enriched_items: List[Dict[str, Any]] = []
+        for it in items_by_channel[our_id]:
+            enriched_items.append({
+                "id": it.get("id"),
+                "title": _airing_title(it),
+                "desc": it.get("desc"),
+                "timestart": it.get("timestart"),
+                "timestop": it.get("timestop"),
+                "preview": it.get("preview"),
+                "our_id": our_id,
+                **works[airing_key(it)],
+            })
+        write_json(out_dir / f"{our_id}.json", {"our_id": our_id, "count": len(enriched_items), "items": enriched_items})
+        written["airings"] += len(enriched_items)
+
+    def write(state: Dict[str, Any]) -> Dict[str, Any]:
+        works[state["key"]] = state["work"]
+        for our_id in channels_by_key.get(state["key"], []):
+            pending = waiting[our_id]
+            pending.discard(state["key"])
+            if not pending:
+                write_channel(our_id)
+        return state
+
+    for our_id, _ in channels:
+        if not waiting[our_id]:
+            write_channel(our_id)
+
+    pipeline = Pipeline([
+        Stage("lookup", lookup, workers=n_workers),
+        Stage("select", select),
+        Stage("download", download, workers=n_download),
+        Stage("write", write),
+    ])
+    for _ in track(pipeline.run(groups.items()), description=description, total=len(groups)):
+        pass
+    total_saved = written["airings"]
+
+    print(f"[green]Готово[/green]: записано {total_saved} элементов. Выход: {out_dir}")
+    print(f"[cyan]Дедупликация[/cyan]: {stats.describe()}")
+    if errors:
+        print(f"[yellow]Ошибки[/yellow]: {len(errors)}")
+    _print_concurrency_summary()
+    _print_metadata_summary(cfg)
+    _print_tmdb_summary(memo)
+    _print_pipeline_summary(pipeline)
+    _print_connection_summary(sessions)
+    sessions.close()
 
 
 @app.command()
 def build_channel_json_movies(
     limit_per_channel: Optional[int] = typer.Option(None, help="Ограничить количество элементов на канал"),
-    workers: int = typer.Option(6, help="Количество параллельно обрабатываемых файлов каналов"),
+    workers: Optional[int] = typer.Option(None, help="Количество параллельно обогащаемых произведений (по умолчанию CONCURRENCY_MAX при адаптивном параллелизме, иначе 6)"),
+    download_workers: Optional[int] = typer.Option(None, help="Потоков загрузки постеров (по умолчанию как --workers)"),
 ) -> None:
     """Сформировать per-channel JSON с обогащением TMDB для фильмов.
 
     Источник: `data/epg_channels_filtered/*.movies.json`
     Результат: `data/channel_json/movies/{our_id}.json`
+
+    Показы одного фильма на разных каналах и в разные дни обогащаются один раз.
     """
     cfg = load_config()
     setup_logging(cfg.log_level)
@@ -635,97 +911,24 @@ def build_channel_json_movies(
         print(f"[yellow]Нет файлов фильмов в {EPG_FILTERED_DIR}[/yellow]")
         raise typer.Exit(code=1)
 
-    def process_file(p: Path) -> Dict[str, Any]:
-        session = create_session(cfg)
-        tmdb = TMDBClient(cfg, session)
-        try:
-            obj = json.loads(p.read_text(encoding="utf-8"))
-        except Exception as e:
-            return {"saved": 0, "errors": [f"{p.name}: read_error: {e}"]}
-        our_id = str(obj.get("our_id") or p.stem.replace(".movies", ""))
-        items = obj.get("epg")
-        if not isinstance(items, list):
-            return {"saved": 0, "errors": [f"{p.name}: no_epg_list"]}
-        if limit_per_channel is not None:
-            items = items[:limit_per_channel]
-        posters_dir = POSTERS_MOVIES_DIR / our_id
-        enriched_items: List[Dict[str, Any]] = []
-        for it in items:
-            if not isinstance(it, dict):
-                continue
-            title = it.get("title") or it.get("name")
-            if not isinstance(title, str) or not title.strip():
-                continue
-            year_hint = _compute_year_from_ts(it.get("timestart"))
-            info = tmdb.get_movie_info(title, year=year_hint)
-            # Подбор URL постера: TMDB -> превью из EPG
-            candidate_urls: List[Dict[str, Any]] = []
-            if isinstance(info, dict):
-                pu = info.get("poster_url")
-                if isinstance(pu, str) and pu.startswith("http"):
-                    candidate_urls.append({"url": pu, "source": "tmdb"})
-            prev_url = it.get("preview")
-            if isinstance(prev_url, str) and prev_url.startswith("http"):
-                candidate_urls.append({"url": prev_url, "source": "preview"})
-            poster_local: Optional[str] = None
-            poster_source: Optional[str] = None
-            poster_ext_url: Optional[str] = None
-            for cand in candidate_urls:
-                poster_ext_url = cand["url"]
-                local = download_poster(
-                    session=session,
-                    url=poster_ext_url,
-                    posters_dir=posters_dir,
-                    title=title,
-                    epg_id=it.get("id"),
-                    year=info.get("year") if isinstance(info, dict) else year_hint,
-                    source=cand.get("source"),
-                )
-                if local:
-                    poster_local = local
-                    poster_source = cand.get("source")
-                    break
-            enriched_items.append({
-                "id": it.get("id"),
-                "title": title,
-                "desc": it.get("desc"),
-                "timestart": it.get("timestart"),
-                "timestop": it.get("timestop"),
-                "preview": it.get("preview"),
-                "our_id": our_id,
-                "kinopoisk": info,  # TMDB-совместимая структура
-                "poster_url": poster_ext_url,
-                "poster_local": poster_local,
-                "poster_static": _static_url_from_local(poster_local),
-                "poster_source": poster_source,
-            })
-        out = {"our_id": our_id, "count": len(enriched_items), "items": enriched_items}
-        out_path = CHANNEL_MOVIES_DIR / f"{our_id}.json"
-        out_path.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
-        return {"saved": len(enriched_items), "errors": []}
-
-    total_saved = 0
-    total_errors: List[str] = []
-    with ThreadPoolExecutor(max_workers=max(1, int(workers))) as ex:
-        futures = {ex.submit(process_file, p): p for p in files}
-        for fut in track(as_completed(futures), description="Формирование per-channel JSON (фильмы)", total=len(futures)):
-            res = fut.result()
-            total_saved += int(res.get("saved", 0))
-            total_errors.extend(res.get("errors", []))
-    print(f"[green]Готово[/green]: записано {total_saved} элементов. Выход: {CHANNEL_MOVIES_DIR}")
-    if total_errors:
-        print(f"[yellow]Ошибки[/yellow]: {len(total_errors)}")
+    _build_channel_json(
+        cfg, files, ".movies", POSTERS_MOVIES_DIR, CHANNEL_MOVIES_DIR, limit_per_channel, workers,
+        "Формирование per-channel JSON (фильмы)", download_workers=download_workers,
+    )
 
 
 @app.command()
 def build_channel_json_cartoons(
     limit_per_channel: Optional[int] = typer.Option(None, help="Ограничить количество элементов на канал"),
-    workers: int = typer.Option(6, help="Количество параллельно обрабатываемых файлов каналов"),
+    workers: Optional[int] = typer.Option(None, help="Количество параллельно обогащаемых произведений (по умолчанию CONCURRENCY_MAX при адаптивном параллелизме, иначе 6)"),
+    download_workers: Optional[int] = typer.Option(None, help="Потоков загрузки постеров (по умолчанию как --workers)"),
 ) -> None:
     """Сформировать per-channel JSON с обогащением TMDB для мультфильмов.
 
     Источник: `data/epg_channels_cartoons/*.cartoons.json`
     Результат: `data/channel_json/cartoons/{our_id}.json`
+
+    Показы одного мультфильма на разных каналах и в разные дни обогащаются один раз.
     """
     cfg = load_config()
     setup_logging(cfg.log_level)
@@ -738,88 +941,58 @@ def build_channel_json_cartoons(
         print(f"[yellow]Нет файлов мультфильмов в {EPG_CARTOONS_DIR}[/yellow]")
         raise typer.Exit(code=1)
 
-    def process_file(p: Path) -> Dict[str, Any]:
-        session = create_session(cfg)
-        tmdb = TMDBClient(cfg, session)
-        try:
-            obj = json.loads(p.read_text(encoding="utf-8"))
-        except Exception as e:
-            return {"saved": 0, "errors": [f"{p.name}: read_error: {e}"]}
-        our_id = str(obj.get("our_id") or p.stem.replace(".cartoons", ""))
-        items = obj.get("epg")
-        if not isinstance(items, list):
-            return {"saved": 0, "errors": [f"{p.name}: no_epg_list"]}
-        if limit_per_channel is not None:
-            items = items[:limit_per_channel]
-        posters_dir = POSTERS_CARTOONS_DIR / our_id
-        enriched_items: List[Dict[str, Any]] = []
-        for it in items:
-            if not isinstance(it, dict):
-                continue
-            title = it.get("title") or it.get("name")
-            if not isinstance(title, str) or not title.strip():
-                continue
-            year_hint = _compute_year_from_ts(it.get("timestart"))
-            info = tmdb.get_movie_info(title, year=year_hint)
-            candidate_urls: List[Dict[str, Any]] = []
-            if isinstance(info, dict):
-                pu = info.get("poster_url")
-                if isinstance(pu, str) and pu.startswith("http"):
-                    candidate_urls.append({"url": pu, "source": "tmdb"})
-            prev_url = it.get("preview")
-            if isinstance(prev_url, str) and prev_url.startswith("http"):
-                candidate_urls.append({"url": prev_url, "source": "preview"})
-            poster_local: Optional[str] = None
-            poster_source: Optional[str] = None
-            poster_ext_url: Optional[str] = None
-            for cand in candidate_urls:
-                poster_ext_url = cand["url"]
-                local = download_poster(
-                    session=session,
-                    url=poster_ext_url,
-                    posters_dir=posters_dir,
-                    title=title,
-                    epg_id=it.get("id"),
-                    year=info.get("year") if isinstance(info, dict) else year_hint,
-                    source=cand.get("source"),
-                )
-                if local:
-                    poster_local = local
-                    poster_source = cand.get("source")
-                    break
-            enriched_items.append({
-                "id": it.get("id"),
-                "title": title,
-                "desc": it.get("desc"),
-                "timestart": it.get("timestart"),
-                "timestop": it.get("timestop"),
-                "preview": it.get("preview"),
-                "our_id": our_id,
-                "kinopoisk": info,
-                "poster_url": poster_ext_url,
-                "poster_local": poster_local,
-                "poster_static": _static_url_from_local(poster_local),
-                "poster_source": poster_source,
-            })
-        out = {"our_id": our_id, "count": len(enriched_items), "items": enriched_items}
-        out_path = CHANNEL_CARTOONS_DIR / f"{our_id}.json"
-        out_path.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
-        return {"saved": len(enriched_items), "errors": []}
-
-    total_saved = 0
-    total_errors: List[str] = []
-    with ThreadPoolExecutor(max_workers=max(1, int(workers))) as ex:
-        futures = {ex.submit(process_file, p): p for p in files}
-        for fut in track(as_completed(futures), description="Формирование per-channel JSON (мультфильмы)", total=len(futures)):
-            res = fut.result()
-            total_saved += int(res.get("saved", 0))
-            total_errors.extend(res.get("errors", []))
-    print(f"[green]Готово[/green]: записано {total_saved} элементов. Выход: {CHANNEL_CARTOONS_DIR}")
-    if total_errors:
-        print(f"[yellow]Ошибки[/yellow]: {len(total_errors)}")
-
-def _enrich(limit: Optional[int] = None) -> None:
-    """Внутренняя реализация обогащения фильмов."""
+    _build_channel_json(
+        cfg, files, ".cartoons", POSTERS_CARTOONS_DIR, CHANNEL_CARTOONS_DIR, limit_per_channel, workers,
+        "Формирование per-channel JSON (мультфильмы)", download_workers=download_workers,
+    )
+
+
+def _enrich_work(item: Dict[str, Any], session, tmdb: TMDBClient, kp: KinoPoiskClient) -> Dict[str, Any]:
+    """Обогатить произведение по первому показу: данные TMDB/КиноПоиска и постер."""
+    title = item.get("title") or item.get("name")
+    # 1) Пытаемся получить данные из TMDB, 2) если нет — из КиноПоиска
+    tmdb_info = tmdb.get_movie_info(title)
+    info = tmdb_info if tmdb_info else kp.get_movie_info(title)
+
+    # Дополнительный fallback: отдельный запрос к TMDB только за постером.
+    # Если данные уже из TMDB, ищем тем же запросом (без года) — ответ берётся из memo
+    tmdb_url = None
+    if tmdb.is_enabled():
+        year_hint = None
+        if not tmdb_info and isinstance(info, dict) and isinstance(info.get("year"), int):
+            year_hint = info.get("year")
+        tmdb_url = tmdb.get_poster_url(title, year=year_hint)
+    # Подбор URL постера: сначала TMDB, затем КиноПоиск, затем превью из EPG
+    candidate_urls = poster_candidates(info, tmdb_url, item.get("preview"))
+    year_for_name = poster_year(info, item)
+
+    poster_local: Any = None
+    poster_source: Any = None
+    for cand in candidate_urls:
+        url = cand["url"]
+        poster_local = download_poster(
+            session=session,
+            url=url,
+            posters_dir=POSTERS_DIR,
+            title=title,
+            epg_id=item.get("id"),
+            year=year_for_name,
+            source=cand.get("source"),
+        )
+        if poster_local:
+            poster_source = cand.get("source")
+            break
+
+    return {"kinopoisk": info, "poster_local": poster_local, "poster_source": poster_source}
+
+
+def _enrich(limit: Optional[int] = None, async_engine: bool = False) -> None:
+    """Внутренняя реализация обогащения фильмов.
+
+    С `async_engine` произведения обогащаются асинхронным движком
+    (`async_enrich`); переиспользование прежних результатов и порядок
+    вывода те же.
+    """
     cfg = load_config()
     setup_logging(cfg.log_level)
     session = create_session(cfg)
@@ -830,7 +1003,7 @@ def _enrich(limit: Optional[int] = None) -> None:
         print(f"[yellow]{MOVIES_PATH} не найден. Сначала выполните filter-movies[/yellow]")
         raise typer.Exit(code=1)
 
-    movies: List[Dict[str, Any]] = json.loads(MOVIES_PATH.read_text(encoding="utf-8"))
+    movies: List[Dict[str, Any]] = read_json(MOVIES_PATH)
     if limit is not None:
         movies = movies[:limit]
 
@@ -838,7 +1011,7 @@ def _enrich(limit: Optional[int] = None) -> None:
     prev_by_id: Dict[Any, Dict[str, Any]] = {}
     if ENRICHED_PATH.exists():
         try:
-            prev_items: List[Dict[str, Any]] = json.loads(ENRICHED_PATH.read_text(encoding="utf-8"))
+            prev_items: List[Dict[str, Any]] = read_json(ENRICHED_PATH)
             for it in prev_items:
                 key = it.get("id") or (it.get("title"), it.get("timestart"))
                 if key is not None:
@@ -846,8 +1019,11 @@ def _enrich(limit: Optional[int] = None) -> None:
         except Exception:
             prev_by_id = {}
 
-    enriched: List[Dict[str, Any]] = []
-    for item in track(movies, description="Обогащение (TMDB->КиноПоиск) и загрузка постеров"):
+    # Показы, для которых нет готового результата, группируются по названию:
+    # обогащение и загрузка постера выполняются один раз на произведение
+    enriched: List[Optional[Dict[str, Any]]] = []
+    pending: List[Tuple[int, Dict[str, Any]]] = []
+    for item in movies:
         title = item.get("title") or item.get("name")
         # Переиспользование постеров/данных, если ранее уже были сохранены и файл существует
         prev_key = item.get("id") or (item.get("title"), item.get("timestart"))
@@ -864,78 +1040,98 @@ def _enrich(limit: Optional[int] = None) -> None:
         if not isinstance(title, str) or not title.strip():
             enriched.append({**item, "kinopoisk": None, "poster_local": None})
             continue
-        # 1) Пытаемся получить данные из TMDB, 2) если нет — из КиноПоиска
-        tmdb_info = tmdb.get_movie_info(title)
-        info = tmdb_info if tmdb_info else kp.get_movie_info(title)
-
-        # Подбор URL постера: сначала TMDB, затем КиноПоиск, затем превью из EPG
-        candidate_urls: List[Dict[str, Any]] = []  # {url, source}
-        if isinstance(info, dict):
-            # Если инфо из TMDB и содержит постер — приоритет
-            if info.get("source") == "tmdb":
-                pu = info.get("poster_url")
-                if isinstance(pu, str) and pu.startswith("http"):
-                    candidate_urls.append({"url": pu, "source": "tmdb"})
-            # Fallback: для КиноПоиска, если указан постер
-            pu_kp = info.get("poster_url")
-            if isinstance(pu_kp, str) and pu_kp.startswith("http"):
-                candidate_urls.append({"url": pu_kp, "source": "kinopoisk"})
-        # Дополнительный fallback: отдельный запрос к TMDB только за постером (если не нашли выше)
-        if tmdb.is_enabled():
-            year_hint = None
-            if isinstance(info, dict) and isinstance(info.get("year"), int):
-                year_hint = info.get("year")
-            tmdb_url = tmdb.get_poster_url(title, year=year_hint)
-            if isinstance(tmdb_url, str) and tmdb_url.startswith("http"):
-                candidate_urls.append({"url": tmdb_url, "source": "tmdb"})
-        # Последний вариант — превью из EPG
-        prev_url = item.get("preview")
-        if isinstance(prev_url, str) and prev_url.startswith("http"):
-            candidate_urls.append({"url": prev_url, "source": "preview"})
-
-        # Вычислим год для имени файла
-        year_for_name = None
-        if isinstance(info, dict) and isinstance(info.get("year"), int):
-            year_for_name = info.get("year")
-        else:
-            ts_any = item.get("timestart")
-            year_for_name = _compute_year_from_ts(ts_any)
-
-        poster_local: Any = None
-        poster_source: Any = None
-        for cand in candidate_urls:
-            url = cand["url"]
-            poster_local = download_poster(
-                session=session,
-                url=url,
-                posters_dir=POSTERS_DIR,
-                title=title,
-                epg_id=item.get("id"),
-                year=year_for_name,
-                source=cand.get("source"),
+        pending.append((len(enriched), item))
+        enriched.append(None)
+
+    groups, stats = group_by_work(pending, key=lambda e: work_key(e[1].get("title") or e[1].get("name")))
+    works = list(groups.values())
+    memo: Any = tmdb.memo
+    if async_engine:
+        with Progress() as progress:
+            task = progress.add_task("Обогащение (async: TMDB->КиноПоиск) и загрузка постеров", total=len(works))
+            results, memo = run_async_enrichment(
+                cfg, [airings[0][1] for airings in works], POSTERS_DIR, on_done=lambda: progress.advance(task)
             )
-            if poster_local:
-                poster_source = cand.get("source")
-                break
+    else:
+        results = [
+            _enrich_work(airings[0][1], session, tmdb, kp)
+            for airings in track(works, description="Обогащение (TMDB->КиноПоиск) и загрузка постеров")
+        ]
+    for airings, work in zip(works, results):
+        for idx, item in airings:
+            enriched[idx] = {**item, **work}
+
+    write_json(ENRICHED_PATH, enriched)
+    print(f"[green]Сохранено[/green] {len(enriched)} элементов в {ENRICHED_PATH}")
+    print(f"[cyan]Дедупликация[/cyan]: {stats.describe()}")
+    _print_metadata_summary(cfg)
+    _print_tmdb_summary(memo)
+    breaker = kp.record_run_metrics()
+    metrics_logger.save_metrics()
+    if breaker["opened"] or breaker["short_circuited"]:
+        print(
+            f"[yellow]Веб-поиск КиноПоиска[/yellow]: состояние {breaker['state']}, "
+            f"открытий {breaker['opened']}, пропущено запросов {breaker['short_circuited']}"
+        )
 
-        enriched.append({**item, "kinopoisk": info, "poster_local": poster_local, "poster_source": poster_source})
 
-    ENRICHED_PATH.write_text(json.dumps(enriched, ensure_ascii=False, indent=2), encoding="utf-8")
-    print(f"[green]Сохранено[/green] {len(enriched)} элементов в {ENRICHED_PATH}")
+ASYNC_ENGINE_HELP = "Асинхронный движок обогащения (httpx; пределы ASYNC_*_CONCURRENCY по источникам)"
 
 
 @app.command()
-def enrich(limit: Optional[int] = typer.Option(None, help="Ограничить количество фильмов для обогащения")) -> None:
+def enrich(
+    limit: Optional[int] = typer.Option(None, help="Ограничить количество фильмов для обогащения"),
+    async_engine: bool = typer.Option(False, "--async-engine", help=ASYNC_ENGINE_HELP),
+) -> None:
     """CLI-обёртка над _enrich."""
-    _enrich(limit)
+    _enrich(limit, async_engine=async_engine)
+
+
+def _require_metadata_store(cfg: Config):
+    store = get_metadata_store(cfg)
+    if store is None:
+        print("[red]Хранилище метаданных отключено (METADATA_STORE_ENABLED=false)[/red]")
+        raise typer.Exit(code=1)
+    return store
 
 
 @app.command()
-def run_all() -> None:
+def export_metadata(
+    path: Path = typer.Argument(Path("cache/metadata_export.jsonl"), help="Куда выгрузить записи (JSON Lines)"),
+    source: Optional[str] = typer.Option(None, help="Только один источник (kinopoisk, tmdb:ru-RU, ...)"),
+) -> None:
+    """Выгрузить свежие записи хранилища метаданных в JSON Lines."""
+    cfg = load_config()
+    setup_logging(cfg.log_level)
+    store = _require_metadata_store(cfg)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    n = store.export_jsonl(path, source=source)
+    print(f"[green]Выгружено[/green] {n} записей из {store.path} в {path}")
+
+
+@app.command()
+def import_metadata(
+    path: Path = typer.Argument(..., help="Файл, созданный export-metadata"),
+) -> None:
+    """Загрузить записи в хранилище метаданных одной транзакцией (записи с тем же ключом заменяются)."""
+    cfg = load_config()
+    setup_logging(cfg.log_level)
+    store = _require_metadata_store(cfg)
+    if not path.exists():
+        print(f"[red]Нет файла[/red] {path}")
+        raise typer.Exit(code=1)
+    n = store.import_jsonl(path)
+    print(f"[green]Загружено[/green] {n} записей в {store.path}")
+
+
+@app.command()
+def run_all(
+    async_engine: bool = typer.Option(False, "--async-engine", help=ASYNC_ENGINE_HELP),
+) -> None:
     """Полный цикл: загрузка EPG, фильтрация фильмов, обогащение."""
     fetch_epg_cmd()
     filter_movies_cmd()
-    _enrich()
+    _enrich(async_engine=async_engine)
 
 
 if __name__ == "__main__":
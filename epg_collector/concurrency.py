@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+
+class AIMDLimiter:
+    """Адаптивный предел одновременных запросов к одному хосту (AIMD).
+
+    Пока ответы успешны и задержка близка к базовой, предел растёт на 1 за
+    каждые `limit` успешных ответов (аддитивно). На 429/5xx/сетевую ошибку
+    он умножается на `backoff`, на всплеск задержки — на `latency_backoff`
+    (мультипликативно); снижение не чаще одного раза за сглаженную задержку,
+    чтобы одна «волна» ошибок не обнуляла предел.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 16,
+        backoff: float = 0.5,
+        latency_backoff: float = 0.8,
+        latency_tolerance: float = 3.0,
+    ):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.backoff = backoff
+        self.latency_backoff = latency_backoff
+        self.latency_tolerance = latency_tolerance
+        self._inflight = 0
+        self._baseline: Optional[float] = None
+        self._smoothed: Optional[float] = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self.stats: Dict[str, float] = {
+            "requests": 0,
+            "overloaded": 0,
+            "decreases": 0,
+            "min_seen": int(self.limit),
+            "max_seen": int(self.limit),
+        }
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self._inflight >= int(self.limit):
+                self._cond.wait()
+            self._inflight += 1
+
+    def release(self, latency: float, overloaded: bool = False) -> None:
+        """Освободить слот и скорректировать предел по результату запроса."""
+        with self._cond:
+            saturated = self._inflight >= int(self.limit)
+            self._inflight -= 1
+            self.stats["requests"] += 1
+            if overloaded:
+                self.stats["overloaded"] += 1
+                self._decrease(self.backoff)
+            elif self._latency_spike(latency):
+                self._decrease(self.latency_backoff)
+            elif saturated:
+                # Растём только когда предел действительно упирался в нагрузку
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            self.stats["max_seen"] = max(self.stats["max_seen"], int(self.limit))
+            self._cond.notify_all()
+
+    def _latency_spike(self, latency: float) -> bool:
+        if self._baseline is None:
+            self._baseline = self._smoothed = latency
+            return False
+        # Базовая задержка быстро следует вниз и медленно — вверх
+        if latency < self._baseline:
+            self._baseline = (self._baseline + latency) / 2
+        else:
+            self._baseline += (latency - self._baseline) * 0.01
+        self._smoothed += (latency - self._smoothed) * 0.3
+        return self._smoothed > max(self._baseline * self.latency_tolerance, 0.05)
+
+    def _decrease(self, factor: float) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < (self._smoothed or 0.0):
+            return
+        self._last_decrease = now
+        new_limit = max(float(self.min_limit), self.limit * factor)
+        if int(new_limit) < int(self.limit):
+            self.stats["decreases"] += 1
+        self.limit = new_limit
+        self.stats["min_seen"] = min(self.stats["min_seen"], int(self.limit))
+
+
+class ConcurrencyController:
+    """Набор `AIMDLimiter` по хостам, общий для всех сессий процесса."""
+
+    def __init__(self, enabled: bool = True, initial: int = 4, max_limit: int = 16):
+        self._lock = threading.Lock()
+        self.enabled = enabled
+        self.initial = initial
+        self.max_limit = max_limit
+        self._limiters: Dict[str, AIMDLimiter] = {}
+
+    def configure(self, enabled: bool, initial: int, max_limit: int) -> None:
+        with self._lock:
+            if (enabled, initial, max_limit) == (self.enabled, self.initial, self.max_limit):
+                return
+            self.enabled = enabled
+            self.initial = initial
+            self.max_limit = max_limit
+            self._limiters.clear()
+
+    def limiter(self, url: str) -> Optional[AIMDLimiter]:
+        if not self.enabled:
+            return None
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            lim = self._limiters.get(host)
+            if lim is None:
+                lim = AIMDLimiter(initial=self.initial, max_limit=self.max_limit)
+                self._limiters[host] = lim
+            return lim
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Текущий предел и статистика по каждому хосту (для итогов прогона)."""
+        with self._lock:
+            items = list(self._limiters.items())
+        return {
+            host: dict(lim.stats, limit=int(lim.limit))
+            for host, lim in sorted(items)
+            if lim.stats["requests"]
+        }
+
+
+_controller = ConcurrencyController()
+
+
+def get_concurrency_controller() -> ConcurrencyController:
+    """Общий на процесс адаптивный контроллер параллелизма."""
+    return _controller
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Dict, Optional, List
 from dotenv import load_dotenv
 
+from .filters import DEFAULT_BUCKETS, parse_buckets
+from .http_cache import parse_cache_rules
+from .rate_limit import parse_rate_limits
+
 
 @dataclass
 class Config:
@@ -24,23 +28,65 @@ class Config:
     http_retries: int = 3
     http_backoff: float = 0.5
 
+    # Параллельная загрузка EPG по каналам (максимум запросов «в полёте»)
+    iptv_concurrency: int = 8
+    # Инкрементальный режим: сколько последних дней окна перезапрашивать, если все дни уже есть
+    iptv_incremental_overlap: int = 1
+    # --resume: пропускать каналы, загруженные не позже стольких секунд назад
+    iptv_resume_window: int = 21600
+    # Повтор неудачных каналов в конце запуска: число раундов и начальная пауза (с)
+    iptv_retry_rounds: int = 2
+    iptv_retry_backoff: float = 5.0
+
+    # Ограничение частоты запросов по хосту (запросов/с), общее для всех сессий процесса
+    rate_limits: Dict[str, float] = field(default_factory=dict)
+    rate_limit_default: float = 0.0
+
+    # Адаптивный предел одновременных запросов к хосту (AIMD): стартовое и максимальное значения
+    adaptive_concurrency: bool = True
+    concurrency_initial: int = 4
+    concurrency_max: int = 16
+    # Асинхронный движок enrich --async-engine: одновременных запросов к каждому источнику
+    async_tmdb_concurrency: int = 8
+    async_kinopoisk_concurrency: int = 2
+    async_poster_concurrency: int = 8
+
     # Cache
     cache_enabled: bool = True
     cache_path: str = "cache/http_cache"
     cache_expire: int = 3600
+    # Время жизни по хостам (0 — не кэшировать) и предельный размер файла кэша
+    cache_rules: Dict[str, int] = field(default_factory=dict)
+    cache_max_mb: int = 512
+
+    # Хранилище метаданных обогащения (SQLite): TTL найденных и ненайденных названий
+    metadata_store_enabled: bool = True
+    metadata_store_path: str = "cache/metadata.sqlite"
+    metadata_ttl_days: float = 30.0
+    metadata_negative_ttl_hours: float = 24.0
 
     # Kinopoisk
     kinopoisk_api_key: Optional[str] = None
     kinopoisk_base_url: str = "https://api.kinopoisk.dev/v1.4"
+    # Предохранитель веб-скрейпинга: сколько блокировок подряд до паузы и длительность паузы (с)
+    kinopoisk_breaker_threshold: int = 5
+    kinopoisk_breaker_cooldown: float = 300.0
 
     # TMDB (опционально)
     tmdb_api_key: Optional[str] = None
     tmdb_base_url: str = "https://api.themoviedb.org/3"
     tmdb_image_base: str = "https://image.tmdb.org/t/p/w500"
+    tmdb_details: bool = False
+
+    # Корзины классификатора filter-epg: имя -> значения поля category
+    epg_buckets: Dict[str, List[str]] = field(default_factory=dict)
 
     # Logging
     log_level: str = "INFO"
 
+    # JSON-артефакты пайплайна с отступами (по умолчанию компактно)
+    json_pretty: bool = False
+
     # API settings
     api_host: str = "0.0.0.0"
     api_port: int = 8000
@@ -50,6 +96,12 @@ class Config:
     auto_run_pipeline: bool = False
 
 
+def json_pretty_from_env() -> bool:
+    """JSON_PRETTY из .env/окружения — без разбора остальной конфигурации (для `cli --pretty`)."""
+    load_dotenv(override=False)
+    return os.getenv("JSON_PRETTY", "false").lower() == "true"
+
+
 def load_config() -> Config:
     """Загрузка конфигурации из .env и переменных окружения."""
     load_dotenv(override=False)
@@ -101,19 +153,45 @@ def load_config() -> Config:
     http_timeout = int(os.getenv("HTTP_TIMEOUT", 30))
     http_retries = int(os.getenv("HTTP_RETRIES", 3))
     http_backoff = float(os.getenv("HTTP_BACKOFF", 0.5))
+    iptv_concurrency = int(os.getenv("IPTV_CONCURRENCY", 8))
+    iptv_incremental_overlap = int(os.getenv("IPTV_INCREMENTAL_OVERLAP", 1))
+    iptv_resume_window = int(os.getenv("IPTV_RESUME_WINDOW", 21600))
+    iptv_retry_rounds = int(os.getenv("IPTV_RETRY_ROUNDS", 2))
+    iptv_retry_backoff = float(os.getenv("IPTV_RETRY_BACKOFF", 5))
+    rate_limits = parse_rate_limits(os.getenv("RATE_LIMITS", "api.themoviedb.org=40"))
+    rate_limit_default = float(os.getenv("RATE_LIMIT_DEFAULT", 0))
+    adaptive_concurrency = os.getenv("ADAPTIVE_CONCURRENCY", "true").lower() == "true"
+    concurrency_initial = int(os.getenv("CONCURRENCY_INITIAL", 4))
+    concurrency_max = int(os.getenv("CONCURRENCY_MAX", 16))
+    async_tmdb_concurrency = int(os.getenv("ASYNC_TMDB_CONCURRENCY", 8))
+    async_kinopoisk_concurrency = int(os.getenv("ASYNC_KINOPOISK_CONCURRENCY", 2))
+    async_poster_concurrency = int(os.getenv("ASYNC_POSTER_CONCURRENCY", 8))
 
     cache_enabled = os.getenv("CACHE_ENABLED", "true").lower() == "true"
     cache_path = os.getenv("CACHE_PATH", "cache/http_cache")
     cache_expire = int(os.getenv("CACHE_EXPIRE", 3600))
+    cache_rules = parse_cache_rules(os.getenv("CACHE_RULES", "image.tmdb.org=0,www.kinopoisk.ru=0"))
+    cache_max_mb = int(os.getenv("CACHE_MAX_MB", 512))
+
+    metadata_store_enabled = os.getenv("METADATA_STORE_ENABLED", "true").lower() == "true"
+    metadata_store_path = os.getenv("METADATA_STORE_PATH", "cache/metadata.sqlite")
+    metadata_ttl_days = float(os.getenv("METADATA_TTL_DAYS", 30))
+    metadata_negative_ttl_hours = float(os.getenv("METADATA_NEGATIVE_TTL_HOURS", 24))
 
     kinopoisk_api_key = os.getenv("KINOPOISK_API_KEY") or None
     kinopoisk_base_url = os.getenv("KINOPOISK_BASE_URL", "https://api.kinopoisk.dev/v1.4")
+    kinopoisk_breaker_threshold = int(os.getenv("KINOPOISK_BREAKER_THRESHOLD", 5))
+    kinopoisk_breaker_cooldown = float(os.getenv("KINOPOISK_BREAKER_COOLDOWN", 300))
 
     tmdb_api_key = os.getenv("TMDB_API_KEY") or None
     tmdb_base_url = os.getenv("TMDB_BASE_URL", "https://api.themoviedb.org/3")
     tmdb_image_base = os.getenv("TMDB_IMAGE_BASE", "https://image.tmdb.org/t/p/w500")
+    tmdb_details = os.getenv("TMDB_DETAILS", "false").lower() == "true"
+
+    epg_buckets = parse_buckets(os.getenv("EPG_BUCKETS", DEFAULT_BUCKETS))
 
     log_level = os.getenv("LOG_LEVEL", "INFO")
+    json_pretty = json_pretty_from_env()
 
     api_host = os.getenv("API_HOST", "0.0.0.0")
     api_port = int(os.getenv("API_PORT", 8000))
@@ -134,15 +212,39 @@ def load_config() -> Config:
         http_timeout=http_timeout,
         http_retries=http_retries,
         http_backoff=http_backoff,
+        iptv_concurrency=iptv_concurrency,
+        iptv_incremental_overlap=iptv_incremental_overlap,
+        iptv_resume_window=iptv_resume_window,
+        iptv_retry_rounds=iptv_retry_rounds,
+        iptv_retry_backoff=iptv_retry_backoff,
+        rate_limits=rate_limits,
+        rate_limit_default=rate_limit_default,
+        adaptive_concurrency=adaptive_concurrency,
+        concurrency_initial=concurrency_initial,
+        concurrency_max=concurrency_max,
+        async_tmdb_concurrency=async_tmdb_concurrency,
+        async_kinopoisk_concurrency=async_kinopoisk_concurrency,
+        async_poster_concurrency=async_poster_concurrency,
         cache_enabled=cache_enabled,
         cache_path=cache_path,
         cache_expire=cache_expire,
+        cache_rules=cache_rules,
+        cache_max_mb=cache_max_mb,
+        metadata_store_enabled=metadata_store_enabled,
+        metadata_store_path=metadata_store_path,
+        metadata_ttl_days=metadata_ttl_days,
+        metadata_negative_ttl_hours=metadata_negative_ttl_hours,
         kinopoisk_api_key=kinopoisk_api_key,
         kinopoisk_base_url=kinopoisk_base_url,
+        kinopoisk_breaker_threshold=kinopoisk_breaker_threshold,
+        kinopoisk_breaker_cooldown=kinopoisk_breaker_cooldown,
         tmdb_api_key=tmdb_api_key,
         tmdb_base_url=tmdb_base_url,
         tmdb_image_base=tmdb_image_base,
+        tmdb_details=tmdb_details,
+        epg_buckets=epg_buckets,
         log_level=log_level,
+        json_pretty=json_pretty,
         api_host=api_host,
         api_port=api_port,
         api_cache_ttl=api_cache_ttl,
@@ -0,0 +1,71 @@
+"""Дедупликация показов по произведениям перед обогащением.
+
+Один и тот же фильм идёт на нескольких каналах и по несколько раз за окно
+EPG. Показы группируются по нормализованному названию (и подсказке года),
+обогащение выполняется один раз на группу, а результат раздаётся всем
+показам группы.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_title(title: Any) -> str:
+    """Ключ названия: без регистра, «ё» → «е», пунктуация и кавычки — в пробелы."""
+    if not isinstance(title, str):
+        return ""
+    t = title.casefold().replace("ё", "е")
+    return _NON_WORD.sub(" ", t).strip()
+
+
+def work_key(title: Any, year: Optional[int] = None) -> Optional[Tuple[str, Optional[int]]]:
+    """Ключ произведения (нормализованное название, год) или None для пустого названия."""
+    norm = normalize_title(title)
+    return (norm, year) if norm else None
+
+
+@dataclass
+class DedupStats:
+    airings: int = 0
+    works: int = 0
+
+    @property
+    def ratio(self) -> float:
+        """Сколько показов приходится на одно произведение (1.0 — дублей нет)."""
+        return self.airings / self.works if self.works else 1.0
+
+    @property
+    def saved(self) -> int:
+        """Сколько обогащений не понадобилось благодаря дедупликации."""
+        return self.airings - self.works
+
+    def describe(self) -> str:
+        return (
+            f"показов {self.airings}, уникальных произведений {self.works} "
+            f"(коэффициент {self.ratio:.2f}, сэкономлено обогащений: {self.saved})"
+        )
+
+
+def group_by_work(
+    entries: Iterable[T], key: Callable[[T], Optional[Hashable]]
+) -> Tuple[Dict[Hashable, List[T]], DedupStats]:
+    """Сгруппировать записи по ключу произведения, сохраняя порядок первых появлений.
+
+    Записи с ключом None пропускаются и в статистику не входят.
+    """
+    groups: Dict[Hashable, List[T]] = {}
+    stats = DedupStats()
+    for entry in entries:
+        k = key(entry)
+        if k is None:
+            continue
+        stats.airings += 1
+        groups.setdefault(k, []).append(entry)
+    stats.works = len(groups)
+    return groups, stats
@@ -0,0 +1,217 @@
+"""Однопроходная классификация EPG каналов по корзинам (фильмы, мультфильмы, ...).
+
+Каждый файл канала читается и разворачивается один раз; программы
+раскладываются сразу по всем корзинам, после чего пишутся per-channel файлы,
+а элементы с `our_id` дописываются в агрегаты всех корзин. Файлы проходят
+через генераторы (чтение → разворачивание → классификация → аннотация →
+запись), поэтому в памяти одновременно находится не больше одного канала
+на процесс. Файлы можно разбирать пулом процессов (`jobs`), а неизменённые
+с прошлого запуска каналы — пропускать по манифесту (`FilterManifest`).
+"""
+from __future__ import annotations
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .filter_manifest import FilterManifest
+from .filters import classify_by_category, extract_epg_items
+from .serialization import JsonStreamWriter, is_pretty, read_json, write_json
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class BucketSpec:
+    """Корзина классификатора и куда писать её результаты."""
+
+    name: str
+    categories: tuple
+    out_dir: Path
+    aggregate_path: Path
+
+    def out_path(self, our_id: str) -> Path:
+        return self.out_dir / f"{our_id}.{self.name}.json"
+
+
+@dataclass
+class BucketStats:
+    saved: int = 0
+    aggregated: int = 0
+
+
+@dataclass
+class ClassifySummary:
+    processed: int = 0
+    skipped: int = 0
+    errors: List[str] = field(default_factory=list)
+    buckets: Dict[str, BucketStats] = field(default_factory=dict)
+
+
+def classify_channel_file(path: Path, specs: List[BucketSpec]) -> Dict[str, Any]:
+    """Прочитать файл канала и разложить его программы по корзинам.
+
+    Возвращает {"our_id", "buckets": {name: [items]}} или {"error": "..."}.
+    """
+    try:
+        obj = read_json(path)
+    except Exception as e:
+        return {"error": f"Ошибка чтения {path.name}: {e}"}
+    items = extract_epg_items(obj)
+    if items is None:
+        return {"error": f"{path.name}: пропуск (не найден список EPG)"}
+    our_id = str(obj.get("our_id") or path.stem)
+    buckets = classify_by_category(items, {s.name: s.categories for s in specs})
+    return {"our_id": our_id, "buckets": buckets}
+
+
+def annotate(items: Iterable[Dict[str, Any]], our_id: str) -> Iterator[Dict[str, Any]]:
+    """Копии элементов с идентификатором канала (для агрегатов)."""
+    for m in items:
+        m_with_id = dict(m)
+        m_with_id.setdefault("our_id", our_id)
+        yield m_with_id
+
+
+def process_channel_file(path: Path, specs: List[BucketSpec], skip_empty: bool, pretty: bool) -> Dict[str, Any]:
+    """Классифицировать файл канала и записать его per-channel результаты.
+
+    Функция верхнего уровня — выполняется и в дочерних процессах (`jobs > 1`).
+    Возвращает {"our_id", "saved": [корзины], "items": {корзина: [элементы]}}
+    или {"error": "..."}; `our_id` в элементы добавляет `annotate` при записи агрегата.
+    """
+    res = classify_channel_file(path, specs)
+    if "error" in res:
+        return res
+    our_id = res["our_id"]
+    saved: List[str] = []
+    items: Dict[str, List[Dict[str, Any]]] = {}
+    for spec in specs:
+        selected = res["buckets"][spec.name]
+        out_path = spec.out_path(our_id)
+        if not selected:
+            # Не создаём файл; если существовал ранее — удаляем
+            if out_path.exists():
+                try:
+                    out_path.unlink()
+                except Exception:
+                    pass
+            if skip_empty:
+                continue
+        write_json(out_path, {"our_id": our_id, "epg": selected}, pretty=pretty)
+        saved.append(spec.name)
+        items[spec.name] = selected
+    return {"our_id": our_id, "saved": saved, "items": items}
+
+
+def load_saved_outputs(entry: Dict[str, Any], specs: List[BucketSpec]) -> Dict[str, Any]:
+    """Результат неизменённого канала из его per-channel файлов (в формате `process_channel_file`)."""
+    our_id = entry["our_id"]
+    saved = [s.name for s in specs if entry["buckets"][s.name].get("saved")]
+    items = {s.name: read_json(s.out_path(our_id))["epg"] for s in specs if s.name in saved}
+    return {"our_id": our_id, "saved": saved, "items": items}
+
+
+def classify_channels(
+    files: List[Path],
+    specs: List[BucketSpec],
+    skip_empty: bool = True,
+    progress: Optional[Callable[[Iterable[Any], int], Iterable[Any]]] = None,
+    jobs: int = 1,
+    lines: bool = False,
+    manifest: Optional[FilterManifest] = None,
+) -> ClassifySummary:
+    """Классифицировать файлы каналов и записать результаты всех корзин.
+
+    Для каждой корзины пишется `{out_dir}/{our_id}.{name}.json` в формате
+    {"our_id": "<id>", "epg": [...]} и агрегат со всеми элементами (с `our_id`).
+    Пустой результат удаляет ранее записанный файл канала; с `skip_empty=False`
+    файл всё же пишется (с пустым списком).
+
+    Агрегаты пишутся потоково (`JsonStreamWriter`) по мере обработки файлов:
+    JSON-массивом или, с `lines=True`, в JSON Lines. Пиковая память не растёт
+    с числом каналов; при ошибке прежние агрегаты остаются нетронутыми.
+
+    С `jobs > 1` файлы разбираются пулом процессов; результаты приходят по мере
+    готовности, но в порядке `files`, поэтому агрегаты совпадают с
+    последовательным режимом байт в байт.
+
+    С `manifest` неизменённые с прошлого запуска каналы не разбираются: их
+    элементы берутся из уже записанных per-channel файлов и вставляются
+    в агрегат на своё место, поэтому работа пропорциональна числу
+    изменённых каналов, а результат совпадает с полным прогоном.
+    """
+    summary = ClassifySummary(buckets={s.name: BucketStats() for s in specs})
+    for spec in specs:
+        spec.out_dir.mkdir(parents=True, exist_ok=True)
+        spec.aggregate_path.parent.mkdir(parents=True, exist_ok=True)
+
+    reused: Dict[Path, Dict[str, Any]] = {}
+    if manifest is not None:
+        manifest.prune(files)
+        for path in files:
+            entry = manifest.unchanged(path, specs, skip_empty)
+            if entry is not None:
+                reused[path] = entry
+    changed = [p for p in files if p not in reused]
+
+    worker = partial(process_channel_file, specs=specs, skip_empty=skip_empty, pretty=is_pretty())
+    jobs = max(1, int(jobs))
+    executor: Optional[ProcessPoolExecutor] = None
+    if jobs > 1 and len(changed) > 1:
+        executor = ProcessPoolExecutor(max_workers=min(jobs, len(changed)))
+        # Порции по несколько файлов снижают накладные расходы на передачу задач
+        chunksize = max(1, len(changed) // (jobs * 4))
+        changed_results: Iterator[Dict[str, Any]] = executor.map(worker, changed, chunksize=chunksize)
+    else:
+        changed_results = map(worker, changed)
+
+    def ordered() -> Iterator[Tuple[Path, bool, Dict[str, Any]]]:
+        # Результаты в порядке `files`: изменённые — из пула, остальные — из манифеста
+        for path in files:
+            entry = reused.get(path)
+            if entry is None:
+                yield path, False, next(changed_results)
+                continue
+            try:
+                yield path, True, load_saved_outputs(entry, specs)
+            except Exception as e:
+                logger.warning("Не удалось прочитать результаты %s, обрабатываю заново: %s", path.name, e)
+                yield path, False, worker(path)
+
+    results: Iterable[Tuple[Path, bool, Dict[str, Any]]] = ordered()
+    if progress is not None:
+        results = progress(results, len(files))
+
+    writers: Dict[str, JsonStreamWriter] = {}
+    try:
+        for spec in specs:
+            writers[spec.name] = JsonStreamWriter(spec.aggregate_path, lines=lines)
+        for path, from_manifest, res in results:
+            summary.processed += 1
+            if "error" in res:
+                summary.errors.append(res["error"])
+                if manifest is not None:
+                    manifest.discard(path)
+                continue
+            if from_manifest:
+                summary.skipped += 1
+            elif manifest is not None:
+                manifest.record(path, res["our_id"], specs, skip_empty, res["saved"])
+            for name in res["saved"]:
+                summary.buckets[name].saved += 1
+                writers[name].extend(annotate(res["items"][name], res["our_id"]))
+        for name, writer in writers.items():
+            writer.close()
+            summary.buckets[name].aggregated = writer.count
+        if manifest is not None:
+            manifest.save()
+    finally:
+        for writer in writers.values():
+            writer.abort()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return summary
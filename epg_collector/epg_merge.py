@@ -0,0 +1,117 @@
+"""Инкрементальное обновление окна EPG канала.
+
+Файл канала хранит EPG, сгруппированный по дням (`grouping`):
+`[{"date": "19.08.2025", "title": "19.08 ВТ", "data": [...], "current": false}, ...]`.
+Вместо полной загрузки окна `epg_from..epg_from+epg_limit` запрашиваются только
+отсутствующие дни (или хвост окна), а результат сливается с локальным файлом
+по дням: день из ответа заменяет сохранённый целиком.
+"""
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+DATE_FORMAT = "%d.%m.%Y"
+WEEKDAYS_RU = ("ПН", "ВТ", "СР", "ЧТ", "ПТ", "СБ", "ВС")
+
+
+def parse_day(value: Any) -> Optional[date]:
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.strptime(value.strip(), DATE_FORMAT).date()
+    except ValueError:
+        return None
+
+
+def today_for_tz(tz_hours: Any) -> date:
+    """Текущая дата в часовом поясе IPTV API (параметр `tz`, часы от UTC)."""
+    try:
+        offset = timedelta(hours=int(tz_hours))
+    except (TypeError, ValueError):
+        offset = timedelta(0)
+    return datetime.now(timezone(offset)).date()
+
+
+def is_day_grouped(items: Any) -> bool:
+    return (
+        isinstance(items, list)
+        and bool(items)
+        and all(isinstance(g, dict) and isinstance(g.get("data"), list) and parse_day(g.get("date")) for g in items)
+    )
+
+
+def held_days(groups: Iterable[Dict[str, Any]]) -> Set[date]:
+    """Дни, для которых в локальном файле уже есть программы."""
+    result: Set[date] = set()
+    for g in groups:
+        d = parse_day(g.get("date"))
+        if d is not None and g.get("data"):
+            result.add(d)
+    return result
+
+
+def incremental_window(
+    held: Set[date],
+    today: date,
+    epg_from: int,
+    epg_limit: int,
+    overlap: int = 1,
+) -> Tuple[int, int]:
+    """Вычислить `(epg_from, epg_limit)` для догрузки.
+
+    Запрос начинается с первого отсутствующего дня окна; если все дни уже есть,
+    перезапрашиваются последние `overlap` дней (хвост окна, где расписание
+    ещё уточняется).
+    """
+    end = epg_from + epg_limit - 1
+    missing = [o for o in range(epg_from, end + 1) if today + timedelta(days=o) not in held]
+    if missing:
+        start = missing[0]
+    else:
+        start = max(epg_from, end - max(1, overlap) + 1)
+    return start, end - start + 1
+
+
+def _day_title(d: date) -> str:
+    return f"{d.strftime('%d.%m')} {WEEKDAYS_RU[d.weekday()]}"
+
+
+def _sort_key(item: Dict[str, Any]) -> Tuple[int, str]:
+    ts = item.get("timestart")
+    try:
+        return int(ts), str(item.get("id"))
+    except (TypeError, ValueError):
+        return 0, str(item.get("id"))
+
+
+def merge_day_groups(
+    existing: List[Dict[str, Any]],
+    fresh: List[Dict[str, Any]],
+    keep_from: date,
+) -> List[Dict[str, Any]]:
+    """Слить свежие суточные группы в существующие.
+
+    - День, который есть в свежем ответе, заменяется им целиком: ответ
+      авторитетен, поэтому заменённые или отменённые передачи исчезают, а
+      программы без `id` не дублируются при повторном слиянии.
+    - Сохранённые группы остаются только для дней, которых в ответе нет; их
+      относительные подписи («Сегодня», «Вчера») заменяются на дату, а
+      `current` сбрасывается.
+    - Дни раньше `keep_from` (за пределами окна хранения) отбрасываются.
+    """
+    by_day: Dict[date, Dict[str, Any]] = {}
+    for g in existing:
+        d = parse_day(g.get("date"))
+        if d is None or d < keep_from:
+            continue
+        by_day[d] = {**g, "title": _day_title(d), "current": False, "data": list(g.get("data") or [])}
+
+    for g in fresh:
+        d = parse_day(g.get("date"))
+        if d is None or d < keep_from:
+            continue
+        items = [it for it in g.get("data") or [] if isinstance(it, dict)]
+        by_day[d] = {**(by_day.get(d) or {}), **g, "data": sorted(items, key=_sort_key)}
+
+    return [by_day[d] for d in sorted(by_day)]
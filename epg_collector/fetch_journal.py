@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional, Set
+
+from .serialization import dumps, loads
+
+if TYPE_CHECKING:
+    from .channel_fetcher import ChannelFetchResult
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOURNAL_PATH = Path("cache/epg_fetch_journal.jsonl")
+
+# Статусы, при которых канал считается загруженным
+COMPLETED_STATUSES = ("ok", "unchanged")
+
+
+def result_status(result: "ChannelFetchResult") -> str:
+    if not result.ok:
+        return "failed"
+    return "ok" if result.changed else "unchanged"
+
+
+class FetchJournal:
+    """Журнал завершения загрузки EPG по каналам.
+
+    Append-only JSONL: по строке на каждую попытку (`channel_id`, `status`,
+    `ts`, `items`, `error`, `attempt`). Строка дописывается сразу после
+    завершения канала, поэтому прерванный запуск можно продолжить с `--resume`.
+    Для канала учитывается последняя запись.
+    """
+
+    def __init__(self, path: Path = DEFAULT_JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        with self.path.open("rb") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = loads(line)
+                except Exception:
+                    # Недописанная строка после аварийного завершения
+                    logger.debug("Skipping broken journal line in %s", self.path)
+                    continue
+                if isinstance(entry, dict) and entry.get("channel_id") is not None:
+                    self._latest[str(entry["channel_id"])] = entry
+
+    def get(self, channel_id: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._latest.get(str(channel_id))
+            return dict(entry) if entry else None
+
+    def record(self, result: "ChannelFetchResult", attempt: int = 1) -> None:
+        entry = {
+            "channel_id": str(result.channel_id),
+            "status": result_status(result),
+            "ts": time.time(),
+            "items": result.items,
+            "error": result.error,
+            "attempt": attempt,
+        }
+        line = dumps(entry, pretty=False) + b"\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("ab") as f:
+                f.write(line)
+            self._latest[entry["channel_id"]] = entry
+
+    def completed_since(self, max_age: float, now: Optional[float] = None) -> Set[str]:
+        """Каналы, успешно загруженные не раньше `max_age` секунд назад."""
+        cutoff = (time.time() if now is None else now) - max_age
+        with self._lock:
+            return {
+                cid
+                for cid, e in self._latest.items()
+                if e.get("status") in COMPLETED_STATUSES and float(e.get("ts") or 0) >= cutoff
+            }
+
+    def compact(self) -> None:
+        """Переписать журнал, оставив по одной (последней) записи на канал."""
+        with self._lock:
+            if not self._latest:
+                return
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            data = b"".join(dumps(e, pretty=False) + b"\n" for e in self._latest.values())
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_bytes(data)
+            os.replace(tmp, self.path)
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional
+
+from .serialization import read_json, write_json
+
+if TYPE_CHECKING:
+    from .epg_classifier import BucketSpec
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MANIFEST_PATH = Path("cache/epg_filter_manifest.json")
+
+
+def file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def bucket_signature(spec: "BucketSpec", skip_empty: bool) -> str:
+    """Отпечаток настроек корзины: при их изменении канал классифицируется заново."""
+    return "|".join([*sorted(c.strip().casefold() for c in spec.categories), str(spec.out_dir), str(skip_empty)])
+
+
+class FilterManifest:
+    """Манифест входов классификатора EPG (filter-epg).
+
+    Для каждого файла канала хранит размер, mtime, SHA-256 содержимого, `our_id`
+    и по корзинам — отпечаток настроек и записан ли per-channel файл.
+    Канал считается неизменённым, если совпали размер и mtime (или, при
+    расхождении, хэш содержимого), настройки всех запрошенных корзин
+    и на месте все записанные из него файлы.
+
+    Хранится одним JSON-файлом, запись атомарна (`serialization.write_json`).
+    """
+
+    def __init__(self, path: Path = DEFAULT_MANIFEST_PATH):
+        self.path = path
+        self._data: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            data = read_json(self.path)
+            if isinstance(data, dict):
+                self._data = {str(k): v for k, v in data.items() if isinstance(v, dict)}
+        except Exception as e:
+            logger.warning("Не удалось прочитать %s, все каналы будут обработаны заново: %s", self.path, e)
+            self._data = {}
+
+    @staticmethod
+    def _key(path: Path) -> str:
+        return str(Path(path))
+
+    def fingerprint(self, path: Path, reuse: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Размер, mtime и хэш файла; хэш берётся из `reuse`, если размер и mtime совпали."""
+        st = os.stat(path)
+        fp = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        if reuse and reuse.get("size") == fp["size"] and reuse.get("mtime_ns") == fp["mtime_ns"]:
+            fp["sha256"] = reuse.get("sha256")
+        else:
+            fp["sha256"] = file_digest(path)
+        return fp
+
+    def unchanged(self, path: Path, specs: List["BucketSpec"], skip_empty: bool) -> Optional[Dict[str, Any]]:
+        """Запись манифеста, если результат для `path` можно взять с прошлого запуска; иначе None."""
+        entry = self._data.get(self._key(path))
+        if not entry:
+            return None
+        try:
+            fp = self.fingerprint(path, reuse=entry)
+        except OSError:
+            return None
+        if fp["sha256"] != entry.get("sha256"):
+            return None
+        buckets = entry.get("buckets") or {}
+        for spec in specs:
+            b = buckets.get(spec.name)
+            if not b or b.get("sig") != bucket_signature(spec, skip_empty):
+                return None
+            if b.get("saved") and not spec.out_path(entry["our_id"]).exists():
+                return None
+        # Файл тронули без изменения содержимого — запоминаем новый mtime
+        entry.update(fp)
+        return entry
+
+    def record(
+        self,
+        path: Path,
+        our_id: str,
+        specs: List["BucketSpec"],
+        skip_empty: bool,
+        saved: Iterable[str],
+        fingerprint: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        key = self._key(path)
+        fp = fingerprint or self.fingerprint(path)
+        prev = self._data.get(key) or {}
+        # Записи других корзин верны, только если содержимое файла не менялось
+        buckets = dict(prev.get("buckets") or {}) if prev.get("sha256") == fp["sha256"] else {}
+        saved_set = set(saved)
+        for spec in specs:
+            buckets[spec.name] = {"sig": bucket_signature(spec, skip_empty), "saved": spec.name in saved_set}
+        self._data[key] = {**fp, "our_id": our_id, "buckets": buckets}
+
+    def discard(self, path: Path) -> None:
+        self._data.pop(self._key(path), None)
+
+    def prune(self, paths: Iterable[Path]) -> None:
+        """Удалить записи о файлах, которых больше нет среди входов."""
+        keep = {self._key(p) for p in paths}
+        for key in [k for k in self._data if k not in keep]:
+            del self._data[key]
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_json(self.path, self._data, pretty=False)
@@ -1,6 +1,88 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Iterable, List
+import logging
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Корзины классификатора по умолчанию: имя -> значения поля `category`
+DEFAULT_BUCKETS = "movies=Х/ф;cartoons=М/ф"
+
+
+def parse_buckets(raw: str) -> Dict[str, List[str]]:
+    """Разобрать `name=Кат1|Кат2;name2=Кат3` в словарь корзин классификатора."""
+    buckets: Dict[str, List[str]] = {}
+    for part in (raw or "").split(";"):
+        name, sep, cats = part.partition("=")
+        name = name.strip()
+        values = [c.strip() for c in cats.split("|") if c.strip()]
+        if not sep or not name or not values:
+            if part.strip():
+                logger.warning("Некорректная корзина в EPG_BUCKETS: %r", part)
+            continue
+        buckets[name] = values
+    return buckets
+
+
+def extract_epg_items(obj: Any) -> Optional[List[Dict[str, Any]]]:
+    """Плоский список программ из объекта канала.
+
+    Ищет список в `epg` (или `items`/`results`/`data`) и разворачивает суточные
+    группы вида [{"date":..., "title":..., "data": [...]}]. None — список не найден.
+    """
+    if not isinstance(obj, dict):
+        return None
+    items = obj.get("epg")
+    if not isinstance(items, list):
+        for k in ("items", "results", "data"):
+            v = obj.get(k)
+            if isinstance(v, list):
+                items = v
+                break
+    if not isinstance(items, list):
+        return None
+    flat: List[Dict[str, Any]] = []
+    for elem in items:
+        if isinstance(elem, dict) and isinstance(elem.get("data"), list):
+            flat.extend(sub for sub in elem["data"] if isinstance(sub, dict))
+        elif isinstance(elem, dict):
+            flat.append(elem)
+    return flat
+
+
+def classify_by_category(
+    items: Iterable[Dict[str, Any]],
+    buckets: Dict[str, Sequence[str]],
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Разложить элементы по корзинам за один проход.
+
+    Элемент попадает в каждую корзину, одно из значений которой совпадает
+    (без учёта регистра) со строкой `category` или с элементом списка `category`.
+    """
+    lookup: Dict[str, List[str]] = {}
+    for name, cats in buckets.items():
+        for c in cats:
+            lookup.setdefault(c.strip().casefold(), []).append(name)
+    result: Dict[str, List[Dict[str, Any]]] = {name: [] for name in buckets}
+    for item in items:
+        cat = item.get("category")
+        if isinstance(cat, str):
+            values = (cat,)
+        elif isinstance(cat, list):
+            values = cat
+        else:
+            continue
+        hit: List[str] = []
+        for c in values:
+            if isinstance(c, str):
+                for name in lookup.get(c.strip().casefold(), ()):
+                    if name not in hit:
+                        hit.append(name)
+        for name in hit:
+            result[name].append(item)
+    return result
 
 
 def filter_movies_by_category(items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -9,16 +91,6 @@ def filter_movies_by_category(items: Iterable[Dict[str, Any]]) -> List[Dict[str,
     Допускаются варианты, где `category` — список строк или одна строка.
     """
     result: List[Dict[str, Any]] = []
-    anti_series_kw = [
-        "сезон",
-        "серия",
-        "эпизод",
-        "сер.",
-        "series",
-        "episode",
-        "season",
-    ]
-    anti_series_kw = [s.casefold() for s in anti_series_kw]
     for item in items:
         cat = item.get("category")
         if isinstance(cat, list) and any(isinstance(c, str) and c.strip().lower() == "х/ф" for c in cat):
@@ -43,6 +115,135 @@ def filter_cartoons_by_category(items: Iterable[Dict[str, Any]]) -> List[Dict[st
     return result
 
 
+# Поля с категориями/жанрами/тегами, которые проверяет filter_movies_epg
+MOVIE_CATEGORY_KEYS = (
+    "category",
+    "categories",
+    "genre",
+    "genres",
+    "tags",
+    "program_type",
+    "type",
+)
+
+DEFAULT_MOVIE_KEYWORDS = (
+    "Х/ф",
+    "х/ф",
+    "Художественный фильм",
+    "фильм",
+    "кино",
+    "movie",
+    "feature film",
+)
+
+# Признаки сериалов в названии (исключаются из эвристики по длительности)
+ANTI_SERIES_KEYWORDS = (
+    "сезон",
+    "серия",
+    "эпизод",
+    "сер.",
+    "series",
+    "episode",
+    "season",
+)
+
+
+class KeywordMatcher:
+    """Поиск вхождения любого из ключевых слов одним скомпилированным regex.
+
+    Строится один раз из списка слов; текст приводится через `casefold()` и
+    проверяется одним проходом regex вместо `any(k in text for k in kw)`.
+    `re.IGNORECASE` не используется: на кириллице он в разы медленнее
+    `casefold()` + регистрозависимого поиска.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        kw = sorted({k.casefold() for k in keywords if isinstance(k, str) and k.strip()}, key=len, reverse=True)
+        self.keywords = tuple(kw)
+        self._search = re.compile("|".join(re.escape(k) for k in kw)).search if kw else None
+
+    def __bool__(self) -> bool:
+        return self._search is not None
+
+    def matches(self, text: str) -> bool:
+        return self._search is not None and self._search(text.casefold()) is not None
+
+
+@lru_cache(maxsize=32)
+def compile_keywords(keywords: Tuple[str, ...]) -> KeywordMatcher:
+    """Скомпилированный матчер для набора слов (кэшируется между вызовами)."""
+    return KeywordMatcher(keywords)
+
+
+class MovieEPGMatcher:
+    """Классификатор «фильм или нет» для `filter_movies_epg`, применяемый к пачкам элементов.
+
+    Матчеры ключевых слов компилируются один раз в конструкторе; `select`
+    проходит по пачке в одном цикле без создания замыканий на каждый элемент.
+    """
+
+    def __init__(self, keywords: Optional[Sequence[str]] = None, min_duration_minutes: Optional[int] = None):
+        self.keywords = compile_keywords(tuple(DEFAULT_MOVIE_KEYWORDS if keywords is None else keywords))
+        self.anti_series = compile_keywords(ANTI_SERIES_KEYWORDS)
+        self.min_duration_minutes = min_duration_minutes
+
+    def select(self, items: Iterable[Any]) -> List[Dict[str, Any]]:
+        if not self.keywords:
+            return []
+        search = self.keywords._search
+        category_keys = MOVIE_CATEGORY_KEYS
+        min_duration = self.min_duration_minutes
+        result: List[Dict[str, Any]] = []
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+
+            # 1) Категории/жанры/теги
+            matched = False
+            for key in category_keys:
+                v = item.get(key)
+                if v is None:
+                    continue
+                if isinstance(v, list):
+                    if any(isinstance(x, (str, int, float)) and search(str(x).casefold()) for x in v):
+                        matched = True
+                        break
+                elif isinstance(v, (str, int, float)):
+                    if search(str(v).casefold()):
+                        matched = True
+                        break
+
+            # 2) Эвристика по названию/описанию
+            title = item.get("title") or item.get("name") or ""
+            if not matched:
+                desc = item.get("description") or item.get("desc") or item.get("short_desc") or ""
+                if isinstance(title, str) and search(title.casefold()):
+                    matched = True
+                elif isinstance(desc, str) and search(desc.casefold()):
+                    matched = True
+
+            # 3) Эвристика по длительности (если не нашли по категориям/тексту)
+            if not matched and min_duration is not None:
+                matched = self._long_non_series(item, title, min_duration)
+
+            if matched:
+                result.append(item)
+        return result
+
+    def _long_non_series(self, item: Dict[str, Any], title: Any, min_duration: int) -> bool:
+        try:
+            ts_i = int(item["timestart"]) if item.get("timestart") is not None else None
+            te_i = int(item["timestop"]) if item.get("timestop") is not None else None
+        except (TypeError, ValueError):
+            return False
+        if not (ts_i and te_i and te_i > ts_i):
+            return False
+        if (te_i - ts_i) // 60 < int(min_duration):
+            return False
+        # Исключим явные сериалы по названию
+        return not self.anti_series.matches(str(title))
+
+
 def filter_movies_epg(
     items: Iterable[Dict[str, Any]],
     keywords: List[str] | None = None,
@@ -57,89 +258,10 @@ def filter_movies_epg(
     2) Если по категориям не найдено, проверяем эвристику по названию/описанию:
        - title/name + description/desc/short_desc
        - Ищем ключевые слова (например, «Х/ф», «фильм», «кино», «feature film», «movie»)
+    3) С `min_duration_minutes` — длинные программы без признаков сериала в названии.
 
-    По умолчанию ключевые слова: ["Х/ф", "х/ф", "Художественный фильм", "фильм", "кино", "movie", "feature film"].
-    Сопоставление без учета регистра и диакритики (через .casefold()).
+    По умолчанию ключевые слова: DEFAULT_MOVIE_KEYWORDS.
+    Сопоставление без учета регистра (через .casefold()); ключевые слова компилируются в один regex
+    (см. `MovieEPGMatcher` для повторного применения к пачкам элементов).
     """
-    if keywords is None:
-        keywords = [
-            "Х/ф",
-            "х/ф",
-            "Художественный фильм",
-            "фильм",
-            "кино",
-            "movie",
-            "feature film",
-        ]
-
-    kw = [k.casefold() for k in keywords if isinstance(k, str) and k.strip()]
-    if not kw:
-        return []
-
-    def text_has_movie_markers(text: str) -> bool:
-        t = text.casefold()
-        return any(k in t for k in kw)
-
-    result: List[Dict[str, Any]] = []
-    for item in items:
-        if not isinstance(item, dict):
-            continue
-
-        # 1) Категории/жанры/теги
-        category_keys = (
-            "category",
-            "categories",
-            "genre",
-            "genres",
-            "tags",
-            "program_type",
-            "type",
-        )
-        matched = False
-        for key in category_keys:
-            v = item.get(key)
-            if isinstance(v, list):
-                texts = [str(x) for x in v if isinstance(x, (str, int, float))]
-                if any(text_has_movie_markers(s) for s in texts):
-                    matched = True
-                    break
-            elif isinstance(v, (str, int, float)):
-                if text_has_movie_markers(str(v)):
-                    matched = True
-                    break
-
-        # 2) Эвристика по названию/описанию
-        if not matched:
-            title = item.get("title") or item.get("name") or ""
-            desc = (
-                item.get("description")
-                or item.get("desc")
-                or item.get("short_desc")
-                or ""
-            )
-            if isinstance(title, str) and text_has_movie_markers(title):
-                matched = True
-            elif isinstance(desc, str) and text_has_movie_markers(desc):
-                matched = True
-
-        # 3) Эвристика по длительности (если не нашли по категориям/тексту)
-        if not matched and min_duration_minutes is not None:
-            ts = item.get("timestart")
-            te = item.get("timestop")
-            try:
-                ts_i = int(ts) if ts is not None else None
-                te_i = int(te) if te is not None else None
-                if ts_i and te_i and te_i > ts_i:
-                    dur_min = (te_i - ts_i) // 60
-                    if dur_min >= int(min_duration_minutes):
-                        # Исключим явные сериалы по названию
-                        t = str(title).casefold()
-                        if not any(x in t for x in anti_series_kw):
-                            matched = True
-            except Exception:
-                pass
-
-        if matched:
-            result.append(item)
-
-    return result
+    return MovieEPGMatcher(keywords, min_duration_minutes).select(items)
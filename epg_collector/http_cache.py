@@ -0,0 +1,126 @@
+"""HTTP-кэш: явные `CachedSession` поверх SQLite в режиме WAL.
+
+Вместо глобального `requests_cache.install_cache` каждая сессия получает
+собственное соединение с общим файлом кэша; WAL позволяет потокам читать
+параллельно с записью. Правила по хостам (CACHE_RULES) задают время жизни
+ответа, а `0` — не кэшировать вовсе; бинарные тела (постеры) не кэшируются
+никогда. Размер файла ограничен CACHE_MAX_MB: при первом открытии кэша в
+процессе удаляются просроченные записи, затем — ближайшие к истечению.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from typing import TYPE_CHECKING, Dict
+
+import requests
+import requests_cache
+from requests_cache import CachedSession, SQLiteCache
+
+if TYPE_CHECKING:  # config сам импортирует parse_cache_rules
+    from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# Доля лимита, до которой ужимается кэш при превышении (чтобы не чистить на каждом запуске)
+SWEEP_LOW_WATERMARK = 0.8
+
+_NON_CACHEABLE_TYPES = ("image/", "video/", "audio/", "application/octet-stream")
+
+
+def parse_cache_rules(raw: str) -> Dict[str, int]:
+    """Разобрать `host=seconds,...` в `urls_expire_after`.
+
+    `0` — не кэшировать, `-1` — хранить бессрочно.
+    """
+    rules: Dict[str, int] = {}
+    for part in (raw or "").split(","):
+        host, sep, ttl = part.partition("=")
+        if not sep or not host.strip():
+            continue
+        try:
+            seconds = int(ttl)
+        except ValueError:
+            logger.warning("Некорректное правило в CACHE_RULES: %r", part)
+            continue
+        rules[host.strip().lower()] = requests_cache.DO_NOT_CACHE if seconds == 0 else seconds
+    return rules
+
+
+def is_cacheable(response: requests.Response) -> bool:
+    """Не сохранять в кэш бинарные тела (постеры, медиа)."""
+    content_type = (response.headers.get("Content-Type") or "").lower()
+    return not content_type.startswith(_NON_CACHEABLE_TYPES)
+
+
+def open_backend(cfg: Config) -> SQLiteCache:
+    """Собственное соединение с файлом кэша в режиме WAL."""
+    return SQLiteCache(cfg.cache_path, wal=True, busy_timeout=30000)
+
+
+def sweep_cache(backend: SQLiteCache, max_bytes: int) -> Dict[str, int]:
+    """Удалить просроченные ответы и, если файл больше `max_bytes`, самые «старые» из остальных."""
+    responses = backend.responses
+    before = responses.count()
+    backend.delete(expired=True, vacuum=False)
+    expired = before - responses.count()
+
+    evicted = 0
+    size = _db_size(responses)
+    if max_bytes > 0 and size > max_bytes:
+        target = size - int(max_bytes * SWEEP_LOW_WATERMARK)
+        keys = []
+        freed = 0
+        with responses.connection() as con:
+            rows = con.execute(f"SELECT key, LENGTH(value) FROM {responses.table_name} ORDER BY expires ASC")
+            for key, length in rows:
+                keys.append(key)
+                freed += int(length or 0)
+                if freed >= target:
+                    break
+        if keys:
+            backend.delete(*keys, vacuum=False)
+            evicted = len(keys)
+    if expired or evicted:
+        responses.vacuum()
+        size = _db_size(responses)
+    return {"expired": expired, "evicted": evicted, "size": size}
+
+
+def _db_size(responses) -> int:
+    # В режиме WAL часть данных может находиться в журнале — сначала сбрасываем его в файл
+    with responses.connection() as con:
+        con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return responses.size()
+
+
+_sweep_lock = threading.Lock()
+_swept_paths: set = set()
+
+
+def _sweep_once(cfg: Config, backend: SQLiteCache) -> None:
+    with _sweep_lock:
+        if cfg.cache_path in _swept_paths:
+            return
+        _swept_paths.add(cfg.cache_path)
+        try:
+            res = sweep_cache(backend, cfg.cache_max_mb * 1024 * 1024)
+        except Exception as e:
+            logger.warning("HTTP cache sweep failed: %s", e)
+            return
+    logger.info(
+        "HTTP cache %s: %.1f MB (expired removed: %d, evicted over cap: %d)",
+        cfg.cache_path, res["size"] / 1e6, res["expired"], res["evicted"],
+    )
+
+
+def create_cached_session(cfg: Config) -> CachedSession:
+    """CachedSession с WAL-бэкендом и правилами по хостам из конфигурации."""
+    backend = open_backend(cfg)
+    _sweep_once(cfg, backend)
+    return CachedSession(
+        backend=backend,
+        expire_after=cfg.cache_expire,
+        urls_expire_after=cfg.cache_rules or {},
+        filter_fn=is_cacheable,
+    )
@@ -1,41 +1,191 @@
 from __future__ import annotations
 
 import logging
+import queue
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
 
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-import requests_cache
 
+from .concurrency import ConcurrencyController, get_concurrency_controller
 from .config import Config
+from .http_cache import create_cached_session
+from .rate_limit import HostRateLimiter, get_rate_limiter
 
 logger = logging.getLogger(__name__)
 
+# Статусы, которые повторяет RateLimitedAdapter (и async_enrich.AsyncHTTP)
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+RETRY_METHODS = frozenset({"GET", "POST"})
+
 
 def _build_retry(total: int, backoff: float) -> Retry:
+    # Только ошибки соединения: 429 и 5xx повторяет RateLimitedAdapter, чтобы каждая
+    # попытка проходила через ограничитель частоты и адаптивный предел. Без
+    # respect_retry_after_header=False urllib3 сам повторял бы 429/503 с Retry-After
     return Retry(
         total=total,
         backoff_factor=backoff,
-        status_forcelist=(429, 500, 502, 503, 504),
-        allowed_methods=("GET", "POST"),
+        status=0,
+        status_forcelist=(),
+        respect_retry_after_header=False,
+        allowed_methods=tuple(RETRY_METHODS),
         raise_on_status=False,
     )
 
 
-def create_session(cfg: Config) -> requests.Session:
-    """Создаёт requests.Session с кэшем, retry и таймаутами по умолчанию."""
-    if cfg.cache_enabled:
-        requests_cache.install_cache(
-            cache_name=cfg.cache_path,
-            backend="sqlite",
-            expire_after=cfg.cache_expire,
-        )
-        logger.info("Requests cache enabled: %s (expire %ss)", cfg.cache_path, cfg.cache_expire)
+class RateLimitedAdapter(HTTPAdapter):
+    """HTTPAdapter, пропускающий каждый сетевой запрос через общий `HostRateLimiter`.
+
+    Ответы из requests_cache до адаптера не доходят и лимит не расходуют.
+    На 429 хост приостанавливается (Retry-After или экспоненциальная пауза),
+    и запрос повторяется до `throttle_retries` раз; 5xx (GET/POST) повторяются
+    до `status_retries` раз: с Retry-After хост приостанавливается так же,
+    как на 429, иначе — экспоненциальная пауза. Каждая попытка заново
+    проходит ограничитель частоты и адаптивный предел.
+
+    С `concurrency` число одновременных запросов к хосту ограничено адаптивным
+    пределом: задержка и статус каждого ответа сообщаются контроллеру. Слот
+    занят до конца передачи тела: без `stream=True` тело читается здесь же,
+    со `stream=True` слот освобождается, когда тело дочитано или ответ закрыт.
+    """
+
+    def __init__(
+        self,
+        limiter: HostRateLimiter,
+        throttle_retries: int = 3,
+        backoff: float = 0.5,
+        concurrency: Optional[ConcurrencyController] = None,
+        status_retries: int = 3,
+        **kwargs,
+    ):
+        self.limiter = limiter
+        self.throttle_retries = throttle_retries
+        self.status_retries = status_retries
+        self.backoff = backoff
+        self.concurrency = concurrency
+        super().__init__(**kwargs)
+
+    def _send_once(self, request, **kwargs):
+        slot = self.concurrency.limiter(request.url) if self.concurrency else None
+        if slot is not None:
+            slot.acquire()
+        self.limiter.acquire(request.url)
+        if slot is None:
+            return super().send(request, **kwargs)
+        started = time.monotonic()
+        try:
+            resp = super().send(request, **kwargs)
+        except BaseException:
+            # Сетевая ошибка/таймаут — тоже признак перегрузки
+            slot.release(time.monotonic() - started, overloaded=True)
+            raise
+        overloaded = resp.status_code == 429 or resp.status_code >= 500
+        released = threading.Lock()
+
+        def release() -> None:
+            if released.acquire(blocking=False):
+                slot.release(time.monotonic() - started, overloaded=overloaded)
+
+        if not kwargs.get("stream"):
+            try:
+                resp.content
+            except BaseException:
+                overloaded = True
+                release()
+                raise
+            release()
+            return resp
+        self._release_on_close(resp, release)
+        return resp
+
+    @staticmethod
+    def _release_on_close(resp: requests.Response, release) -> None:
+        """Освободить слот, когда тело потокового ответа дочитано или ответ закрыт (или собран GC)."""
+        raw = resp.raw
+        release_conn = getattr(raw, "release_conn", None)
+        if release_conn is not None:
+            # urllib3 возвращает соединение в пул, как только тело дочитано
+            def _release_conn() -> None:
+                release()
+                release_conn()
+
+            raw.release_conn = _release_conn
+        close = resp.close
+
+        def _close() -> None:
+            release()
+            close()
+
+        resp.close = _close
+        weakref.finalize(resp, release)
+
+    def send(self, request, **kwargs):
+        throttled = 0
+        failed = 0
+        while True:
+            resp = self._send_once(request, **kwargs)
+            if resp.status_code == 429 and throttled < self.throttle_retries:
+                self.limiter.throttled(
+                    request.url,
+                    resp.headers.get("Retry-After"),
+                    default=max(1.0, self.backoff * (2 ** throttled)),
+                )
+                resp.close()
+                throttled += 1
+                continue
+            if (
+                resp.status_code in RETRY_STATUSES
+                and request.method in RETRY_METHODS
+                and failed < self.status_retries
+            ):
+                retry_after = resp.headers.get("Retry-After")
+                delay = self.backoff * (2 ** failed)
+                resp.close()
+                if retry_after is not None:
+                    # Пауза по Retry-After общая для хоста (её выдержит limiter.acquire следующей попытки)
+                    self.limiter.throttled(request.url, retry_after, default=delay, status=resp.status_code)
+                else:
+                    time.sleep(delay)
+                failed += 1
+                continue
+            return resp
 
-    session = requests.Session()
+
+def create_session(cfg: Config, pool_size: Optional[int] = None) -> requests.Session:
+    """Создаёт requests.Session с кэшем, retry и таймаутами по умолчанию.
+
+    При CACHE_ENABLED возвращается собственная `CachedSession` (SQLite WAL,
+    правила CACHE_RULES, лимит CACHE_MAX_MB) — глобально `requests` не патчится.
+
+    `pool_size` задаёт предел одновременных соединений к одному хосту. Сессия,
+    разделяемая между потоками, с `pool_size` блокирует лишние запросы до
+    освобождения соединения вместо открытия новых.
+
+    Все сессии процесса делят один ограничитель частоты по хостам
+    (RATE_LIMITS, RATE_LIMIT_DEFAULT) с учётом Retry-After и один адаптивный
+    контроллер параллелизма (ADAPTIVE_CONCURRENCY, CONCURRENCY_INITIAL,
+    CONCURRENCY_MAX).
+    """
+    session = create_cached_session(cfg) if cfg.cache_enabled else requests.Session()
 
     retry = _build_retry(cfg.http_retries, cfg.http_backoff)
-    adapter = HTTPAdapter(max_retries=retry)
+    limiter = get_rate_limiter()
+    limiter.configure(cfg.rate_limits, cfg.rate_limit_default)
+    concurrency = get_concurrency_controller()
+    concurrency.configure(cfg.adaptive_concurrency, cfg.concurrency_initial, cfg.concurrency_max)
+    adapter_kwargs = {"max_retries": retry}
+    if pool_size:
+        adapter_kwargs.update(pool_maxsize=int(pool_size), pool_block=True)
+    adapter = RateLimitedAdapter(
+        limiter, throttle_retries=cfg.http_retries, backoff=cfg.http_backoff,
+        concurrency=concurrency, status_retries=cfg.http_retries, **adapter_kwargs,
+    )
     session.mount("http://", adapter)
     session.mount("https://", adapter)
 
@@ -51,3 +201,63 @@ def create_session(cfg: Config) -> requests.Session:
 
     session.request = _request_with_timeout  # type: ignore
     return session
+
+
+class SessionPool:
+    """Пул сессий, общий для потоков обработки файлов.
+
+    Создаёт не больше `size` сессий (по числу потоков) и выдаёт их на время
+    обработки файла. Сессия переживает файл, поэтому её keep-alive пулы по
+    хостам (TMDB API, CDN постеров) переиспользуются: TCP+TLS устанавливается
+    один раз на поток и хост, а не на каждый канал.
+    """
+
+    def __init__(self, cfg: Config, size: int):
+        self.cfg = cfg
+        self.size = max(1, int(size))
+        self._idle: "queue.LifoQueue[requests.Session]" = queue.LifoQueue()
+        self._sessions: List[requests.Session] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def session(self) -> Iterator[requests.Session]:
+        """Взять сессию из пула (или создать, пока пул не заполнен) и вернуть после использования."""
+        try:
+            sess = self._idle.get_nowait()
+        except queue.Empty:
+            sess = None
+            with self._lock:
+                if len(self._sessions) < self.size:
+                    sess = create_session(self.cfg)
+                    self._sessions.append(sess)
+            if sess is None:
+                sess = self._idle.get()
+        try:
+            yield sess
+        finally:
+            self._idle.put(sess)
+
+    def connection_stats(self) -> Dict[str, Dict[str, int]]:
+        """Запросы и новые соединения по хостам во всех сессиях пула."""
+        stats: Dict[str, Dict[str, int]] = {}
+        with self._lock:
+            sessions = list(self._sessions)
+        for sess in sessions:
+            for adapter in set(sess.adapters.values()):
+                pools = getattr(getattr(adapter, "poolmanager", None), "pools", None)
+                if pools is None:
+                    continue
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is None:
+                        continue
+                    st = stats.setdefault(pool.host, {"requests": 0, "connections": 0})
+                    st["requests"] += pool.num_requests
+                    st["connections"] += pool.num_connections
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for sess in sessions:
+            sess.close()
@@ -1,87 +1,48 @@
 from __future__ import annotations
 
+import hashlib
 import logging
-from typing import Any, Dict, List, Optional
-import json
+from typing import Any, Dict, Iterator, List, Optional
 
+from . import validators
 from .config import Config
+from .json_stream import DECODER
 
 logger = logging.getLogger(__name__)
 
 
-def fetch_epg(cfg: Config, session) -> List[Dict[str, Any]]:
-    """Запрашивает EPG с IPTV API и возвращает список элементов EPG.
+def iter_epg(cfg: Config, session) -> Iterator[Dict[str, Any]]:
+    """Запрашивает EPG с IPTV API и потоково выдаёт элементы EPG.
 
     Ожидается, что ответ может содержать ключ `epg` или быть списком.
+    Тело разбирается общим декодером (`json_stream.DECODER`) без загрузки целиком.
     """
     logger.info("Fetching EPG from %s", cfg.iptv_base_url)
     resp = session.get(
         cfg.iptv_base_url,
         params=cfg.iptv_params,
         headers=cfg.iptv_headers,
+        stream=True,
     )
     resp.raise_for_status()
-    # Принудительно используем UTF-8 (некоторые провайдеры выставляют неверную кодировку)
-    try:
-        resp.encoding = "utf-8"
-    except Exception:
-        pass
-    # Надёжный парсинг JSON: сначала пытаемся обычным способом, затем — декодируем байты
-    try:
-        data = resp.json()
-    except ValueError:
-        raw = resp.content or b""
-        last_err = None
-        for enc in ("utf-8", "cp1251", "latin-1"):
-            try:
-                data = json.loads(raw.decode(enc))
-                logger.info("EPG JSON decoded with %s", enc)
-                break
-            except Exception as e:
-                last_err = e
-                data = None
-        if data is None:
-            text_sample = (resp.text or "")[:200]
-            logger.warning("EPG response is not valid JSON after decode attempts. Sample: %r; last_err=%s", text_sample, last_err)
-            return []
-
-    if isinstance(data, dict):
-        epg = data.get("epg")
-        if isinstance(epg, list):
-            logger.info("EPG items: %d", len(epg))
-            return epg
-        # Если структура иная, но сам словарь — это элемент EPG
-        if all(k in data for k in ("title", "timestart", "timestop")):
-            return [data]
-        # Попробуем найти список внутри словаря
-        for v in data.values():
-            if isinstance(v, list) and v and isinstance(v[0], dict):
-                logger.info("EPG items (nested): %d", len(v))
-                return v
-        logger.warning("Не удалось определить список EPG в ответе, возвращаю пустой список")
-        return []
-
-    if isinstance(data, list):
-        logger.info("EPG items (root list): %d", len(data))
-        return data
-
-    logger.warning("Unexpected EPG response type: %s", type(data))
-    return []
+    count = 0
+    for item in DECODER.iter_items(resp, key="epg"):
+        count += 1
+        yield item
+    logger.info("EPG items: %d", count)
 
 
-def fetch_epg_for_channel(
+def fetch_epg(cfg: Config, session) -> List[Dict[str, Any]]:
+    """Запрашивает EPG с IPTV API и возвращает список элементов EPG (см. `iter_epg`)."""
+    return list(iter_epg(cfg, session))
+
+
+def _channel_params(
     cfg: Config,
-    session,
     channel_id: Any,
     grouping: Optional[int] = None,
     extra_params: Optional[Dict[str, Any]] = None,
-) -> List[Dict[str, Any]]:
-    """Запрашивает EPG для конкретного канала (id) с возможностью переопределить grouping и добавить параметры.
-
-    Параметры берутся из cfg.iptv_params с подстановкой id=channel_id.
-    По умолчанию используются заголовки cfg.iptv_headers.
-    Возвращает список элементов EPG.
-    """
+) -> Dict[str, Any]:
     params: Dict[str, Any] = dict(cfg.iptv_params)
     params["id"] = str(channel_id)
     if grouping is not None:
@@ -90,60 +51,111 @@ def fetch_epg_for_channel(
         for k, v in extra_params.items():
             if v is not None:
                 params[str(k)] = str(v)
+    return params
+
+
+class ChannelEPGStream:
+    """Потоковый ответ EPG канала с поддержкой условного запроса.
+
+    Итерация выдаёт элементы EPG по мере разбора тела и попутно считает
+    SHA-256 сырых байт. После полного прочтения `unchanged` показывает,
+    совпало ли тело с сохранённым валидатором, а `validator` содержит
+    новые ETag/Last-Modified/хэш.
+    """
+
+    def __init__(self, channel_id: Any, resp, params_key: str, known: Optional[Dict[str, Any]]):
+        self.channel_id = channel_id
+        self._resp = resp
+        self._known = known
+        self._hash = hashlib.sha256()
+        self.count = 0
+        self.not_modified = resp.status_code == 304 and known is not None
+        self.validator: Dict[str, Any] = dict(known) if self.not_modified else {
+            "params": params_key,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "sha256": None,
+        }
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        if self.not_modified:
+            return
+        for item in DECODER.iter_items(self._resp, key="epg", on_bytes=self._hash.update):
+            self.count += 1
+            yield item
+        self.validator["sha256"] = self._hash.hexdigest()
+        logger.info("EPG items for channel %s: %d", self.channel_id, self.count)
+
+    @property
+    def unchanged(self) -> bool:
+        """Ответ 304 или (после полного прочтения) тело совпало по хэшу с предыдущим."""
+        if self.not_modified:
+            return True
+        sha = self.validator.get("sha256")
+        return bool(self._known and sha and self._known.get("sha256") == sha)
+
+    def close(self) -> None:
+        close = getattr(self._resp, "close", None)
+        if callable(close):
+            close()
+
+
+def open_epg_for_channel(
+    cfg: Config,
+    session,
+    channel_id: Any,
+    grouping: Optional[int] = None,
+    extra_params: Optional[Dict[str, Any]] = None,
+    validator: Optional[Dict[str, Any]] = None,
+) -> ChannelEPGStream:
+    """Открыть потоковый (и, при наличии `validator`, условный) запрос EPG канала.
+
+    Отправляет If-None-Match/If-Modified-Since из `validator`, если он получен
+    для тех же параметров запроса. Ответ 304 даёт `stream.not_modified`.
+    """
+    params = _channel_params(cfg, channel_id, grouping, extra_params)
+    params_key = validators.params_fingerprint(params)
+    known = validator if validator and validator.get("params") == params_key else None
 
-    logger.info("Fetching EPG for channel id=%s from %s", channel_id, cfg.iptv_base_url)
+    headers = dict(cfg.iptv_headers)
+    headers.update(validators.conditional_headers(known))
+
+    logger.info("Fetching EPG for channel id=%s from %s (conditional=%s)", channel_id, cfg.iptv_base_url, bool(known))
     resp = session.get(
         cfg.iptv_base_url,
         params=params,
-        headers=cfg.iptv_headers,
+        headers=headers,
+        stream=True,
     )
-    resp.raise_for_status()
+    if resp.status_code == 304 and known:
+        logger.info("EPG for channel %s not modified (304)", channel_id)
+    else:
+        resp.raise_for_status()
+    return ChannelEPGStream(channel_id, resp, params_key, known)
 
-    try:
-        resp.encoding = "utf-8"
-    except Exception:
-        pass
-
-    try:
-        data = resp.json()
-    except ValueError:
-        raw = resp.content or b""
-        last_err = None
-        for enc in ("utf-8", "cp1251", "latin-1"):
-            try:
-                data = json.loads(raw.decode(enc))
-                logger.info("EPG JSON decoded with %s (channel %s)", enc, channel_id)
-                break
-            except Exception as e:
-                last_err = e
-                data = None
-        if data is None:
-            text_sample = (resp.text or "")[:200]
-            logger.warning(
-                "EPG response is not valid JSON after decode attempts for channel %s. Sample: %r; last_err=%s",
-                channel_id,
-                text_sample,
-                last_err,
-            )
-            return []
-
-    if isinstance(data, dict):
-        epg = data.get("epg")
-        if isinstance(epg, list):
-            logger.info("EPG items for channel %s: %d", channel_id, len(epg))
-            return epg
-        if all(k in data for k in ("title", "timestart", "timestop")):
-            return [data]
-        for v in data.values():
-            if isinstance(v, list) and v and isinstance(v[0], dict):
-                logger.info("EPG items (nested) for channel %s: %d", channel_id, len(v))
-                return v
-        logger.warning("Не удалось определить список EPG в ответе (channel %s), возвращаю пустой список", channel_id)
-        return []
-
-    if isinstance(data, list):
-        logger.info("EPG items (root list) for channel %s: %d", channel_id, len(data))
-        return data
-
-    logger.warning("Unexpected EPG response type for channel %s: %s", channel_id, type(data))
-    return []
+
+def iter_epg_for_channel(
+    cfg: Config,
+    session,
+    channel_id: Any,
+    grouping: Optional[int] = None,
+    extra_params: Optional[Dict[str, Any]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Запрашивает EPG для конкретного канала (id) и потоково выдаёт элементы EPG.
+
+    Параметры берутся из cfg.iptv_params с подстановкой id=channel_id, с
+    возможностью переопределить grouping и добавить параметры.
+    По умолчанию используются заголовки cfg.iptv_headers.
+    """
+    yield from open_epg_for_channel(cfg, session, channel_id, grouping, extra_params)
+
+
+def fetch_epg_for_channel(
+    cfg: Config,
+    session,
+    channel_id: Any,
+    grouping: Optional[int] = None,
+    extra_params: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """Запрашивает EPG для конкретного канала и возвращает список элементов (см. `iter_epg_for_channel`)."""
+    return list(iter_epg_for_channel(cfg, session, channel_id, grouping, extra_params))
@@ -0,0 +1,238 @@
+"""Общий декодер JSON-ответов IPTV API.
+
+- Кодировка определяется один раз по началу тела и запоминается для хоста,
+  поэтому повторные `json.loads` с перебором utf-8/cp1251/latin-1 не нужны.
+- Массив `epg` разбирается потоково, элемент за элементом, без загрузки
+  всего ответа в память.
+"""
+from __future__ import annotations
+
+import codecs
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+# Сколько байт смотреть при определении кодировки
+DETECT_BYTES = 64 * 1024
+_WS = " \t\r\n"
+
+
+def detect_encoding(head: bytes) -> str:
+    """Определить кодировку по началу тела: BOM, затем строгий UTF-8, затем cp1251/latin-1."""
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        # final=False: обрезанный на границе многобайтовый символ не считается ошибкой
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    try:
+        head.decode("cp1251")
+        return "cp1251"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+
+class _TextReader:
+    """Буфер над потоком текстовых фрагментов с инкрементальным `raw_decode`."""
+
+    def __init__(self, chunks: Iterator[str]):
+        self._chunks = chunks
+        self._decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self.eof = True
+            return False
+        if self.pos > CHUNK_SIZE:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += chunk
+        return True
+
+    def peek(self) -> str:
+        """Следующий значимый символ (без сдвига) или "" в конце потока."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, ch: str) -> None:
+        got = self.peek()
+        if got != ch:
+            raise ValueError(f"Ожидался {ch!r}, получено {got!r} на позиции {self.pos}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Разобрать следующее JSON-значение, догружая фрагменты по необходимости."""
+        self.peek()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # Число/литерал на краю буфера может быть обрезан — дочитаем и повторим
+            if end >= len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_json_items(chunks: Iterable[str], key: str = "epg") -> Iterator[Any]:
+    """Потоково выдавать элементы массива из JSON-текста.
+
+    Поддерживаемые формы:
+    - корневой список: `[...]`;
+    - словарь с массивом под ключом `key`: `{"epg": [...], ...}`.
+    Если ключа нет, словарь разбирается целиком и применяются прежние эвристики:
+    словарь сам является элементом EPG или содержит вложенный список словарей.
+    """
+    reader = _TextReader(iter(chunks))
+    first = reader.peek()
+    if first == "[":
+        reader.pos += 1
+        yield from _iter_array(reader)
+        return
+    if first != "{":
+        if first:
+            logger.warning("Unexpected JSON root %r, expected object or array", first)
+        return
+
+    reader.pos += 1
+    collected: Dict[str, Any] = {}
+    while True:
+        ch = reader.peek()
+        if ch == "}":
+            break
+        if ch == ",":
+            reader.pos += 1
+            continue
+        name = reader.value()
+        reader.expect(":")
+        if name == key and reader.peek() == "[":
+            reader.pos += 1
+            yield from _iter_array(reader)
+            return
+        collected[str(name)] = reader.value()
+
+    if all(k in collected for k in ("title", "timestart", "timestop")):
+        yield collected
+        return
+    for v in collected.values():
+        if isinstance(v, list) and v and isinstance(v[0], dict):
+            yield from v
+            return
+    logger.warning("Не удалось определить список EPG в ответе, ключи: %s", ", ".join(list(collected)[:10]))
+
+
+def _iter_array(reader: _TextReader) -> Iterator[Any]:
+    while True:
+        ch = reader.peek()
+        if ch == "]":
+            reader.pos += 1
+            return
+        if ch == ",":
+            reader.pos += 1
+            continue
+        if ch == "":
+            raise ValueError("Неожиданный конец JSON внутри массива")
+        yield reader.value()
+
+
+class ResponseDecoder:
+    """Декодер ответов с запоминанием кодировки по хосту.
+
+    Экземпляр `DECODER` разделяется всеми запросами процесса.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._host_encodings: Dict[str, str] = {}
+
+    def known_encoding(self, url: Optional[str]) -> Optional[str]:
+        with self._lock:
+            return self._host_encodings.get(urlparse(url or "").netloc)
+
+    def remember(self, url: Optional[str], encoding: str) -> None:
+        host = urlparse(url or "").netloc
+        with self._lock:
+            if self._host_encodings.get(host) != encoding:
+                logger.info("JSON encoding for %s: %s", host or "<unknown>", encoding)
+            self._host_encodings[host] = encoding
+
+    def _encoding_for(self, url: Optional[str], head: bytes) -> str:
+        enc = self.known_encoding(url)
+        if enc is None:
+            enc = detect_encoding(head[:DETECT_BYTES])
+            self.remember(url, enc)
+        return enc
+
+    def iter_text(self, resp, on_bytes: Optional[Callable[[bytes], None]] = None) -> Iterator[str]:
+        """Текстовые фрагменты тела ответа в определённой кодировке."""
+        raw = (c for c in resp.iter_content(chunk_size=CHUNK_SIZE) if c)
+        pending: List[bytes] = []
+        size = 0
+        # Копим начало тела, пока не хватит байт для определения кодировки
+        for chunk in raw:
+            pending.append(chunk)
+            size += len(chunk)
+            if size >= DETECT_BYTES:
+                break
+        head = b"".join(pending)
+        decoder = codecs.getincrementaldecoder(self._encoding_for(getattr(resp, "url", None), head))(errors="replace")
+        if on_bytes is not None and head:
+            on_bytes(head)
+        yield decoder.decode(head)
+        for chunk in raw:
+            if on_bytes is not None:
+                on_bytes(chunk)
+            yield decoder.decode(chunk)
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+    def iter_items(self, resp, key: str = "epg", on_bytes: Optional[Callable[[bytes], None]] = None) -> Iterator[Any]:
+        """Потоково выдавать элементы массива `key` из ответа (см. `iter_json_items`).
+
+        Ответ закрывается по завершении, даже если генератор не дочитан.
+        """
+        try:
+            yield from iter_json_items(self.iter_text(resp, on_bytes=on_bytes), key=key)
+        finally:
+            close = getattr(resp, "close", None)
+            if callable(close):
+                close()
+
+    def load(self, resp) -> Any:
+        """Разобрать тело ответа целиком: одно декодирование в определённой кодировке.
+
+        Возвращает None, если тело не является корректным JSON.
+        """
+        raw = resp.content or b""
+        enc = self._encoding_for(getattr(resp, "url", None), raw)
+        try:
+            return json.loads(raw.decode(enc, errors="replace"))
+        except ValueError as e:
+            logger.warning("Response is not valid JSON (%s). Sample: %r", e, raw[:200])
+            return None
+
+
+DECODER = ResponseDecoder()
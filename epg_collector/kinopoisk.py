@@ -3,67 +3,181 @@ from __future__ import annotations
 import hashlib
 import json
 import logging
+import threading
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 from urllib.parse import quote_plus
 
 from bs4 import BeautifulSoup
 
+from .circuit_breaker import CircuitBreaker
 from .config import Config
+from .logging_enhanced import metrics_logger
+from .metadata_store import MetadataStore, TransientLookupError, get_metadata_store
 
 logger = logging.getLogger(__name__)
 
 
+class _ScrapeBlocked(Exception):
+    """Ответ КиноПоиска — страница антибота или заведомо битое название."""
+
+
+_web_breaker: Optional[CircuitBreaker] = None
+
+
+def _record_breaker_change(name: str, old_state: str, new_state: str, snapshot: Dict[str, Any]) -> None:
+    metrics_logger.record_metric("circuit_breaker_state", new_state, tags={"breaker": name, "from": old_state})
+
+
+def get_web_breaker(cfg: Config) -> CircuitBreaker:
+    """Общий на процесс предохранитель веб-скрейпинга КиноПоиска."""
+    global _web_breaker
+    if _web_breaker is None:
+        _web_breaker = CircuitBreaker(
+            "kinopoisk_web",
+            failure_threshold=cfg.kinopoisk_breaker_threshold,
+            cooldown=cfg.kinopoisk_breaker_cooldown,
+            on_change=_record_breaker_change,
+        )
+    return _web_breaker
+
+
+_BROWSER_UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+_ACCEPT_HTML = "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8"
+SEARCH_HEADERS = {
+    "User-Agent": _BROWSER_UA,
+    "Accept": _ACCEPT_HTML,
+    "Accept-Language": "ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7",
+    "Connection": "keep-alive",
+}
+FILM_HEADERS = {
+    "User-Agent": _BROWSER_UA,
+    "Referer": "https://www.kinopoisk.ru/",
+    "Accept": _ACCEPT_HTML,
+    "Accept-Language": "ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7",
+    "Connection": "keep-alive",
+}
+
+
+# Прежний файловый кэш: по JSON-файлу на название, имя — sha1(название.strip().lower())
+LEGACY_CACHE_DIR = Path("cache/kinopoisk")
+# Перенесённые из него записи: ключ — тот же sha1 (исходное название из имени файла не восстановить)
+LEGACY_SOURCE = "kinopoisk_sha1"
+
+_migrated: set = set()
+_migrate_lock = threading.Lock()
+
+
+def _legacy_key(title: str) -> str:
+    return hashlib.sha1(title.strip().lower().encode("utf-8")).hexdigest()
+
+
+def migrate_file_cache(store: MetadataStore, cache_dir: Path = LEGACY_CACHE_DIR) -> int:
+    """Перенести cache/kinopoisk/*.json в хранилище метаданных одной транзакцией.
+
+    Записи с антиботом или битым названием пропускаются. Срока жизни у
+    перенесённых записей нет, как и у файлового кэша: каталог после переноса
+    переименовывается в `*.migrated` (перенос выполняется один раз), и иначе
+    записи пропали бы через METADATA_TTL_DAYS. Возвращает число перенесённых записей.
+    """
+    if not cache_dir.is_dir():
+        return 0
+    entries = []
+    for path in sorted(cache_dir.glob("*.json")):
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except Exception:
+            logger.debug("Skipping unreadable Kinopoisk cache file %s", path)
+            continue
+        if not isinstance(data, dict):
+            continue
+        # Как и прежде при чтении кэша: антибот и битая кодировка не переносятся
+        name = data.get("name")
+        if isinstance(name, str) and KinoPoiskClient._is_bad_name(name):
+            continue
+        entries.append((path.stem, None, data))
+    n = store.put_many(LEGACY_SOURCE, entries, expires_at=store.NEVER_EXPIRES) if entries else 0
+    target = cache_dir.with_name(cache_dir.name + ".migrated")
+    try:
+        cache_dir.rename(target)
+    except OSError as e:
+        logger.warning("Не удалось переименовать %s после переноса: %s", cache_dir, e)
+    logger.info("Kinopoisk file cache migrated: %s entries from %s", n, cache_dir)
+    return n
+
+
 class KinoPoiskClient:
     """Клиент для получения информации о фильме по названию.
 
     При наличии API-ключа использует https://api.kinopoisk.dev.
     Иначе пытается выполнить веб-поиск на https://www.kinopoisk.ru (best-effort, может блокироваться).
-    Результаты кэшируются в файловой системе по названию фильма.
+    Результаты (и ответы «не найдено», с коротким TTL) хранятся в хранилище
+    метаданных, которое проверяется перед любым запросом в сеть; прежний
+    файловый кэш cache/kinopoisk переносится туда автоматически.
+    Веб-поиск отключается предохранителем после серии блокировок антиботом.
     """
 
-    def __init__(self, cfg: Config, session):
+    def __init__(
+        self,
+        cfg: Config,
+        session,
+        web_breaker: Optional[CircuitBreaker] = None,
+        store: Optional[MetadataStore] = None,
+    ):
         self.cfg = cfg
         self.session = session
-        self.cache_dir = Path("cache/kinopoisk")
-        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.web_breaker = web_breaker or get_web_breaker(cfg)
+        self.store = store or get_metadata_store(cfg)
+        if self.store is not None:
+            with _migrate_lock:
+                if str(self.store.path) not in _migrated:
+                    _migrated.add(str(self.store.path))
+                    try:
+                        migrate_file_cache(self.store)
+                    except Exception as e:
+                        # Без перенесённого кэша названия просто будут найдены заново
+                        logger.warning("Не удалось перенести файловый кэш КиноПоиска: %s", e)
 
-    def _cache_path(self, title: str) -> Path:
-        key = hashlib.sha1(title.strip().lower().encode("utf-8")).hexdigest()
-        return self.cache_dir / f"{key}.json"
+    def _load_legacy(self, title: str) -> Optional[Dict[str, Any]]:
+        """Результат из перенесённого файлового кэша (ключ — sha1 названия)."""
+        if self.store is None:
+            return None
+        hit, data = self.store.get(LEGACY_SOURCE, _legacy_key(title), count=False)
+        return data if hit else None
 
-    def _load_cache(self, title: str) -> Optional[Dict[str, Any]]:
-        path = self._cache_path(title)
-        if path.exists():
-            try:
-                data = json.loads(path.read_text(encoding="utf-8"))
-                # Не используем кэш, если там явно антибот или битая кодировка
-                name = (data or {}).get("name")
-                if isinstance(name, str) and self._is_bad_name(name):
-                    logger.info("Kinopoisk cache contains invalid name for '%s', ignoring cache", title)
-                    return None
-                return data
-            except Exception:
-                return None
-        return None
+    def get_movie_info(self, title: str) -> Optional[Dict[str, Any]]:
+        try:
+            if self.store is None:
+                return self._fetch_movie_info(title)
+            return self.store.lookup("kinopoisk", title, None, lambda: self._fetch_movie_info(title))
+        except TransientLookupError as e:
+            logger.debug("Kinopoisk lookup for '%s' not cached: %s", title, e)
+            return None
 
-    def _save_cache(self, title: str, data: Dict[str, Any]) -> None:
-        path = self._cache_path(title)
-        path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    def _fetch_movie_info(self, title: str) -> Optional[Dict[str, Any]]:
+        """Перенесённый файловый кэш, затем API и веб-поиск.
 
-    def get_movie_info(self, title: str) -> Optional[Dict[str, Any]]:
-        cached = self._load_cache(title)
+        None — фильм не найден всеми опрошенными источниками; если ответ
+        неопределённый (ошибка, антибот, открытый предохранитель) —
+        TransientLookupError, и в хранилище он не попадает.
+        """
+        cached = self._load_legacy(title)
         if cached is not None:
-            logger.debug("Kinopoisk cache hit for '%s'", title)
+            logger.debug("Kinopoisk legacy cache hit for '%s'", title)
             return cached
 
         data: Optional[Dict[str, Any]] = None
+        definitive = True
         if self.cfg.kinopoisk_api_key:
-            data = self._query_api(title)
+            data, definitive = self._query_api_result(title)
         if data is None:
-            data = self._scrape_web(title)
+            data, web_definitive = self._scrape_web_result(title)
+            definitive = definitive and web_definitive
 
-        # Финальная валидация + починка mojibake
+        return self._finalize(title, data, definitive)
+
+    def _finalize(self, title: str, data: Optional[Dict[str, Any]], definitive: bool) -> Optional[Dict[str, Any]]:
+        """Финальная валидация + починка mojibake; неопределённый ответ — TransientLookupError."""
         if isinstance(data, dict):
             nm = data.get("name")
             if isinstance(nm, str):
@@ -71,146 +185,174 @@ class KinoPoiskClient:
             if self._is_bad_name(data.get("name")):
                 logger.info("Kinopoisk: dropping invalid result for '%s' (robot or bad name)", title)
                 data = None
+                definitive = False
 
-        if data is not None:
-            self._save_cache(title, data)
+        if data is None and not definitive:
+            raise TransientLookupError("no definitive answer from KinoPoisk")
         return data
 
     # --- API mode ---
     def _query_api(self, title: str) -> Optional[Dict[str, Any]]:
+        return self._query_api_result(title)[0]
+
+    def _api_request(self, title: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
         base = self.cfg.kinopoisk_base_url.rstrip("/")
-        url = f"{base}/movie/search"
-        headers = {"X-API-KEY": self.cfg.kinopoisk_api_key}
-        params = {"query": title, "limit": 1}
+        return f"{base}/movie/search", {"X-API-KEY": self.cfg.kinopoisk_api_key}, {"query": title, "limit": 1}
+
+    def _query_api_result(self, title: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """(результат, определённость): «нет результатов» — определённый ответ, ошибка — нет."""
+        url, headers, params = self._api_request(title)
         try:
             resp = self.session.get(url, headers=headers, params=params)
             if resp.status_code == 401:
                 logger.error("Kinopoisk API unauthorized. Check KINOPOISK_API_KEY")
-                return None
+                return None, False
             resp.raise_for_status()
-            js = resp.json()
-            docs = js.get("docs") if isinstance(js, dict) else None
-            if not docs:
-                logger.info("Kinopoisk API: no results for '%s'", title)
-                return None
-            m = docs[0]
-            return {
-                "source": "api",
-                "kp_id": m.get("id"),
-                "name": m.get("name") or m.get("alternativeName"),
-                "year": m.get("year"),
-                "rating_kp": (m.get("rating") or {}).get("kp"),
-                "rating_imdb": (m.get("rating") or {}).get("imdb"),
-                "genres": [g.get("name") for g in (m.get("genres") or []) if isinstance(g, dict)],
-                "countries": [c.get("name") for c in (m.get("countries") or []) if isinstance(c, dict)],
-                "poster_url": (m.get("poster") or {}).get("url"),
-                "url": f"https://www.kinopoisk.ru/film/{m.get('id')}/" if m.get("id") else None,
-            }
+            return self._api_result(title, resp.json())
         except Exception as e:
             logger.exception("Kinopoisk API error for '%s': %s", title, e)
-            return None
+            return None, False
+
+    def _api_result(self, title: str, js: Any) -> Tuple[Optional[Dict[str, Any]], bool]:
+        docs = js.get("docs") if isinstance(js, dict) else None
+        if not docs:
+            logger.info("Kinopoisk API: no results for '%s'", title)
+            return None, True
+        m = docs[0]
+        return {
+            "source": "api",
+            "kp_id": m.get("id"),
+            "name": m.get("name") or m.get("alternativeName"),
+            "year": m.get("year"),
+            "rating_kp": (m.get("rating") or {}).get("kp"),
+            "rating_imdb": (m.get("rating") or {}).get("imdb"),
+            "genres": [g.get("name") for g in (m.get("genres") or []) if isinstance(g, dict)],
+            "countries": [c.get("name") for c in (m.get("countries") or []) if isinstance(c, dict)],
+            "poster_url": (m.get("poster") or {}).get("url"),
+            "url": f"https://www.kinopoisk.ru/film/{m.get('id')}/" if m.get("id") else None,
+        }, True
+
+    def record_run_metrics(self) -> Dict[str, Any]:
+        """Записать итоговое состояние предохранителя веб-поиска в метрики прогона."""
+        snapshot = self.web_breaker.snapshot()
+        metrics_logger.record_metric("kinopoisk_web_breaker", snapshot)
+        return snapshot
 
     # --- Web scraping fallback ---
     def _scrape_web(self, title: str) -> Optional[Dict[str, Any]]:
+        return self._scrape_web_result(title)[0]
+
+    def _scrape_web_result(self, title: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Веб-поиск под предохранителем; возвращает (результат, определённость).
+
+        Блокировка антиботом, битое название и ошибки HTTP считаются неудачами;
+        пока предохранитель открыт, запросы не выполняются.
+        """
+        if not self.web_breaker.allow():
+            logger.debug("Kinopoisk scraping skipped for '%s': circuit open", title)
+            return None, False
         try:
-            q = quote_plus(title)
-            search_url = f"https://www.kinopoisk.ru/index.php?kp_query={q}"
-            r = self.session.get(
-                search_url,
-                headers={
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
-                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-                    "Accept-Language": "ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7",
-                    "Connection": "keep-alive",
-                },
-                expire_after=0,
-            )
-            r.raise_for_status()
-            # Выставим явную кодировку, если не определена
-            if not r.encoding:
-                r.encoding = r.apparent_encoding or "utf-8"
-            soup = BeautifulSoup(r.text, "lxml")
-
-            if self._looks_like_robot_page(soup):
-                logger.warning("Kinopoisk search blocked by anti-bot for '%s'", title)
-                return None
-
-            # Простой парс: взять первую ссылку на фильм
-            link = soup.select_one(".most_wanted .element.most_wanted .info a[href^='/film/'], a[href^='/film/']")
-            if not link or not link.get("href"):
-                logger.info("Kinopoisk search: no film link for '%s'", title)
-                return None
-            href = link["href"]
-            film_url = f"https://www.kinopoisk.ru{href}" if href.startswith("/") else href
-
-            r2 = self.session.get(
-                film_url,
-                headers={
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
-                    "Referer": "https://www.kinopoisk.ru/",
-                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-                    "Accept-Language": "ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7",
-                    "Connection": "keep-alive",
-                },
-                expire_after=0,
-            )
-            r2.raise_for_status()
-            if not r2.encoding:
-                r2.encoding = r2.apparent_encoding or "utf-8"
-            soup2 = BeautifulSoup(r2.text, "lxml")
-
-            if self._looks_like_robot_page(soup2):
-                logger.warning("Kinopoisk film page blocked by anti-bot for '%s'", title)
-                return None
-
-            # Пробуем вытащить базовые поля (best effort)
-            name_tag = soup2.select_one("h1[data-tid]") or soup2.select_one("h1")
-            raw_name = name_tag.get_text(strip=True) if name_tag else title
-            name = self._fix_mojibake(raw_name)
-
-            rating_tag = soup2.select_one("span.film-rating-value, span.rating__value")
-            rating_kp = rating_tag.get_text(strip=True) if rating_tag else None
-
-            # Год
-            year_tag = soup2.find(string=lambda s: s and "год" in s.lower())
-            year = None
-            if year_tag and year_tag.parent:
-                try:
-                    year = int("".join(filter(str.isdigit, year_tag.parent.get_text())))
-                except Exception:
-                    year = None
-
-            # Постер: сначала og:image, затем типовые селекторы
-            poster_url = None
-            og_img = soup2.select_one('meta[property="og:image"]')
-            if og_img and og_img.get("content"):
-                poster_url = og_img.get("content")
-            if not poster_url:
-                img_tag = soup2.select_one("img.film-poster, img.poster, img[loading][src]")
-                if img_tag and img_tag.get("src"):
-                    poster_url = img_tag["src"]
-
-            result = {
-                "source": "web",
-                "kp_id": None,
-                "name": name,
-                "year": year,
-                "rating_kp": rating_kp,
-                "rating_imdb": None,
-                "genres": None,
-                "countries": None,
-                "poster_url": poster_url,
-                "url": film_url,
-            }
-            if self._is_bad_name(result.get("name")):
-                logger.info("Kinopoisk scraping produced invalid name for '%s' (robot/bad encoding)", title)
-                return None
-            return result
+            result = self._scrape_web_once(title)
+        except _ScrapeBlocked as e:
+            logger.warning("Kinopoisk %s for '%s'", e, title)
+            self.web_breaker.record_failure()
+            return None, False
         except Exception as e:
             logger.exception("Kinopoisk scraping error for '%s': %s", title, e)
+            self.web_breaker.record_failure()
+            return None, False
+        self.web_breaker.record_success()
+        return result, True
+
+    def _fetch_soup(self, url: str, headers: Dict[str, str], what: str) -> BeautifulSoup:
+        # Страницы КиноПоиска не кэшируются правилом CACHE_RULES (www.kinopoisk.ru=0)
+        r = self.session.get(url, headers=headers)
+        r.raise_for_status()
+        # Выставим явную кодировку, если не определена
+        if not r.encoding:
+            r.encoding = r.apparent_encoding or "utf-8"
+        return self._parse_html(r.text, what)
+
+    def _parse_html(self, html: str, what: str) -> BeautifulSoup:
+        # Капчу распознаём по тексту до полного разбора страницы
+        if self._looks_like_robot_html(html):
+            raise _ScrapeBlocked(f"{what} blocked by anti-bot")
+        soup = BeautifulSoup(html, "lxml")
+        if self._looks_like_robot_page(soup):
+            raise _ScrapeBlocked(f"{what} blocked by anti-bot")
+        return soup
+
+    @staticmethod
+    def _search_url(title: str) -> str:
+        return f"https://www.kinopoisk.ru/index.php?kp_query={quote_plus(title)}"
+
+    def _scrape_web_once(self, title: str) -> Optional[Dict[str, Any]]:
+        soup = self._fetch_soup(self._search_url(title), SEARCH_HEADERS, "search")
+        film_url = self._film_url(title, soup)
+        if film_url is None:
             return None
+        soup2 = self._fetch_soup(film_url, FILM_HEADERS, "film page")
+        return self._parse_film_page(title, film_url, soup2)
+
+    def _film_url(self, title: str, soup: BeautifulSoup) -> Optional[str]:
+        # Простой парс: взять первую ссылку на фильм
+        link = soup.select_one(".most_wanted .element.most_wanted .info a[href^='/film/'], a[href^='/film/']")
+        if not link or not link.get("href"):
+            logger.info("Kinopoisk search: no film link for '%s'", title)
+            return None
+        href = link["href"]
+        return f"https://www.kinopoisk.ru{href}" if href.startswith("/") else href
+
+    def _parse_film_page(self, title: str, film_url: str, soup2: BeautifulSoup) -> Dict[str, Any]:
+        # Пробуем вытащить базовые поля (best effort)
+        name_tag = soup2.select_one("h1[data-tid]") or soup2.select_one("h1")
+        raw_name = name_tag.get_text(strip=True) if name_tag else title
+        name = self._fix_mojibake(raw_name)
+
+        rating_tag = soup2.select_one("span.film-rating-value, span.rating__value")
+        rating_kp = rating_tag.get_text(strip=True) if rating_tag else None
+
+        # Год
+        year_tag = soup2.find(string=lambda s: s and "год" in s.lower())
+        year = None
+        if year_tag and year_tag.parent:
+            try:
+                year = int("".join(filter(str.isdigit, year_tag.parent.get_text())))
+            except Exception:
+                year = None
+
+        # Постер: сначала og:image, затем типовые селекторы
+        poster_url = None
+        og_img = soup2.select_one('meta[property="og:image"]')
+        if og_img and og_img.get("content"):
+            poster_url = og_img.get("content")
+        if not poster_url:
+            img_tag = soup2.select_one("img.film-poster, img.poster, img[loading][src]")
+            if img_tag and img_tag.get("src"):
+                poster_url = img_tag["src"]
+
+        result = {
+            "source": "web",
+            "kp_id": None,
+            "name": name,
+            "year": year,
+            "rating_kp": rating_kp,
+            "rating_imdb": None,
+            "genres": None,
+            "countries": None,
+            "poster_url": poster_url,
+            "url": film_url,
+        }
+        if self._is_bad_name(result.get("name")):
+            raise _ScrapeBlocked("scraping produced invalid name (robot/bad encoding)")
+        return result
 
     # --- Helpers ---
+    def _looks_like_robot_html(self, html: str) -> bool:
+        """Дешёвая проверка сырого HTML на фразу антибота (без разбора DOM)."""
+        t = (html or "").lower()
+        return "подтвердите" in t and "не робот" in t
+
     def _looks_like_robot_page(self, soup: BeautifulSoup) -> bool:
         try:
             text = soup.get_text(" ", strip=True)
@@ -225,7 +367,8 @@ class KinoPoiskClient:
         except Exception:
             return False
 
-    def _is_bad_name(self, name: Optional[str]) -> bool:
+    @staticmethod
+    def _is_bad_name(name: Optional[str]) -> bool:
         if not isinstance(name, str) or not name.strip():
             return True
         s = name.strip()
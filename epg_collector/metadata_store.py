@@ -0,0 +1,252 @@
+"""Хранилище метаданных обогащения (TMDB, КиноПоиск) в SQLite.
+
+Ключ — источник, нормализованное название (`dedup.normalize_title`) и год.
+Найденные результаты живут долго (METADATA_TTL_DAYS), «не найдено» — коротко
+(METADATA_NEGATIVE_TTL_HOURS): неизвестные названия не ищутся заново на каждом
+запуске, но и не застревают в кэше навсегда. Ошибки сети и блокировки
+(`TransientLookupError` и любые исключения из `fetch`) не сохраняются.
+"""
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Optional, Tuple
+
+from .dedup import normalize_title
+from .serialization import dumps, loads
+
+if TYPE_CHECKING:
+    from .config import Config
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    source TEXT NOT NULL,
+    title TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    found INTEGER NOT NULL,
+    data BLOB,
+    updated_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (source, title, year)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS metadata_expires ON metadata (expires_at);
+"""
+
+
+class TransientLookupError(Exception):
+    """Поиск не дал определённого ответа (сеть, антибот, открытый предохранитель) — не кэшируется.
+
+    `partial` — неполный результат, которым можно воспользоваться в текущем
+    прогоне, но нельзя сохранять (следующий прогон повторит поиск).
+    """
+
+    def __init__(self, message: str = "", partial: Any = None):
+        super().__init__(message)
+        self.partial = partial
+
+
+class MetadataStore:
+    """Кэш результатов поиска метаданных с TTL и негативным кэшированием.
+
+    Потокобезопасен: у каждого потока своё соединение (WAL, busy_timeout),
+    поэтому хранилище можно делить между пулом потоков обогащения.
+    Файл базы создаётся при первом обращении.
+    """
+
+    # expires_at для записей без срока жизни (31.12.9999)
+    NEVER_EXPIRES = 253402300799.0
+
+    def __init__(
+        self,
+        path: Path,
+        ttl: float = 30 * 86400,
+        negative_ttl: float = 86400,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = Path(path)
+        self.ttl = float(ttl)
+        self.negative_ttl = float(negative_ttl)
+        self._clock = clock
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._stats_lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits": 0, "negative_hits": 0, "misses": 0, "stored": 0, "stored_negative": 0}
+
+    def _conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            con = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._initialized:
+                    con.executescript(_SCHEMA)
+                    self._initialized = True
+            self._local.con = con
+        return con
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    @staticmethod
+    def _key(source: str, title: str, year: Optional[int]) -> Tuple[str, str, int]:
+        return source, normalize_title(title), int(year) if isinstance(year, int) else 0
+
+    def get(self, source: str, title: str, year: Optional[int] = None, count: bool = True) -> Tuple[bool, Any]:
+        """(True, данные или None для «не найдено») — если запись свежая; иначе (False, None).
+
+        `count=False` — служебное чтение, не учитывается в `stats`.
+        """
+        row = self._conn().execute(
+            "SELECT found, data FROM metadata WHERE source = ? AND title = ? AND year = ? AND expires_at > ?",
+            (*self._key(source, title, year), self._clock()),
+        ).fetchone()
+        if not count:
+            return (False, None) if row is None else (True, loads(row[1]) if row[0] else None)
+        if row is None:
+            self._count("misses")
+            return False, None
+        found, data = row
+        if not found:
+            self._count("negative_hits")
+            return True, None
+        self._count("hits")
+        return True, loads(data)
+
+    def _row(
+        self, source: str, title: str, year: Optional[int], data: Any, now: float, expires_at: Optional[float] = None
+    ) -> tuple:
+        found = data is not None
+        return (
+            *self._key(source, title, year),
+            int(found),
+            dumps(data, pretty=False) if found else None,
+            now,
+            expires_at if expires_at is not None else now + (self.ttl if found else self.negative_ttl),
+        )
+
+    def _insert(self, rows: Iterable[tuple]) -> int:
+        """Записать строки одной транзакцией."""
+        con = self._conn()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            cur = con.executemany(
+                "INSERT OR REPLACE INTO metadata (source, title, year, found, data, updated_at, expires_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        return cur.rowcount
+
+    def put(self, source: str, title: str, year: Optional[int], data: Any) -> None:
+        """Сохранить результат; `None` — «не найдено» с коротким TTL."""
+        self._insert([self._row(source, title, year, data, self._clock())])
+        self._count("stored" if data is not None else "stored_negative")
+
+    def put_many(
+        self,
+        source: str,
+        entries: Iterable[Tuple[str, Optional[int], Any]],
+        expires_at: Optional[float] = None,
+    ) -> int:
+        """Массовая запись (название, год, данные) одной транзакцией.
+
+        `expires_at` задаёт общий срок вместо TTL (например, `NEVER_EXPIRES`).
+        """
+        now = self._clock()
+        return self._insert([self._row(source, title, year, data, now, expires_at) for title, year, data in entries])
+
+    def export_jsonl(self, path: Path, source: Optional[str] = None) -> int:
+        """Выгрузить свежие записи в JSON Lines (для резервной копии или переноса)."""
+        sql = "SELECT source, title, year, found, data, updated_at, expires_at FROM metadata WHERE expires_at > ?"
+        params: list = [self._clock()]
+        if source is not None:
+            sql += " AND source = ?"
+            params.append(source)
+        n = 0
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        with tmp.open("wb") as f:
+            for src, title, year, found, data, updated_at, expires_at in self._conn().execute(sql, params):
+                entry = {
+                    "source": src,
+                    "title": title,
+                    "year": year or None,
+                    "data": loads(data) if found else None,
+                    "updated_at": updated_at,
+                    "expires_at": expires_at,
+                }
+                f.write(dumps(entry, pretty=False) + b"\n")
+                n += 1
+        tmp.replace(path)
+        return n
+
+    def import_jsonl(self, path: Path) -> int:
+        """Загрузить записи из `export_jsonl` одной транзакцией (сроки жизни сохраняются)."""
+        rows = []
+        with Path(path).open("rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                e = loads(line)
+                data = e.get("data")
+                rows.append((
+                    *self._key(e["source"], e["title"], e.get("year")),
+                    int(data is not None),
+                    dumps(data, pretty=False) if data is not None else None,
+                    float(e.get("updated_at") or self._clock()),
+                    float(e.get("expires_at") or self._clock() + self.ttl),
+                ))
+        return self._insert(rows)
+
+    def lookup(self, source: str, title: str, year: Optional[int], fetch: Callable[[], Any]) -> Any:
+        """Вернуть сохранённый результат или вызвать `fetch` и сохранить его ответ.
+
+        Исключения `fetch` пробрасываются и в хранилище не попадают.
+        """
+        hit, data = self.get(source, title, year)
+        if hit:
+            return data
+        data = fetch()
+        self.put(source, title, year, data)
+        return data
+
+    def purge_expired(self) -> int:
+        cur = self._conn().execute("DELETE FROM metadata WHERE expires_at <= ?", (self._clock(),))
+        return cur.rowcount
+
+    def close(self) -> None:
+        con = getattr(self._local, "con", None)
+        if con is not None:
+            con.close()
+            self._local.con = None
+
+
+_stores: Dict[str, MetadataStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_metadata_store(cfg: "Config") -> Optional[MetadataStore]:
+    """Общее на процесс хранилище из настроек (None, если METADATA_STORE_ENABLED=false)."""
+    if not cfg.metadata_store_enabled:
+        return None
+    with _stores_lock:
+        store = _stores.get(cfg.metadata_store_path)
+        if store is None:
+            store = _stores[cfg.metadata_store_path] = MetadataStore(
+                Path(cfg.metadata_store_path),
+                ttl=cfg.metadata_ttl_days * 86400,
+                negative_ttl=cfg.metadata_negative_ttl_hours * 3600,
+            )
+        return store
@@ -0,0 +1,263 @@
+"""Конвейер обработки из стадий, соединённых ограниченными очередями.
+
+Каждая стадия — функция над элементом и свой пул потоков. Стадии связаны
+очередями `queue.Queue(maxsize)`: если стадия не успевает, очередь перед ней
+заполняется и предыдущая стадия ждёт (backpressure), а не копит элементы в
+памяти. Так поиск метаданных (мелкие запросы, упирается в задержку) и
+загрузка постеров (упирается в полосу CDN) идут независимо: медленный CDN
+не останавливает поиск, пока не заполнится очередь перед загрузкой.
+
+По каждой стадии собирается `StageStats`: обработано, ошибки, занятость
+потоков, пропускная способность и глубина входной очереди.
+
+`run(items, ordered=True)` выдаёт результаты в порядке входа через буфер
+переупорядочивания: готовые вне очереди результаты ждут в буфере, а источник
+не читается дальше, чем на `window` элементов вперёд от ещё не выданного, —
+память ограничена окном, а не размером входа.
+"""
+from __future__ import annotations
+
+import itertools
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_POLL = 0.1
+
+
+@dataclass
+class Stage:
+    """Стадия конвейера: `fn(элемент) -> элемент` в `workers` потоках.
+
+    `queue_size` — ёмкость входной очереди (0 — по умолчанию `2 * workers`).
+    """
+
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+    queue_size: int = 0
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    processed: int = 0
+    errors: int = 0
+    busy: float = 0.0
+    max_depth: int = 0
+    depth_total: int = 0
+    depth_samples: int = 0
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None or self.finished is None:
+            return 0.0
+        return max(self.finished - self.started, 1e-9)
+
+    @property
+    def throughput(self) -> float:
+        """Элементов в секунду от первого до последнего обработанного."""
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def utilization(self) -> float:
+        """Доля времени, которую потоки стадии были заняты работой."""
+        return self.busy / (self.elapsed * self.workers) if self.elapsed else 0.0
+
+    @property
+    def avg_depth(self) -> float:
+        return self.depth_total / self.depth_samples if self.depth_samples else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "processed": self.processed,
+            "errors": self.errors,
+            "throughput": round(self.throughput, 2),
+            "utilization": round(self.utilization, 3),
+            "queue_max": self.max_depth,
+            "queue_avg": round(self.avg_depth, 2),
+        }
+
+    def describe(self) -> str:
+        return (
+            f"{self.name}: {self.processed} за {self.elapsed:.1f} с ({self.throughput:.1f}/с), "
+            f"потоков {self.workers}, занятость {self.utilization:.0%}, "
+            f"очередь макс. {self.max_depth} (сред. {self.avg_depth:.1f})"
+        )
+
+
+class _Failed:
+    """Исключение стадии, которое идёт по конвейеру вместо результата."""
+
+    def __init__(self, stage: str, exc: BaseException):
+        self.stage = stage
+        self.exc = exc
+
+
+_DONE = object()
+
+
+class Pipeline:
+    """Последовательность стадий, соединённых ограниченными очередями.
+
+    `run(items)` выдаёт результаты последней стадии по мере готовности в виде
+    пар (индекс входного элемента, результат); с `ordered=True` — в порядке
+    входа (см. описание модуля).
+    Исключение любой стадии пробрасывается из `run`; остальные потоки после
+    этого останавливаются.
+    """
+
+    def __init__(self, stages: List[Stage]):
+        if not stages:
+            raise ValueError("Конвейеру нужна хотя бы одна стадия")
+        self.stages = stages
+        self.stats: Dict[str, StageStats] = {s.name: StageStats(s.name, max(1, s.workers)) for s in stages}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        # Наибольшее число результатов, ждавших в буфере переупорядочивания
+        self.reorder_max = 0
+
+    def _put(self, q: "queue.Queue", item: Any, stats: Optional[StageStats] = None) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=_POLL)
+            except queue.Full:
+                continue
+            if stats is not None:
+                depth = q.qsize()
+                with self._lock:
+                    stats.max_depth = max(stats.max_depth, depth)
+                    stats.depth_total += depth
+                    stats.depth_samples += 1
+            return True
+        return False
+
+    def _get(self, q: "queue.Queue") -> Any:
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=_POLL)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _acquire(self, slots: threading.Semaphore) -> bool:
+        while not self._stop.is_set():
+            if slots.acquire(timeout=_POLL):
+                return True
+        return False
+
+    def default_window(self) -> int:
+        """Окно переупорядочивания, при котором все очереди и потоки могут быть заняты."""
+        return sum((s.queue_size or 2 * max(1, s.workers)) + max(1, s.workers) for s in self.stages)
+
+    def run(self, items: Iterable[Any], ordered: bool = False, window: int = 0) -> Iterator[Tuple[int, Any]]:
+        self._stop.clear()
+        self.reorder_max = 0
+        # Слоты окна: источник берёт слот на элемент, выдача по порядку его возвращает
+        slots = threading.Semaphore(window or self.default_window()) if ordered else None
+        queues = [queue.Queue(maxsize=s.queue_size or 2 * max(1, s.workers)) for s in self.stages]
+        out: "queue.Queue" = queue.Queue()
+        threads: List[threading.Thread] = []
+
+        def feed() -> None:
+            first = self.stats[self.stages[0].name]
+            try:
+                it = iter(items)
+                for i in itertools.count():
+                    # Слот берётся до чтения: источник не читается дальше окна
+                    if slots is not None and not self._acquire(slots):
+                        return
+                    try:
+                        item = next(it)
+                    except StopIteration:
+                        break
+                    if not self._put(queues[0], (i, item), first):
+                        return
+            except Exception as e:
+                # Ошибка источника проходит по стадиям и пробрасывается из run
+                self._put(queues[0], (-1, _Failed("source", e)))
+            for _ in range(first.workers):
+                self._put(queues[0], _DONE)
+
+        def work(k: int, remaining: List[int]) -> None:
+            stage, stats = self.stages[k], self.stats[self.stages[k].name]
+            downstream = queues[k + 1] if k + 1 < len(self.stages) else out
+            next_stats = self.stats[self.stages[k + 1].name] if k + 1 < len(self.stages) else None
+            while True:
+                env = self._get(queues[k])
+                if env is _DONE:
+                    break
+                i, value = env
+                if not isinstance(value, _Failed):
+                    started = time.monotonic()
+                    with self._lock:
+                        if stats.started is None:
+                            stats.started = started
+                    try:
+                        value = stage.fn(value)
+                    except Exception as e:
+                        logger.debug("Стадия %s: ошибка для элемента %s: %s", stage.name, i, e)
+                        value = _Failed(stage.name, e)
+                    finished = time.monotonic()
+                    with self._lock:
+                        stats.busy += finished - started
+                        stats.finished = finished
+                        if isinstance(value, _Failed):
+                            stats.errors += 1
+                        else:
+                            stats.processed += 1
+                if not self._put(downstream, (i, value), next_stats):
+                    return
+            with self._lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                # Последний поток стадии закрывает следующую
+                for _ in range(next_stats.workers if next_stats is not None else 1):
+                    self._put(downstream, _DONE)
+
+        threads.append(threading.Thread(target=feed, name="pipeline-feed", daemon=True))
+        for k, stage in enumerate(self.stages):
+            remaining = [max(1, stage.workers)]
+            for n in range(remaining[0]):
+                threads.append(threading.Thread(target=work, args=(k, remaining), name=f"pipeline-{stage.name}-{n}", daemon=True))
+        for t in threads:
+            t.start()
+        pending: Dict[int, Any] = {}
+        next_index = 0
+        try:
+            while True:
+                env = self._get(out)
+                if env is _DONE:
+                    break
+                i, value = env
+                if isinstance(value, _Failed):
+                    raise value.exc
+                if slots is None:
+                    yield i, value
+                    continue
+                pending[i] = value
+                self.reorder_max = max(self.reorder_max, len(pending))
+                while next_index in pending:
+                    yield next_index, pending.pop(next_index)
+                    next_index += 1
+                    slots.release()
+        finally:
+            self._stop.set()
+            for t in threads:
+                t.join()
+
+    def describe(self) -> List[str]:
+        return [self.stats[s.name].describe() for s in self.stages]
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        return {s.name: self.stats[s.name].as_dict() for s in self.stages}
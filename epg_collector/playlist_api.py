@@ -1,10 +1,10 @@
 from __future__ import annotations
 
-import json
 import logging
 from typing import Any, Dict
 
 from .config import Config
+from .json_stream import DECODER
 
 logger = logging.getLogger(__name__)
 
@@ -25,32 +25,10 @@ def fetch_playlist(cfg: Config, session) -> Dict[str, Any]:
     )
     resp.raise_for_status()
 
-    # Принудительно используем UTF-8 (иногда серверы выставляют неверную кодировку)
-    try:
-        resp.encoding = "utf-8"
-    except Exception:
-        pass
-
-    # Надёжный парсинг JSON: сначала обычным способом, затем через декодирование байтов
-    try:
-        data = resp.json()
-        if isinstance(data, dict):
-            logger.info("Playlist keys: %s", ", ".join(list(data.keys())[:10]))
-        return data if isinstance(data, dict) else {"data": data}
-    except ValueError:
-        raw = resp.content or b""
-        last_err = None
-        for enc in ("utf-8", "cp1251", "latin-1"):
-            try:
-                data = json.loads(raw.decode(enc))
-                logger.info("Playlist JSON decoded with %s", enc)
-                return data if isinstance(data, dict) else {"data": data}
-            except Exception as e:
-                last_err = e
-        text_sample = (resp.text or "")[:200]
-        logger.warning(
-            "Playlist response is not valid JSON after decode attempts. Sample: %r; last_err=%s",
-            text_sample,
-            last_err,
-        )
+    # Общий декодер: кодировка определяется один раз и запоминается для хоста
+    data = DECODER.load(resp)
+    if data is None:
         return {}
+    if isinstance(data, dict):
+        logger.info("Playlist keys: %s", ", ".join(list(data.keys())[:10]))
+    return data if isinstance(data, dict) else {"data": data}
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+import asyncio
 import re
 import hashlib
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 import requests
 
@@ -74,6 +76,44 @@ def _guess_ext(url: str, content_type: Optional[str]) -> str:
     return ".jpg"
 
 
+def _poster_base(title: str, epg_id: Optional[int], year: Optional[int], source: Optional[str]) -> str:
+    slug = _slugify(title)
+    id_part = str(epg_id) if epg_id is not None else hashlib.sha1(title.encode("utf-8")).hexdigest()[:8]
+    base = f"{id_part}-{slug}"
+    if isinstance(year, int):
+        base = f"{base}-{year}"
+    if isinstance(source, str) and source:
+        base = f"{base}-{_slugify(source)}"
+    return base
+
+
+def _existing_poster(posters_dir: Path, base: str) -> Optional[str]:
+    """Уже скачанный валидный файл постера; повреждённый удаляется, чтобы скачать заново."""
+    for ext in (".jpg", ".png", ".webp"):
+        existing = posters_dir / f"{base}{ext}"
+        if existing.exists():
+            if is_valid_image_file(existing):
+                return str(existing.as_posix())
+            try:
+                existing.unlink(missing_ok=True)
+            except Exception:
+                pass
+    return None
+
+
+def _is_image_response(content_type: Optional[str]) -> bool:
+    # Некоторые CDN возвращают text/html или application/json при ошибке
+    return isinstance(content_type, str) and content_type.lower().startswith("image/")
+
+
+def _check_download(path: Path, first_chunk: Optional[bytes], total: int) -> bool:
+    """Валидация скачанного файла: магические байты и минимальный размер; невалидный удаляется."""
+    if first_chunk is None or not _looks_like_image_magic(first_chunk) or total < MIN_VALID_BYTES:
+        path.unlink(missing_ok=True)
+        return False
+    return True
+
+
 def download_poster(
     session: requests.Session,
     url: str,
@@ -90,32 +130,17 @@ def download_poster(
     """
     try:
         posters_dir.mkdir(parents=True, exist_ok=True)
-        slug = _slugify(title)
-        id_part = str(epg_id) if epg_id is not None else hashlib.sha1(title.encode("utf-8")).hexdigest()[:8]
-
         # Если файл уже существует с любой известной графической экстеншн — вернём его без сети
-        base = f"{id_part}-{slug}"
-        if isinstance(year, int):
-            base = f"{base}-{year}"
-        if isinstance(source, str) and source:
-            base = f"{base}-{_slugify(source)}"
-        for ext in (".jpg", ".png", ".webp"):
-            existing = posters_dir / f"{base}{ext}"
-            if existing.exists():
-                if is_valid_image_file(existing):
-                    return str(existing.as_posix())
-                # Удалим повреждённый/слишком маленький файл и попробуем скачать заново
-                try:
-                    existing.unlink(missing_ok=True)
-                except Exception:
-                    pass
+        base = _poster_base(title, epg_id, year, source)
+        existing = _existing_poster(posters_dir, base)
+        if existing is not None:
+            return existing
 
         # Предварительный HEAD для типа контента может блокироваться, сразу GET c stream
         resp = session.get(url, stream=True)
         resp.raise_for_status()
         content_type = resp.headers.get("Content-Type")
-        if not (isinstance(content_type, str) and content_type.lower().startswith("image/")):
-            # Некоторые CDN возвращают text/html или application/json при ошибке
+        if not _is_image_response(content_type):
             return None
         ext = _guess_ext(url, content_type)
 
@@ -132,14 +157,100 @@ def download_poster(
                         first_chunk = bytes(chunk)
                     f.write(chunk)
                     total += len(chunk)
+            if not _check_download(path, first_chunk, total):
+                return None
+        # Возвращаем относительный путь в unix-стиле для переносимости
+        return str(path.as_posix())
+    except Exception:
+        return None
+
+
+async def download_poster_async(
+    client: Any,
+    url: str,
+    posters_dir: Path,
+    *,
+    title: str,
+    epg_id: Optional[int],
+    year: Optional[int] = None,
+    source: Optional[str] = None,
+) -> Optional[str]:
+    """Асинхронный вариант `download_poster` с тем же именованием и проверками.
 
-            # Валидация: магические байты и минимальный размер
-            if first_chunk is None or not _looks_like_image_magic(first_chunk) or total < MIN_VALID_BYTES:
+    `client.stream(url)` — асинхронный контекстный менеджер ответа с
+    `headers`, `raise_for_status()` и `aiter_bytes()` (`async_enrich.AsyncHTTP`).
+    Файловые операции выполняются в потоках (`asyncio.to_thread`).
+    """
+    try:
+        await asyncio.to_thread(posters_dir.mkdir, parents=True, exist_ok=True)
+        base = _poster_base(title, epg_id, year, source)
+        existing = await asyncio.to_thread(_existing_poster, posters_dir, base)
+        if existing is not None:
+            return existing
+
+        async with client.stream(url) as resp:
+            resp.raise_for_status()
+            content_type = resp.headers.get("Content-Type")
+            if not _is_image_response(content_type):
+                return None
+            path = posters_dir / f"{base}{_guess_ext(url, content_type)}"
+            if not await asyncio.to_thread(path.exists):
+                total = 0
+                first_chunk: Optional[bytes] = None
+                f = await asyncio.to_thread(open, path, "wb")
                 try:
-                    path.unlink(missing_ok=True)
+                    async for chunk in resp.aiter_bytes(64 * 1024):
+                        if not chunk:
+                            continue
+                        if first_chunk is None:
+                            first_chunk = bytes(chunk)
+                        await asyncio.to_thread(f.write, chunk)
+                        total += len(chunk)
                 finally:
+                    await asyncio.to_thread(f.close)
+                if not await asyncio.to_thread(_check_download, path, first_chunk, total):
                     return None
-        # Возвращаем относительный путь в unix-стиле для переносимости
         return str(path.as_posix())
     except Exception:
         return None
+
+
+# --- Выбор постера при обогащении (общий для cli.enrich и async_enrich) ---
+
+
+def year_from_timestamp(ts: Any) -> Optional[int]:
+    """Безопасно получить год из Unix timestamp в UTC."""
+    try:
+        if isinstance(ts, (int, float)) and ts > 0:
+            return datetime.fromtimestamp(int(ts), tz=timezone.utc).year
+    except Exception:
+        return None
+    return None
+
+
+def poster_candidates(info: Any, tmdb_url: Optional[str], preview: Any) -> List[Dict[str, Any]]:
+    """URL постеров в порядке приоритета: TMDB из info, постер из info, отдельный поиск TMDB, превью EPG."""
+    candidates: List[Dict[str, Any]] = []  # {url, source}
+    if isinstance(info, dict):
+        # Если инфо из TMDB и содержит постер — приоритет
+        if info.get("source") == "tmdb":
+            pu = info.get("poster_url")
+            if isinstance(pu, str) and pu.startswith("http"):
+                candidates.append({"url": pu, "source": "tmdb"})
+        # Fallback: для КиноПоиска, если указан постер
+        pu_kp = info.get("poster_url")
+        if isinstance(pu_kp, str) and pu_kp.startswith("http"):
+            candidates.append({"url": pu_kp, "source": "kinopoisk"})
+    if isinstance(tmdb_url, str) and tmdb_url.startswith("http"):
+        candidates.append({"url": tmdb_url, "source": "tmdb"})
+    # Последний вариант — превью из EPG
+    if isinstance(preview, str) and preview.startswith("http"):
+        candidates.append({"url": preview, "source": "preview"})
+    return candidates
+
+
+def poster_year(info: Any, item: Dict[str, Any]) -> Optional[int]:
+    """Год для имени файла постера: из найденной информации, иначе по времени показа."""
+    if isinstance(info, dict) and isinstance(info.get("year"), int):
+        return info.get("year")
+    return year_from_timestamp(item.get("timestart"))
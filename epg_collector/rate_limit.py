@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Верхняя граница паузы по Retry-After, чтобы битый заголовок не остановил прогон надолго
+MAX_RETRY_AFTER = 300.0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After в секундах: число секунд или HTTP-дата."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def parse_rate_limits(raw: str) -> Dict[str, float]:
+    """Разобрать `host=rps,host=rps` в словарь лимитов."""
+    limits: Dict[str, float] = {}
+    for part in (raw or "").split(","):
+        host, sep, rate = part.partition("=")
+        if not sep or not host.strip():
+            continue
+        try:
+            limits[host.strip().lower()] = float(rate)
+        except ValueError:
+            logger.warning("Некорректный лимит в RATE_LIMITS: %r", part)
+    return limits
+
+
+class TokenBucket:
+    """Потокобезопасный token bucket с возможностью паузы (для Retry-After).
+
+    `rate <= 0` — без ограничения частоты (паузы при этом соблюдаются).
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(burst) if burst else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _try_take(self) -> float:
+        """Взять токен без ожидания: 0 — взят, иначе через сколько секунд пробовать снова."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self.rate <= 0:
+                return 0.0
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self.rate
+
+    def acquire(self) -> float:
+        """Взять токен, ожидая при необходимости. Возвращает время ожидания в секундах."""
+        waited = 0.0
+        while True:
+            wait = self._try_take()
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self) -> float:
+        """Как `acquire`, но ожидание не блокирует цикл событий."""
+        waited = 0.0
+        while True:
+            wait = self._try_take()
+            if wait <= 0:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds: float) -> None:
+        """Не выдавать токены `seconds` секунд; после паузы начать с пустого ведра."""
+        with self._lock:
+            until = time.monotonic() + max(0.0, seconds)
+            if until > self._paused_until:
+                self._paused_until = until
+            self._tokens = 0.0
+            self._updated = self._paused_until
+
+
+class HostRateLimiter:
+    """Ограничитель частоты запросов по хосту, общий для всех сессий и потоков.
+
+    Лимиты задаются в запросах в секунду (`RATE_LIMITS`); для хостов без явного
+    лимита используется `default_rate` (0 — без ограничения). Ответ 429 с
+    Retry-After приостанавливает весь хост, а не только получивший его поток.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None, default_rate: float = 0.0):
+        self._lock = threading.Lock()
+        self._rates: Dict[str, float] = dict(rates or {})
+        self._default_rate = default_rate
+        self._buckets: Dict[str, TokenBucket] = {}
+        self.stats: Dict[str, Dict[str, float]] = {}
+
+    def configure(self, rates: Optional[Dict[str, float]], default_rate: float = 0.0) -> None:
+        rates = dict(rates or {})
+        with self._lock:
+            if rates == self._rates and default_rate == self._default_rate:
+                return
+            self._rates = rates
+            self._default_rate = default_rate
+            self._buckets.clear()
+
+    def _bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self._rates.get(host, self._default_rate))
+                self._buckets[host] = bucket
+                self.stats[host] = {"requests": 0, "throttled": 0, "waited": 0.0}
+            return bucket
+
+    def acquire(self, url: str) -> None:
+        host = urlparse(url).netloc.lower()
+        self._account(host, self._bucket(host).acquire())
+
+    async def acquire_async(self, url: str) -> None:
+        """`acquire` для asyncio-клиентов: лимиты и паузы общие с синхронными сессиями."""
+        host = urlparse(url).netloc.lower()
+        self._account(host, await self._bucket(host).acquire_async())
+
+    def _account(self, host: str, waited: float) -> None:
+        with self._lock:
+            st = self.stats[host]
+            st["requests"] += 1
+            st["waited"] += waited
+
+    def throttled(self, url: str, retry_after: Optional[str], default: float, status: int = 429) -> float:
+        """Зафиксировать 429 (или 5xx с Retry-After) от хоста и приостановить его. Возвращает паузу в секундах."""
+        host = urlparse(url).netloc.lower()
+        delay = parse_retry_after(retry_after)
+        if delay is None:
+            delay = default
+        delay = min(delay, MAX_RETRY_AFTER)
+        self._bucket(host).pause(delay)
+        with self._lock:
+            self.stats[host]["throttled"] += 1
+        logger.warning("Host %s throttled (%s); pausing all requests for %.1fs", host, status, delay)
+        return delay
+
+
+_limiter = HostRateLimiter()
+
+
+def get_rate_limiter() -> HostRateLimiter:
+    """Общий на процесс ограничитель частоты."""
+    return _limiter
@@ -0,0 +1,145 @@
+"""Единый слой чтения/записи JSON для всех артефактов пайплайна.
+
+Бэкенд выбирается при импорте: orjson → msgspec → стандартный json.
+По умолчанию вывод компактный; отступы включаются `set_pretty(True)`
+(CLI: `--pretty` или JSON_PRETTY=true).
+"""
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Iterable, Optional, Union
+
+try:  # pragma: no cover - зависит от окружения
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
+try:  # pragma: no cover - зависит от окружения
+    import msgspec
+except ImportError:  # pragma: no cover
+    msgspec = None  # type: ignore[assignment]
+
+if orjson is not None:
+    BACKEND = "orjson"
+elif msgspec is not None:
+    BACKEND = "msgspec"
+else:
+    BACKEND = "json"
+
+_pretty = False
+
+
+def set_pretty(pretty: bool) -> None:
+    """Включить/выключить отступы по умолчанию для `dumps`/`write_json`."""
+    global _pretty
+    _pretty = bool(pretty)
+
+
+def is_pretty() -> bool:
+    return _pretty
+
+
+def dumps(obj: Any, pretty: Optional[bool] = None) -> bytes:
+    """Сериализовать в UTF-8 байты (кириллица без \\u-экранирования)."""
+    indent = _pretty if pretty is None else pretty
+    if BACKEND == "orjson":
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+    if BACKEND == "msgspec":
+        data = msgspec.json.encode(obj)
+        return msgspec.json.format(data, indent=2) if indent else data
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    if BACKEND == "orjson":
+        return orjson.loads(data)
+    if BACKEND == "msgspec":
+        return msgspec.json.decode(data)
+    return json.loads(data)
+
+
+def read_json(path: Path) -> Any:
+    """Прочитать JSON-файл целиком одним вызовом бэкенда."""
+    return loads(Path(path).read_bytes())
+
+
+def write_json(path: Path, obj: Any, pretty: Optional[bool] = None) -> None:
+    """Записать JSON атомарно (временный файл + `os.replace`)."""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        tmp.write_bytes(dumps(obj, pretty=pretty))
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+class JsonStreamWriter:
+    """Инкрементальная запись последовательности объектов в файл.
+
+    По умолчанию пишет JSON-массив (байт в байт как `write_json` для списка),
+    с `lines=True` — JSON Lines (по объекту на строку, без отступов).
+    Запись идёт во временный файл, который при `close()` атомарно заменяет
+    целевой; при ошибке внутри `with` временный файл удаляется, а прежний
+    результат остаётся нетронутым.
+    """
+
+    def __init__(self, path: Path, lines: bool = False, pretty: Optional[bool] = None):
+        self.path = Path(path)
+        self.lines = lines
+        self.pretty = (_pretty if pretty is None else pretty) and not lines
+        self.count = 0
+        self._tmp = self.path.with_name(self.path.name + ".tmp")
+        self._f = self._tmp.open("wb")
+        if not lines:
+            self._f.write(b"[")
+
+    def write(self, obj: Any) -> None:
+        data = dumps(obj, pretty=self.pretty)
+        if self.lines:
+            self._f.write(data + b"\n")
+        elif self.pretty:
+            # Сдвигаем элемент на уровень массива; переводов строк внутри JSON-строк нет
+            self._f.write((b",\n  " if self.count else b"\n  ") + data.replace(b"\n", b"\n  "))
+        else:
+            self._f.write(b"," + data if self.count else data)
+        self.count += 1
+
+    def extend(self, objs: Iterable[Any]) -> None:
+        for obj in objs:
+            self.write(obj)
+
+    def flush(self) -> None:
+        """Сбросить записанное во временный файл (частичный результат виден до `close()`)."""
+        self._f.flush()
+
+    def close(self) -> None:
+        if self._f.closed:
+            return
+        if not self.lines:
+            self._f.write(b"\n]" if self.pretty and self.count else b"]")
+        self._f.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self) -> None:
+        if not self._f.closed:
+            self._f.close()
+        if self._tmp.exists():
+            self._tmp.unlink()
+
+    def __enter__(self) -> "JsonStreamWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
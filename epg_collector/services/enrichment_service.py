@@ -1,14 +1,16 @@
 """Сервис для обогащения данных фильмов."""
 from __future__ import annotations
 
-import json
 import logging
 from pathlib import Path
 from typing import Any, Dict, List, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from ..config import Config
+from ..serialization import JsonStreamWriter, read_json, write_json
 from ..kinopoisk import KinoPoiskClient
+from ..logging_enhanced import metrics_logger
+from ..metadata_store import get_metadata_store
+from ..pipeline import Pipeline, Stage
 from ..tmdb import TMDBClient
 from ..posters import download_poster
 
@@ -22,8 +24,12 @@ class EnrichmentService:
         self.config = config
         self.session = session
         self.data_dir = data_dir
-        self.kinopoisk_client = KinoPoiskClient(config, session)
-        self.tmdb_client = TMDBClient(config, session) if config.tmdb_api_key else None
+        # Общее хранилище метаданных: клиенты смотрят в него до запросов в сеть
+        self.metadata_store = get_metadata_store(config)
+        self.kinopoisk_client = KinoPoiskClient(config, session, store=self.metadata_store)
+        self.tmdb_client = TMDBClient(config, session, store=self.metadata_store) if config.tmdb_api_key else None
+        # Метрики стадий последнего enrich_movies_parallel
+        self.pipeline_metrics: Optional[Dict[str, Dict[str, Any]]] = None
         
     def enrich_movies(self, movies: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
         """Обогащает фильмы данными из КиноПоиска и TMDB."""
@@ -31,7 +37,7 @@ class EnrichmentService:
             movies_path = self.data_dir / "movies.json"
             if not movies_path.exists():
                 raise FileNotFoundError(f"Файл фильмов не найден: {movies_path}")
-            movies = json.loads(movies_path.read_text(encoding="utf-8"))
+            movies = read_json(movies_path)
             
         logger.info(f"Начинаем обогащение {len(movies)} фильмов")
         
@@ -49,20 +55,46 @@ class EnrichmentService:
                 
         # Сохраняем результат
         enriched_path = self.data_dir / "enriched_movies.json"
-        enriched_path.write_text(
-            json.dumps(enriched_movies, ensure_ascii=False, indent=2),
-            encoding="utf-8"
-        )
+        write_json(enriched_path, enriched_movies)
         
         logger.info(f"Обогащение завершено, сохранено в {enriched_path}")
+        self._save_run_metrics()
         return enriched_movies
         
+    def _save_run_metrics(self) -> None:
+        """Сохранить метрики прогона (предохранитель КиноПоиска, хранилище метаданных, запросы к TMDB)."""
+        breaker = self.kinopoisk_client.record_run_metrics()
+        if self.metadata_store is not None:
+            metrics_logger.record_metric("metadata_store", dict(self.metadata_store.stats))
+        if self.tmdb_client is not None:
+            metrics_logger.record_metric("tmdb_lookup", self.tmdb_client.memo.stats())
+        if self.pipeline_metrics is not None:
+            metrics_logger.record_metric("enrich_pipeline", self.pipeline_metrics)
+        if breaker["opened"]:
+            logger.warning(
+                "Веб-поиск КиноПоиска блокировался: открытий %s, пропущено запросов %s",
+                breaker["opened"], breaker["short_circuited"],
+            )
+        metrics_logger.save_metrics()
+
     def _enrich_single_movie(self, movie: Dict[str, Any], posters_dir: Path) -> Dict[str, Any]:
         """Обогащает один фильм."""
         title = movie.get("title", "")
         if not title:
             return movie
             
+        enriched = self._lookup_movie(movie)
+                
+        # Скачиваем постер
+        poster_info = self._download_movie_poster(enriched, posters_dir)
+        if poster_info:
+            enriched.update(poster_info)
+            
+        return enriched
+
+    def _lookup_movie(self, movie: Dict[str, Any]) -> Dict[str, Any]:
+        """Копия фильма с данными КиноПоиска и TMDB (без постера)."""
+        title = movie.get("title", "")
         enriched = dict(movie)
         
         # Получаем данные из КиноПоиска
@@ -75,20 +107,14 @@ class EnrichmentService:
             tmdb_data = self.tmdb_client.get_movie_info(title)
             if tmdb_data:
                 enriched["tmdb"] = tmdb_data
-                
-        # Скачиваем постер
-        poster_info = self._download_movie_poster(enriched, posters_dir)
-        if poster_info:
-            enriched.update(poster_info)
-            
         return enriched
         
     def _download_movie_poster(self, movie: Dict[str, Any], posters_dir: Path) -> Optional[Dict[str, Any]]:
         """Скачивает постер для фильма."""
-        title = movie.get("title", "")
-        movie_id = movie.get("id", "unknown")
-        
-        # Приоритет источников постеров: TMDB -> КиноПоиск -> EPG preview
+        return self._download_first_poster(movie, self._select_poster_candidates(movie), posters_dir)
+
+    def _select_poster_candidates(self, movie: Dict[str, Any]) -> List[Dict[str, str]]:
+        """URL постеров в порядке приоритета: TMDB -> КиноПоиск -> EPG preview."""
         poster_candidates = []
         
         # TMDB постер
@@ -111,6 +137,14 @@ class EnrichmentService:
                 "url": movie["preview"],
                 "source": "preview"
             })
+        return poster_candidates
+
+    def _download_first_poster(
+        self, movie: Dict[str, Any], poster_candidates: List[Dict[str, str]], posters_dir: Path
+    ) -> Optional[Dict[str, Any]]:
+        """Скачать первый доступный постер из кандидатов."""
+        title = movie.get("title", "")
+        movie_id = movie.get("id", "unknown")
             
         # Пытаемся скачать постер
         for candidate in poster_candidates:
@@ -136,44 +170,82 @@ class EnrichmentService:
                 
         return None
         
-    def enrich_movies_parallel(self, movies: Optional[List[Dict[str, Any]]] = None, max_workers: int = 4) -> List[Dict[str, Any]]:
-        """Параллельное обогащение фильмов."""
+    def enrich_movies_parallel(
+        self,
+        movies: Optional[List[Dict[str, Any]]] = None,
+        max_workers: int = 4,
+        download_workers: Optional[int] = None,
+        window: Optional[int] = None,
+    ) -> int:
+        """Параллельное обогащение фильмов конвейером: поиск -> выбор постера -> загрузка -> запись.
+
+        У поиска метаданных (`max_workers` потоков) и загрузки постеров
+        (`download_workers`, по умолчанию столько же) свои пулы и ограниченные
+        очереди между стадиями; пропускная способность и глубина очередей
+        стадий пишутся в метрики прогона (`enrich_pipeline`).
+
+        Результаты пишутся в `enriched_movies.json` потоково и в порядке входа
+        через буфер переупорядочивания на `window` фильмов (по умолчанию —
+        ёмкость конвейера); до завершения уже записанное видно в
+        `enriched_movies.json.tmp`. В памяти держится только окно, список не
+        собирается: возвращается число записанных фильмов, результат —
+        `read_json(data_dir / "enriched_movies.json")`.
+        """
         if movies is None:
             movies_path = self.data_dir / "movies.json"
             if not movies_path.exists():
                 raise FileNotFoundError(f"Файл фильмов не найден: {movies_path}")
-            movies = json.loads(movies_path.read_text(encoding="utf-8"))
+            movies = read_json(movies_path)
             
         logger.info(f"Начинаем параллельное обогащение {len(movies)} фильмов ({max_workers} потоков)")
         
         posters_dir = self.data_dir / "posters"
         posters_dir.mkdir(parents=True, exist_ok=True)
         
-        enriched_movies = []
-        
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Создаем задачи
-            future_to_movie = {
-                executor.submit(self._enrich_single_movie, movie, posters_dir): movie 
-                for movie in movies
-            }
-            
-            # Собираем результаты
-            for future in as_completed(future_to_movie):
-                original_movie = future_to_movie[future]
-                try:
-                    enriched_movie = future.result()
-                    enriched_movies.append(enriched_movie)
-                except Exception as e:
-                    logger.error(f"Ошибка обогащения фильма {original_movie.get('title', 'Unknown')}: {e}")
-                    enriched_movies.append(original_movie)
-                    
-        # Сохраняем результат
+        def lookup(movie: Dict[str, Any]) -> Dict[str, Any]:
+            state: Dict[str, Any] = {"movie": movie, "enriched": movie, "candidates": []}
+            if not movie.get("title", ""):
+                return state
+            try:
+                state["enriched"] = self._lookup_movie(movie)
+            except Exception as e:
+                logger.error(f"Ошибка обогащения фильма {movie.get('title', 'Unknown')}: {e}")
+                state["failed"] = True
+            return state
+
+        def select(state: Dict[str, Any]) -> Dict[str, Any]:
+            if state["enriched"] is not state["movie"]:
+                state["candidates"] = self._select_poster_candidates(state["enriched"])
+            return state
+
+        def download(state: Dict[str, Any]) -> Dict[str, Any]:
+            if state["candidates"]:
+                poster_info = self._download_first_poster(state["enriched"], state["candidates"], posters_dir)
+                if poster_info:
+                    state["enriched"].update(poster_info)
+            return state
+
+        pipeline = Pipeline([
+            Stage("lookup", lookup, workers=max_workers),
+            Stage("select", select),
+            Stage("download", download, workers=download_workers or max_workers),
+        ])
+        window = window or pipeline.default_window()
         enriched_path = self.data_dir / "enriched_movies.json"
-        enriched_path.write_text(
-            json.dumps(enriched_movies, ensure_ascii=False, indent=2),
-            encoding="utf-8"
-        )
+        with JsonStreamWriter(enriched_path) as writer:
+            for _, state in pipeline.run(movies, ordered=True, window=window):
+                # Сохраняем оригинал при ошибке
+                result = state["movie"] if state.get("failed") else state["enriched"]
+                writer.write(result)
+                writer.flush()
+        self.pipeline_metrics = {
+            **pipeline.metrics(),
+            "reorder": {"window": window, "max_buffered": pipeline.reorder_max},
+        }
+        for line in pipeline.describe():
+            logger.info("Стадия %s", line)
+        logger.info("Буфер переупорядочивания: до %d из %d", pipeline.reorder_max, window)
         
-        logger.info(f"Параллельное обогащение завершено, сохранено в {enriched_path}")
-        return enriched_movies
+        logger.info(f"Параллельное обогащение завершено, сохранено {writer.count} в {enriched_path}")
+        self._save_run_metrics()
+        return writer.count
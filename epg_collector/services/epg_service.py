@@ -1,13 +1,14 @@
 """Сервис для работы с EPG данными."""
 from __future__ import annotations
 
-import json
 import logging
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 from ..config import Config
-from ..iptv_api import fetch_epg, fetch_epg_for_channel
+from ..serialization import JsonStreamWriter, read_json, write_json
+from ..channel_fetcher import fetch_channels
+from ..iptv_api import iter_epg
 from ..filters import filter_movies_by_category, filter_cartoons_by_category
 
 logger = logging.getLogger(__name__)
@@ -21,20 +22,20 @@ class EPGService:
         self.session = session
         self.data_dir = data_dir
         
-    def fetch_and_save_epg(self) -> List[Dict[str, Any]]:
-        """Загружает EPG и сохраняет в файл."""
+    def fetch_and_save_epg(self) -> int:
+        """Загружает EPG и потоково сохраняет в файл; возвращает число элементов.
+
+        Элементы пишутся по мере разбора ответа, весь EPG в памяти не собирается;
+        прочитать результат — `read_json(data_dir / "raw_epg.json")`.
+        """
         logger.info("Начинаем загрузку EPG данных")
         
-        epg_data = fetch_epg(self.config, self.session)
-        
         raw_path = self.data_dir / "raw_epg.json"
-        raw_path.write_text(
-            json.dumps(epg_data, ensure_ascii=False, indent=2), 
-            encoding="utf-8"
-        )
+        with JsonStreamWriter(raw_path) as writer:
+            writer.extend(iter_epg(self.config, self.session))
         
-        logger.info(f"Сохранено {len(epg_data)} элементов EPG в {raw_path}")
-        return epg_data
+        logger.info(f"Сохранено {writer.count} элементов EPG в {raw_path}")
+        return writer.count
         
     def filter_movies_from_epg(self, epg_data: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
         """Фильтрует фильмы из EPG данных."""
@@ -42,7 +43,7 @@ class EPGService:
             raw_path = self.data_dir / "raw_epg.json"
             if not raw_path.exists():
                 raise FileNotFoundError(f"EPG файл не найден: {raw_path}")
-            epg_data = json.loads(raw_path.read_text(encoding="utf-8"))
+            epg_data = read_json(raw_path)
             
         logger.info("Начинаем фильтрацию фильмов")
         
@@ -57,10 +58,7 @@ class EPGService:
         movies = filter_movies_by_category(items)
         
         movies_path = self.data_dir / "movies.json"
-        movies_path.write_text(
-            json.dumps(movies, ensure_ascii=False, indent=2),
-            encoding="utf-8"
-        )
+        write_json(movies_path, movies)
         
         logger.info(f"Отфильтровано {len(movies)} фильмов, сохранено в {movies_path}")
         return movies
@@ -71,27 +69,15 @@ class EPGService:
             channel_ids = channel_ids[:limit]
             
         epg_channels_dir = self.data_dir / "epg_channels"
-        epg_channels_dir.mkdir(parents=True, exist_ok=True)
-        
-        saved_count = 0
-        
-        for channel_id in channel_ids:
-            try:
-                logger.debug(f"Обрабатываем канал {channel_id}")
-                
-                epg_items = fetch_epg_for_channel(self.config, self.session, channel_id)
-                channel_data = {"our_id": channel_id, "epg": epg_items}
-                
-                output_path = epg_channels_dir / f"{channel_id}.json"
-                output_path.write_text(
-                    json.dumps(channel_data, ensure_ascii=False, indent=2),
-                    encoding="utf-8"
-                )
-                saved_count += 1
-                
-            except Exception as e:
-                logger.error(f"Ошибка обработки канала {channel_id}: {e}")
-                continue
-                
-        logger.info(f"Обработано {saved_count} каналов")
-        return saved_count
+        summary = fetch_channels(
+            self.config,
+            self.session,
+            channel_ids,
+            epg_channels_dir,
+            workers=self.config.iptv_concurrency,
+        )
+        for failed in summary.failed:
+            logger.error(f"Ошибка обработки канала {failed.channel_id}: {failed.error}")
+
+        logger.info(f"Обработано {summary.saved} каналов ({summary.throughput:.2f} каналов/с)")
+        return summary.saved
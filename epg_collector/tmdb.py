@@ -1,33 +1,100 @@
 from __future__ import annotations
 
-from typing import Optional, Any, Dict
+import threading
+from typing import Optional, Any, Callable, Dict, Hashable, List
 from urllib.parse import urlencode
 
 import requests
 
 from .config import Config
+from .metadata_store import MetadataStore, TransientLookupError, get_metadata_store
+
+
+class TMDBLookupMemo:
+    """Ответы TMDB (search/movie, movie/{id}) на время прогона.
+
+    Поиск постера и поиск информации о фильме делают один и тот же запрос
+    search/movie; мемо отдаёт повторы без обращения к сети. Общий для
+    нескольких клиентов (потоков): одновременные запросы с одним ключом
+    выполняются один раз. Ошибки не запоминаются.
+    """
+
+    def __init__(self) -> None:
+        self._results: Dict[Hashable, Any] = {}
+        self._inflight: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.saved = 0
+
+    def _hit(self, key: Hashable) -> Any:
+        # Вызывается под self._lock
+        self.saved += 1
+        return self._results[key]
+
+    def get(self, key: Hashable, fetch: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._results:
+                return self._hit(key)
+            key_lock = self._inflight.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if key in self._results:
+                    return self._hit(key)
+                self.requests += 1
+            value = fetch()
+            with self._lock:
+                self._results[key] = value
+                self._inflight.pop(key, None)
+            return value
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"requests": self.requests, "saved": self.saved}
 
 
 class TMDBClient:
     """Простой клиент TMDB: поиск фильма по названию и получение URL постера.
 
     Использует search/movie и собирает полный URL на основе TMDB_IMAGE_BASE.
+    Перед запросом в сеть смотрит в хранилище метаданных (`MetadataStore`):
+    найденное и «не найдено» сохраняются с разными TTL, ошибки — нет.
+    Ответы TMDB в пределах прогона запоминаются в `memo` (`TMDBLookupMemo`);
+    чтобы клиенты разных потоков делили его, передайте один и тот же объект.
+    Жанры определяются по `genre_ids` из результата поиска и списку жанров,
+    который запрашивается один раз на язык; запрос деталей фильма
+    (homepage, imdb_id) выполняется только с TMDB_DETAILS=true.
     """
 
-    def __init__(self, cfg: Config, session: requests.Session):
+    def __init__(
+        self,
+        cfg: Config,
+        session: requests.Session,
+        store: Optional[MetadataStore] = None,
+        memo: Optional[TMDBLookupMemo] = None,
+    ):
         self.session = session
         self.api_key = cfg.tmdb_api_key
         self.base_url = cfg.tmdb_base_url.rstrip("/")
         self.image_base = cfg.tmdb_image_base.rstrip("/")
+        self.store = store or get_metadata_store(cfg)
+        self.memo = memo if memo is not None else TMDBLookupMemo()
+        self.fetch_details = cfg.tmdb_details
 
     def is_enabled(self) -> bool:
         return bool(self.api_key)
 
-    def get_poster_url(self, title: str, year: Optional[int] = None, language: str = "ru-RU") -> Optional[str]:
-        if not self.is_enabled():
-            return None
-        if not title:
-            return None
+    def _cached(self, source: str, title: str, year: Optional[int], fetch: Callable[[], Any]) -> Any:
+        if self.store is None:
+            return fetch()
+        return self.store.lookup(source, title, year, fetch)
+
+    def _search(self, title: str, year: Optional[int], language: str) -> List[Dict[str, Any]]:
+        """search/movie (через `memo`); ошибки HTTP пробрасываются (такой ответ не кэшируется)."""
+        # Поиск TMDB не зависит от регистра — запрос в ключе нормализуем так же
+        key = ("search", title.strip().casefold(), year or None, language)
+        return self.memo.get(key, lambda: self._search_request(title, year, language))
+
+    def _search_url(self, title: str, year: Optional[int], language: str) -> str:
         params = {
             "api_key": self.api_key,
             "query": title,
@@ -36,17 +103,68 @@ class TMDBClient:
         }
         if year:
             params["year"] = year
-        url = f"{self.base_url}/search/movie?{urlencode(params)}"
-        try:
-            resp = self.session.get(url, timeout=30)
-            resp.raise_for_status()
-            data: Dict[str, Any] = resp.json()
-            results = data.get("results") or []
-            for r in results:
-                poster_path = r.get("poster_path")
-                if isinstance(poster_path, str) and poster_path.startswith("/"):
-                    return f"{self.image_base}{poster_path}"
+        return f"{self.base_url}/search/movie?{urlencode(params)}"
+
+    def _search_request(self, title: str, year: Optional[int], language: str) -> List[Dict[str, Any]]:
+        return self._get_json(self._search_url(title, year, language)).get("results") or []
+
+    def _genres_url(self, language: str) -> str:
+        return f"{self.base_url}/genre/movie/list?{urlencode({'api_key': self.api_key, 'language': language})}"
+
+    @staticmethod
+    def _parse_genres(data: Dict[str, Any]) -> Optional[Dict[str, str]]:
+        genres = {
+            str(g["id"]): str(g["name"])
+            for g in data.get("genres") or []
+            if isinstance(g, dict) and g.get("id") is not None and g.get("name")
+        }
+        return genres or None
+
+    def _details_url(self, movie_id: Any, language: str) -> str:
+        params = urlencode({"api_key": self.api_key, "language": language, "append_to_response": "external_ids"})
+        return f"{self.base_url}/movie/{movie_id}?{params}"
+
+    def genre_names(self, language: str = "ru-RU") -> Dict[int, str]:
+        """Соответствие id жанра -> название (genre/movie/list): раз на прогон в `memo`, между прогонами — в хранилище."""
+
+        def fetch() -> Optional[Dict[str, str]]:
+            return self._parse_genres(self._get_json(self._genres_url(language)))
+
+        data = self.memo.get(("genres", language), lambda: self._cached("tmdb_genres", language, None, fetch))
+        return {int(k): v for k, v in (data or {}).items()}
+
+    def _details(self, movie_id: Any, language: str) -> Dict[str, Any]:
+        """movie/{id} вместе с external_ids (append_to_response) — одним запросом."""
+        url = self._details_url(movie_id, language)
+        return self.memo.get(("movie", movie_id, language), lambda: self._get_json(url))
+
+    def _get_json(self, url: str) -> Dict[str, Any]:
+        resp = self.session.get(url, timeout=30)
+        resp.raise_for_status()
+        return resp.json()
+
+    def find_poster_url(self, title: str, year: Optional[int] = None, language: str = "ru-RU") -> Optional[str]:
+        """URL постера или None, если фильм не найден; при ошибке сети — исключение."""
+        if not self.is_enabled() or not title:
             return None
+
+        def fetch() -> Optional[Dict[str, Any]]:
+            return self._poster_from_results(self._search(title, year, language))
+
+        data = self._cached(f"tmdb_poster:{language}", title, year, fetch)
+        return data.get("poster_url") if isinstance(data, dict) else None
+
+    def _poster_from_results(self, results: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Первый результат поиска с постером — в формате записи хранилища."""
+        for r in results:
+            poster_path = r.get("poster_path")
+            if isinstance(poster_path, str) and poster_path.startswith("/"):
+                return {"poster_url": f"{self.image_base}{poster_path}"}
+        return None
+
+    def get_poster_url(self, title: str, year: Optional[int] = None, language: str = "ru-RU") -> Optional[str]:
+        try:
+            return self.find_poster_url(title, year=year, language=language)
         except Exception:
             return None
 
@@ -68,64 +186,84 @@ class TMDBClient:
         """
         if not self.is_enabled() or not title:
             return None
-        # 1) Поиск фильма
-        params = {
-            "api_key": self.api_key,
-            "query": title,
-            "include_adult": "true",
-            "language": language,
-        }
-        if year:
-            params["year"] = year
-        search_url = f"{self.base_url}/search/movie?{urlencode(params)}"
         try:
-            r = self.session.get(search_url, timeout=30)
-            r.raise_for_status()
-            js: Dict[str, Any] = r.json()
-            results = js.get("results") or []
-            if not results:
-                return None
-            first = results[0]
-            movie_id = first.get("id")
-            poster_url = None
-            if isinstance(first.get("poster_path"), str) and first["poster_path"].startswith("/"):
-                poster_url = f"{self.image_base}{first['poster_path']}"
-            # Предварительные поля
-            name = first.get("title") or first.get("original_title") or title
-            release_date = first.get("release_date") or ""
-            try:
-                tmdb_year = int(release_date.split("-")[0]) if release_date else None
-            except Exception:
-                tmdb_year = None
-            rating_tmdb = first.get("vote_average")
-            # 2) Детали фильма для жанров и ссылок
-            genres_list = None
-            homepage = None
-            if movie_id:
-                details_params = {
-                    "api_key": self.api_key,
-                    "language": language,
-                }
-                details_url = f"{self.base_url}/movie/{movie_id}?{urlencode(details_params)}"
-                try:
-                    d = self.session.get(details_url, timeout=30)
-                    d.raise_for_status()
-                    dj: Dict[str, Any] = d.json()
-                    g = dj.get("genres") or []
-                    if isinstance(g, list):
-                        genres_list = [str(x.get("name")) for x in g if isinstance(x, dict) and x.get("name")]
-                    homepage = dj.get("homepage")
-                except Exception:
-                    pass
-            return {
-                "source": "tmdb",
-                "name": name,
-                "year": tmdb_year or year,
-                "rating_kp": None,
-                "rating_imdb": float(rating_tmdb) if isinstance(rating_tmdb, (int, float)) else None,
-                "genres": genres_list,
-                "poster_url": poster_url,
-                "url": homepage,
-            }
+            return self._cached(f"tmdb:{language}", title, year, lambda: self._fetch_movie_info(title, year, language))
+        except TransientLookupError as e:
+            # Неполная запись: используем в этом прогоне, в хранилище не попадает
+            return e.partial
         except Exception:
             return None
+
+    def _fetch_movie_info(self, title: str, year: Optional[int], language: str) -> Optional[Dict[str, Any]]:
+        # 1) Поиск фильма
+        results = self._search(title, year, language)
+        if not results:
+            return None
+        first = results[0]
+        # 2) Жанры — по genre_ids из списка жанров, без запроса деталей фильма
+        names: Dict[int, str] = {}
+        failed = None
+        if isinstance(first.get("genre_ids"), list):
+            try:
+                names = self.genre_names(language)
+            except Exception as e:
+                failed = f"genre list: {e}"
+        # 3) Детали (homepage, imdb_id) — только по запросу
+        details = None
+        if self.fetch_details and first.get("id"):
+            try:
+                details = self._details(first["id"], language)
+            except Exception as e:
+                failed = f"details: {e}"
+        return self._complete_info(self._movie_info(first, title, year, names, details), failed)
+
+    @staticmethod
+    def _complete_info(info: Dict[str, Any], failed: Optional[str]) -> Dict[str, Any]:
+        """Запись для хранилища; если жанры или детали не получены — TransientLookupError с неполной записью."""
+        if failed is not None:
+            raise TransientLookupError(f"TMDB {failed}", partial=info)
+        return info
+
+    def _movie_info(
+        self,
+        first: Dict[str, Any],
+        title: str,
+        year: Optional[int],
+        genre_names: Dict[int, str],
+        details: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """Результат `get_movie_info` из первого результата поиска, списка жанров и (необязательно) деталей."""
+        poster_url = None
+        if isinstance(first.get("poster_path"), str) and first["poster_path"].startswith("/"):
+            poster_url = f"{self.image_base}{first['poster_path']}"
+        # Предварительные поля
+        name = first.get("title") or first.get("original_title") or title
+        release_date = first.get("release_date") or ""
+        try:
+            tmdb_year = int(release_date.split("-")[0]) if release_date else None
+        except Exception:
+            tmdb_year = None
+        rating_tmdb = first.get("vote_average")
+        genres_list = None
+        genre_ids = first.get("genre_ids")
+        if isinstance(genre_ids, list) and genre_names:
+            genres_list = [genre_names[g] for g in genre_ids if g in genre_names]
+        homepage = None
+        imdb_id = None
+        if isinstance(details, dict):
+            g = details.get("genres") or []
+            if isinstance(g, list):
+                genres_list = [str(x.get("name")) for x in g if isinstance(x, dict) and x.get("name")]
+            homepage = details.get("homepage")
+            imdb_id = (details.get("external_ids") or {}).get("imdb_id") or details.get("imdb_id")
+        return {
+            "source": "tmdb",
+            "name": name,
+            "year": tmdb_year or year,
+            "rating_kp": None,
+            "rating_imdb": float(rating_tmdb) if isinstance(rating_tmdb, (int, float)) else None,
+            "genres": genres_list,
+            "poster_url": poster_url,
+            "url": homepage,
+            **({"imdb_id": imdb_id} if imdb_id else {}),
+        }
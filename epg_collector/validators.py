@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .serialization import read_json, write_json
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VALIDATORS_PATH = Path("cache/epg_validators.json")
+
+
+def params_fingerprint(params: Dict[str, Any]) -> str:
+    """Стабильный отпечаток параметров запроса.
+
+    Валидаторы, полученные для другого окна/grouping, к текущему запросу не применяются.
+    """
+    return "&".join(f"{k}={params[k]}" for k in sorted(params))
+
+
+def conditional_headers(validator: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Заголовки условного запроса из сохранённых ETag/Last-Modified."""
+    headers: Dict[str, str] = {}
+    if not validator:
+        return headers
+    if validator.get("etag"):
+        headers["If-None-Match"] = str(validator["etag"])
+    if validator.get("last_modified"):
+        headers["If-Modified-Since"] = str(validator["last_modified"])
+    return headers
+
+
+class ValidatorStore:
+    """Хранилище валидаторов HTTP-ответов EPG, ключ — id канала.
+
+    Хранится одним JSON-файлом; доступ потокобезопасен, запись атомарна
+    (`serialization.write_json`).
+    """
+
+    def __init__(self, path: Path = DEFAULT_VALIDATORS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            data = read_json(self.path)
+            if isinstance(data, dict):
+                self._data = {str(k): v for k, v in data.items() if isinstance(v, dict)}
+        except Exception as e:
+            logger.warning("Не удалось прочитать %s, начинаю с пустого хранилища: %s", self.path, e)
+            self._data = {}
+
+    def get(self, channel_id: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            v = self._data.get(str(channel_id))
+            return dict(v) if v else None
+
+    def set(self, channel_id: Any, validator: Dict[str, Any]) -> None:
+        with self._lock:
+            self._data[str(channel_id)] = dict(validator)
+
+    def discard(self, channel_id: Any) -> None:
+        with self._lock:
+            self._data.pop(str(channel_id), None)
+
+    def save(self) -> None:
+        with self._lock:
+            snapshot = dict(self._data)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_json(self.path, snapshot, pretty=False)
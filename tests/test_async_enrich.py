@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+from dataclasses import replace
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from epg_collector import cli
+from epg_collector.async_enrich import AsyncEnricher
+from epg_collector.config import load_config
+from epg_collector.metadata_store import MetadataStore
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\0" * 5000
+
+
+class Upstreams:
+    """Фейковые TMDB, КиноПоиск и CDN постеров для httpx.MockTransport."""
+
+    def __init__(self):
+        self.inflight = {"tmdb": 0, "kinopoisk": 0}
+        self.peak = {"tmdb": 0, "kinopoisk": 0}
+        self.requests = []
+
+    async def __call__(self, request):
+        url = urlparse(str(request.url))
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.requests.append(f"{url.netloc}{url.path}")
+        if url.netloc in ("image.tmdb.org", "kp.test", "cdn.test"):
+            return httpx.Response(200, content=JPEG, headers={"Content-Type": "image/jpeg"})
+        upstream = "tmdb" if url.netloc == "api.themoviedb.org" else "kinopoisk"
+        self.inflight[upstream] += 1
+        self.peak[upstream] = max(self.peak[upstream], self.inflight[upstream])
+        try:
+            await asyncio.sleep(0.01)
+            return self._respond(url.path, q)
+        finally:
+            self.inflight[upstream] -= 1
+
+    def _respond(self, path, q):
+        if path.endswith("/search/movie"):
+            if q["query"] == "Экипаж":
+                return httpx.Response(200, json={"results": [
+                    {"id": 7, "title": "Экипаж", "release_date": "1979-01-01", "poster_path": "/p.jpg", "genre_ids": [18]}
+                ]})
+            return httpx.Response(200, json={"results": []})
+        if path.endswith("/genre/movie/list"):
+            return httpx.Response(200, json={"genres": [{"id": 18, "name": "драма"}]})
+        if path.endswith("/movie/search"):
+            if q["query"] == "Брат":
+                return httpx.Response(200, json={"docs": [
+                    {"id": 41519, "name": "Брат", "year": 1997, "poster": {"url": "https://kp.test/brat.jpg"}}
+                ]})
+            return httpx.Response(200, json={"docs": []})
+        # Веб-поиск КиноПоиска: ссылки на фильм нет — определённое «не найдено»
+        return httpx.Response(200, text="<html><body>Ничего не найдено</body></html>")
+
+
+def _cfg(**kw):
+    return replace(
+        load_config(), tmdb_api_key="k", kinopoisk_api_key="kp", tmdb_details=False,
+        rate_limits={}, rate_limit_default=0.0, **kw,
+    )
+
+
+def test_async_engine_keeps_order_sources_and_upstream_limits(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cfg = _cfg(async_tmdb_concurrency=2, async_kinopoisk_concurrency=1)
+    upstreams = Upstreams()
+    items = [
+        {"id": 1, "title": "Экипаж"},
+        {"id": 2, "title": "Брат"},
+        {"id": 3, "title": "Неизвестный", "preview": "https://cdn.test/3.jpg"},
+        *({"id": 10 + i, "title": f"Фильм {i}"} for i in range(6)),
+    ]
+
+    async def main():
+        enricher = AsyncEnricher(
+            cfg, tmp_path / "posters", store=MetadataStore(tmp_path / "meta.sqlite"),
+            transport=httpx.MockTransport(upstreams),
+        )
+        done = []
+        results = await enricher.run(items, on_done=lambda: done.append(1))
+        return results, len(done), enricher.tmdb.memo.stats()
+
+    results, done, memo = asyncio.run(main())
+    assert done == len(items)
+    assert [r["poster_source"] for r in results[:3]] == ["tmdb", "kinopoisk", "preview"]
+    assert results[0]["kinopoisk"]["genres"] == ["драма"] and results[1]["kinopoisk"]["name"] == "Брат"
+    assert results[0]["poster_local"].endswith("1-item-1979-tmdb.jpg")
+    assert all(r["kinopoisk"] is None and r["poster_local"] is None for r in results[3:])
+    assert upstreams.peak["tmdb"] <= 2 and upstreams.peak["kinopoisk"] == 1
+    # Поиск постера для «Экипажа» обслужен из мемо
+    assert memo["saved"] >= 1
+    assert upstreams.requests.count("api.themoviedb.org/3/genre/movie/list") == 1
+
+
+def test_enrich_async_engine_preserves_reuse_and_order(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    poster = tmp_path / "old.jpg"
+    poster.write_bytes(JPEG)
+    movies = [
+        {"id": 1, "title": "Экипаж"},
+        {"id": 2, "title": "Брат"},
+        {"id": 3, "title": ""},
+        {"id": 4, "title": "БРАТ"},
+        {"id": 5, "title": "Сталкер"},
+    ]
+    movies_path, enriched_path = tmp_path / "movies.json", tmp_path / "enriched.json"
+    movies_path.write_text(json.dumps(movies), encoding="utf-8")
+    enriched_path.write_text(json.dumps([
+        {"id": 5, "title": "Сталкер", "kinopoisk": {"name": "old"}, "poster_local": str(poster), "poster_source": "tmdb"}
+    ]), encoding="utf-8")
+    works = []
+
+    def fake_engine(cfg, items, posters_dir, on_done=None, transport=None):
+        works.extend(it["id"] for it in items)
+        for _ in items:
+            on_done()
+        from epg_collector.async_enrich import AsyncLookupMemo
+
+        return [{"kinopoisk": {"name": it["title"]}, "poster_local": None, "poster_source": None} for it in items], AsyncLookupMemo()
+
+    monkeypatch.setattr(cli, "MOVIES_PATH", movies_path)
+    monkeypatch.setattr(cli, "ENRICHED_PATH", enriched_path)
+    monkeypatch.setattr(cli, "run_async_enrichment", fake_engine)
+    cli._enrich(async_engine=True)
+
+    out = json.loads(enriched_path.read_text(encoding="utf-8"))
+    assert works == [1, 2]
+    assert [it["id"] for it in out] == [1, 2, 3, 4, 5]
+    assert [(it["kinopoisk"] or {}).get("name") for it in out] == ["Экипаж", "Брат", None, "Брат", "old"]
+
+
+def test_async_engine_keeps_blocking_calls_off_the_event_loop(tmp_path: Path, monkeypatch):
+    import threading
+
+    monkeypatch.chdir(tmp_path)
+    loop_threads = set()
+
+    class RecordingStore(MetadataStore):
+        def get(self, *args, **kwargs):
+            loop_threads.add(threading.get_ident())
+            return super().get(*args, **kwargs)
+
+        def put(self, *args, **kwargs):
+            loop_threads.add(threading.get_ident())
+            return super().put(*args, **kwargs)
+
+    async def main():
+        enricher = AsyncEnricher(
+            _cfg(), tmp_path / "posters", store=RecordingStore(tmp_path / "meta.sqlite"),
+            transport=httpx.MockTransport(Upstreams()),
+        )
+        results = await enricher.run([{"id": 1, "title": "Экипаж"}, {"id": 2, "title": "Нигде"}])
+        return results, threading.get_ident()
+
+    results, loop_thread = asyncio.run(main())
+    assert results[0]["poster_source"] == "tmdb"
+    assert loop_threads and loop_thread not in loop_threads
+
+
+def test_async_http_pauses_host_on_503_retry_after(monkeypatch):
+    from epg_collector.async_enrich import AsyncHTTP
+    from epg_collector.rate_limit import HostRateLimiter
+
+    limiter = HostRateLimiter()
+    monkeypatch.setattr("epg_collector.async_enrich.get_rate_limiter", lambda: limiter)
+    statuses = [503, 503, 200]
+
+    def handler(request):
+        status = statuses.pop(0)
+        headers = {"Retry-After": "0"} if status == 503 else {}
+        return httpx.Response(status, headers=headers, json={})
+
+    async def main():
+        http = AsyncHTTP(_cfg(http_retries=3, http_backoff=0), transport=httpx.MockTransport(handler))
+        try:
+            return await http.get("https://api.themoviedb.org/3/search/movie")
+        finally:
+            await http.aclose()
+
+    assert asyncio.run(main()).status_code == 200
+    # Retry-After на 503 проходит через общий ограничитель, как у 429
+    assert limiter.stats["api.themoviedb.org"]["throttled"] == 2
+    assert limiter.stats["api.themoviedb.org"]["requests"] == 3
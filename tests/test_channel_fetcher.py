@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import json
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import requests
+
+from epg_collector.channel_fetcher import fetch_channels
+from epg_collector.config import Config
+from epg_collector.fetch_journal import FetchJournal
+from epg_collector.validators import ValidatorStore
+
+
+def make_config() -> Config:
+    return Config(
+        iptv_base_url="https://iptv.test/api/v4/epg",
+        iptv_params={"id": "126", "epg_from": "-7", "epg_limit": "14", "grouping": "1"},
+        iptv_headers={},
+        playlist_base_url="https://iptv.test/api/v4/playlist",
+        playlist_params={},
+        playlist_headers={},
+        playlist_form={},
+    )
+
+
+class FakeResponse:
+    def __init__(self, payload: Any, status_code: int = 200, headers: Dict[str, str] | None = None):
+        self.status_code = status_code
+        self.content = json.dumps(payload).encode("utf-8")
+        self.headers = headers or {"Content-Type": "application/json; charset=utf-8"}
+        self.encoding = "utf-8"
+        self.url = "https://iptv.test/api/v4/epg"
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size: int = 1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self) -> None:
+        pass
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+
+class FakeSession:
+    """Отдаёт по одному программному элементу на канал; канал "bad" отвечает 500."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get(self, url: str, params: Dict[str, Any] | None = None, **kwargs: Any) -> FakeResponse:
+        with self._lock:
+            self.calls += 1
+        cid = (params or {}).get("id")
+        if cid == "bad":
+            return FakeResponse({}, status_code=500)
+        return FakeResponse({"epg": [{"id": int(cid), "title": f"Канал {cid}", "timestart": 1, "timestop": 2}]})
+
+
+def test_fetch_channels_writes_each_channel_and_reports_throughput(tmp_path: Path):
+    session = FakeSession()
+    ids = [str(i) for i in range(1, 11)]
+    summary = fetch_channels(make_config(), session, ids, tmp_path, workers=4)
+
+    assert session.calls == 10
+    assert summary.saved == 10
+    assert not summary.failed
+    assert summary.throughput > 0
+    for cid in ids:
+        obj = json.loads((tmp_path / f"{cid}.json").read_text(encoding="utf-8"))
+        assert obj["our_id"] == cid
+        assert obj["epg"][0]["title"] == f"Канал {cid}"
+
+
+def test_fetch_channels_isolates_failed_channel(tmp_path: Path):
+    summary = fetch_channels(make_config(), FakeSession(), ["1", "bad", "2"], tmp_path, workers=2)
+
+    assert summary.saved == 2
+    assert [r.channel_id for r in summary.failed] == ["bad"]
+    assert not (tmp_path / "bad.json").exists()
+
+
+class FlakySession(FakeSession):
+    """Канал "flaky" отвечает 500 на первый запрос и успешно — на повторный."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.flaky_calls = 0
+
+    def get(self, url: str, params: Dict[str, Any] | None = None, **kwargs: Any) -> FakeResponse:
+        if (params or {}).get("id") == "flaky":
+            with self._lock:
+                self.calls += 1
+                self.flaky_calls += 1
+                first = self.flaky_calls == 1
+            if first:
+                return FakeResponse({}, status_code=500)
+            return FakeResponse({"epg": [{"id": 7, "title": "ok"}]})
+        return super().get(url, params=params, **kwargs)
+
+
+def test_failed_channels_are_retried_at_end_and_journaled(tmp_path: Path):
+    journal = FetchJournal(tmp_path / "journal.jsonl")
+    out = tmp_path / "out"
+    summary = fetch_channels(
+        make_config(), FlakySession(), ["1", "flaky", "bad"], out,
+        workers=2, journal=journal, retry_rounds=2, retry_backoff=0.01,
+    )
+
+    assert summary.saved == 2
+    assert [r.channel_id for r in summary.failed] == ["bad"]
+    # Раунд 1: flaky + bad, раунд 2: только bad
+    assert summary.retried == 3
+    reloaded = FetchJournal(tmp_path / "journal.jsonl")
+    assert reloaded.get("flaky")["status"] == "ok" and reloaded.get("flaky")["attempt"] == 2
+    assert reloaded.get("bad")["status"] == "failed" and reloaded.get("bad")["attempt"] == 3
+
+
+def test_resume_skips_recently_completed_channels(tmp_path: Path):
+    journal_path = tmp_path / "journal.jsonl"
+    out = tmp_path / "out"
+    fetch_channels(make_config(), FakeSession(), ["1", "bad"], out, journal=FetchJournal(journal_path))
+    # Недописанная строка после аварийного завершения не ломает журнал
+    with journal_path.open("ab") as f:
+        f.write(b'{"channel_id": "2", "sta')
+
+    session = FakeSession()
+    summary = fetch_channels(
+        make_config(), session, ["1", "2", "bad"], out, journal=FetchJournal(journal_path), resume=True
+    )
+    assert summary.skipped == 1
+    assert session.calls == 2
+    assert sorted(r.channel_id for r in summary.results) == ["2", "bad"]
+
+
+class ETagSession(FakeSession):
+    """Отвечает 304 на If-None-Match с текущим ETag."""
+
+    def get(self, url: str, params: Dict[str, Any] | None = None, headers: Dict[str, str] | None = None, **kwargs: Any) -> FakeResponse:
+        with self._lock:
+            self.calls += 1
+        if (headers or {}).get("If-None-Match") == '"v1"':
+            return FakeResponse({}, status_code=304)
+        cid = (params or {}).get("id")
+        return FakeResponse({"epg": [{"id": int(cid), "title": "x"}]}, headers={"ETag": '"v1"'})
+
+
+def test_conditional_fetch_keeps_unchanged_channel_file(tmp_path: Path):
+    store = ValidatorStore(tmp_path / "validators.json")
+    out_dir = tmp_path / "epg"
+    first = fetch_channels(make_config(), ETagSession(), ["1"], out_dir, store=store)
+    assert first.unchanged == 0
+    mtime = (out_dir / "1.json").stat().st_mtime_ns
+
+    reloaded = ValidatorStore(tmp_path / "validators.json")
+    second = fetch_channels(make_config(), ETagSession(), ["1"], out_dir, store=reloaded)
+    assert second.unchanged == 1
+    assert (out_dir / "1.json").stat().st_mtime_ns == mtime
+
+
+def test_conditional_fetch_detects_identical_body_by_hash(tmp_path: Path):
+    store = ValidatorStore(tmp_path / "validators.json")
+    fetch_channels(make_config(), FakeSession(), ["7"], tmp_path, store=store)
+    again = fetch_channels(make_config(), FakeSession(), ["7"], tmp_path, store=store)
+    assert again.unchanged == 1
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from epg_collector.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from epg_collector.config import load_config
+from epg_collector.kinopoisk import KinoPoiskClient
+
+ROBOT_HTML = "<html><body><p>Подтвердите, что запросы отправляли вы, а не робот</p></body></html>"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_opens_after_threshold_and_half_opens_with_single_probe():
+    clock = FakeClock()
+    changes = []
+    br = CircuitBreaker("t", failure_threshold=3, cooldown=60, clock=clock,
+                        on_change=lambda name, old, new, snap: changes.append((old, new)))
+    for _ in range(3):
+        assert br.allow()
+        br.record_failure()
+    assert br.state == OPEN
+    assert not br.allow()
+
+    clock.now = 61
+    assert br.state == HALF_OPEN
+    assert br.allow()
+    assert not br.allow()  # второй вызов ждёт результата пробы
+    br.record_failure()
+    assert br.state == OPEN
+
+    clock.now = 122
+    assert br.allow()
+    br.record_success()
+    assert br.state == CLOSED
+    assert changes == [(CLOSED, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, CLOSED)]
+    snap = br.snapshot()
+    assert snap["opened"] == 2 and snap["short_circuited"] == 2
+
+
+def test_success_resets_consecutive_failures():
+    br = CircuitBreaker("t", failure_threshold=2, cooldown=60)
+    br.record_failure()
+    br.record_success()
+    br.record_failure()
+    assert br.state == CLOSED
+
+
+class RobotSession:
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+
+        class Resp:
+            encoding = "utf-8"
+            text = ROBOT_HTML
+
+            def raise_for_status(self):
+                pass
+
+        return Resp()
+
+
+def test_kinopoisk_scrape_stops_hitting_site_when_blocked(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    session = RobotSession()
+    breaker = CircuitBreaker("kinopoisk_web", failure_threshold=3, cooldown=300)
+    kp = KinoPoiskClient(load_config(), session, web_breaker=breaker)
+    for i in range(10):
+        assert kp._scrape_web(f"Фильм {i}") is None
+    # Капча распознаётся на странице поиска: один запрос на заголовок до открытия
+    assert session.calls == 3
+    snap = kp.record_run_metrics()
+    assert snap["state"] == OPEN and snap["short_circuited"] == 7
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import io
+import sys
+import threading
+import time
+from pathlib import Path
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from epg_collector.concurrency import AIMDLimiter, ConcurrencyController
+from epg_collector.http_client import RateLimitedAdapter
+from epg_collector.rate_limit import HostRateLimiter
+
+
+def _saturated_round(lim: AIMDLimiter, latency: float = 0.01, overloaded: bool = False) -> None:
+    n = int(lim.limit)
+    for _ in range(n):
+        lim.acquire()
+    for _ in range(n):
+        lim.release(latency, overloaded=overloaded)
+
+
+def test_grows_additively_while_healthy():
+    lim = AIMDLimiter(initial=2, max_limit=5)
+    for _ in range(20):
+        _saturated_round(lim)
+    assert int(lim.limit) == 5
+    assert lim.stats["max_seen"] == 5 and lim.stats["decreases"] == 0
+
+
+def test_does_not_grow_when_not_saturated():
+    lim = AIMDLimiter(initial=4, max_limit=16)
+    for _ in range(50):
+        lim.acquire()
+        lim.release(0.01)
+    assert int(lim.limit) == 4
+
+
+def test_halves_on_overload_once_per_wave():
+    lim = AIMDLimiter(initial=8, max_limit=16)
+    _saturated_round(lim)
+    _saturated_round(lim, overloaded=True)
+    # Вся «волна» из 8 ответов 429 снижает предел один раз
+    assert int(lim.limit) == 4
+    assert lim.stats["overloaded"] == 8 and lim.stats["min_seen"] == 4
+
+
+def test_latency_spike_shrinks_limit():
+    lim = AIMDLimiter(initial=8, max_limit=16)
+    for _ in range(5):
+        lim.acquire()
+        lim.release(0.02)
+    for _ in range(10):
+        lim.acquire()
+        lim.release(1.0)
+    assert int(lim.limit) < 8
+
+
+def test_acquire_blocks_at_limit():
+    lim = AIMDLimiter(initial=1, max_limit=1)
+    lim.acquire()
+    entered = threading.Event()
+
+    def worker():
+        lim.acquire()
+        entered.set()
+        lim.release(0.01)
+
+    t = threading.Thread(target=worker)
+    t.start()
+    assert not entered.wait(0.1)
+    lim.release(0.01)
+    assert entered.wait(1.0)
+    t.join()
+
+
+def test_adapter_reports_status_to_controller(monkeypatch):
+    # 503 повторяется адаптером: контроллер видит и сбойную, и повторную попытку
+    statuses = [503, 200, 200, 200]
+
+    def fake_send(self, request, **kwargs):
+        resp = requests.Response()
+        resp.status_code = statuses.pop(0)
+        resp.url = request.url
+        resp.raw = io.BytesIO(b"")
+        time.sleep(0.001)
+        return resp
+
+    monkeypatch.setattr(HTTPAdapter, "send", fake_send)
+    controller = ConcurrencyController(initial=4, max_limit=8)
+    session = requests.Session()
+    session.mount("https://", RateLimitedAdapter(HostRateLimiter(), backoff=0, concurrency=controller))
+    for _ in range(3):
+        assert session.get("https://image.tmdb.org/t/p/w500/x.jpg").status_code == 200
+    st = controller.summary()["image.tmdb.org"]
+    assert st["requests"] == 4 and st["overloaded"] == 1
+    assert st["limit"] == 2
+    assert controller.limiter("https://image.tmdb.org/").inflight == 0
+
+
+def test_streamed_response_holds_slot_until_closed(monkeypatch):
+    def fake_send(self, request, **kwargs):
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.url = request.url
+        resp.raw = io.BytesIO(b"x" * 10)
+        return resp
+
+    monkeypatch.setattr(HTTPAdapter, "send", fake_send)
+    controller = ConcurrencyController(initial=4, max_limit=8)
+    session = requests.Session()
+    session.mount("https://", RateLimitedAdapter(HostRateLimiter(), concurrency=controller))
+    lim = controller.limiter("https://image.tmdb.org/")
+
+    resp = session.get("https://image.tmdb.org/p.jpg", stream=True)
+    assert lim.inflight == 1
+    resp.close()
+    resp.close()
+    assert lim.inflight == 0
+
+    assert session.get("https://image.tmdb.org/p.jpg").content == b"x" * 10
+    assert lim.inflight == 0
+
+
+def test_every_server_hit_passes_through_aimd_slot():
+    from dataclasses import replace
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    from epg_collector.config import load_config
+    from epg_collector.http_client import create_session
+    from epg_collector.concurrency import get_concurrency_controller
+
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            hits.append(self.path)
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = f"127.0.0.1:{server.server_address[1]}"
+    cfg = replace(
+        load_config(), cache_enabled=False, http_retries=2, http_backoff=0,
+        adaptive_concurrency=True, rate_limits={}, rate_limit_default=0.0,
+    )
+    try:
+        resp = create_session(cfg).get(f"http://{host}/x")
+    finally:
+        server.shutdown()
+    assert resp.status_code == 503
+    st = get_concurrency_controller().summary()[host]
+    # Каждое обращение к серверу учтено контроллером как перегрузка
+    assert len(hits) == 3
+    assert st["requests"] == 3 and st["overloaded"] == 3
+    assert get_concurrency_controller().limiter(f"http://{host}/").inflight == 0
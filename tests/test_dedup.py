@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import json
+import sys
+from dataclasses import replace
+from pathlib import Path
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from epg_collector import cli
+from epg_collector.config import load_config
+from epg_collector.dedup import group_by_work, normalize_title, work_key
+
+TS_2025 = 1755550800
+
+
+def test_normalize_title_and_work_key():
+    assert normalize_title("Х/ф «Ёлки-2»!") == normalize_title("х/ф ЁЛКИ 2") == "х ф елки 2"
+    assert work_key("  ", 2025) is None and work_key(None) is None
+    assert work_key("Экипаж.", 2025) == ("экипаж", 2025)
+
+
+def test_group_by_work_keeps_first_seen_order_and_counts():
+    entries = [("1", "Экипаж"), ("2", "ЭКИПАЖ"), ("1", ""), ("3", "Брат"), ("2", "экипаж.")]
+    groups, stats = group_by_work(entries, key=lambda e: work_key(e[1]))
+    assert [[c for c, _ in g] for g in groups.values()] == [["1", "2", "2"], ["3"]]
+    assert (stats.airings, stats.works, stats.saved) == (4, 2, 2)
+    assert stats.ratio == 2.0
+
+
+def test_build_channel_json_enriches_each_work_once(tmp_path: Path, monkeypatch):
+    calls = []
+
+    class FakeTMDB:
+        def __init__(self, cfg, session, **kwargs):
+            pass
+
+        def get_movie_info(self, title, year=None):
+            calls.append((title, year))
+            return {"title": title, "year": 1979, "poster_url": f"https://img.test/{len(calls)}.jpg"}
+
+    posters = []
+
+    def fake_download(session, url, posters_dir, **kw):
+        posters.append(url)
+        return f"data/posters/{posters_dir.name}/{kw['epg_id']}.jpg"
+
+    monkeypatch.setattr(cli, "TMDBClient", FakeTMDB)
+    monkeypatch.setattr(cli, "download_poster", fake_download)
+    src = tmp_path / "src"
+    src.mkdir()
+    airings = {
+        "1": [{"id": 11, "title": "Экипаж", "timestart": TS_2025}, {"id": 12, "title": "Брат", "timestart": TS_2025}],
+        "2": [{"id": 21, "title": "ЭКИПАЖ.", "timestart": TS_2025 + 86400}, {"id": 22, "title": " "}],
+    }
+    for our_id, items in airings.items():
+        (src / f"{our_id}.movies.json").write_text(json.dumps({"our_id": our_id, "epg": items}), encoding="utf-8")
+
+    cfg = replace(load_config(), cache_enabled=False)
+    out = tmp_path / "out"
+    out.mkdir()
+    cli._build_channel_json(cfg, sorted(src.glob("*.json")), ".movies", tmp_path / "posters", out, None, 2, "test")
+
+    assert sorted(calls) == [("Брат", 2025), ("Экипаж", 2025)]
+    assert len(posters) == 2
+    ch1 = json.loads((out / "1.json").read_text(encoding="utf-8"))
+    ch2 = json.loads((out / "2.json").read_text(encoding="utf-8"))
+    assert ch2["count"] == 1
+    crew = ch2["items"][0]
+    assert crew["id"] == 21 and crew["title"] == "ЭКИПАЖ." and crew["our_id"] == "2"
+    assert crew["poster_local"] == ch1["items"][0]["poster_local"] == "data/posters/1/11.jpg"
+    assert crew["kinopoisk"] == ch1["items"][0]["kinopoisk"]
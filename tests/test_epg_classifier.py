@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from epg_collector.epg_classifier import BucketSpec, classify_channels
+from epg_collector.filter_manifest import FilterManifest
+from epg_collector.filters import (
+    KeywordMatcher,
+    classify_by_category,
+    filter_movies_by_category,
+    filter_movies_epg,
+    parse_buckets,
+)
+from epg_collector.serialization import JsonStreamWriter, write_json
+
+
+def test_parse_buckets():
+    assert parse_buckets("movies=Х/ф; docs=Д/ф|Док. фильм;bad;empty=") == {
+        "movies": ["Х/ф"],
+        "docs": ["Д/ф", "Док. фильм"],
+    }
+
+
+def test_classify_single_pass_matches_legacy_filter():
+    items = [
+        {"id": 1, "category": "Х/ф"},
+        {"id": 2, "category": ["Новости", "м/ф"]},
+        {"id": 3, "category": ["Х/ф", "М/ф"]},
+        {"id": 4, "category": None},
+        {"id": 5, "category": " х/ф "},
+    ]
+    res = classify_by_category(items, {"movies": ["Х/ф"], "cartoons": ["М/ф"], "docs": ["Д/ф"]})
+    assert [i["id"] for i in res["movies"]] == [i["id"] for i in filter_movies_by_category(items)] == [1, 3, 5]
+    assert [i["id"] for i in res["cartoons"]] == [2, 3]
+    assert res["docs"] == []
+
+
+def test_classify_channels_writes_all_buckets(tmp_path: Path):
+    src = tmp_path / "epg_channels"
+    src.mkdir()
+    day_grouped = {"our_id": "10", "epg": [{"date": "01.01.2025", "data": [
+        {"id": 1, "title": "Фильм", "category": "Х/ф"},
+        {"id": 2, "title": "Мульт", "category": "М/ф"},
+    ]}]}
+    (src / "10.json").write_text(json.dumps(day_grouped, ensure_ascii=False), encoding="utf-8")
+    (src / "11.json").write_text(json.dumps({"our_id": "11", "epg": [{"id": 3, "category": "Новости"}]}), encoding="utf-8")
+    (src / "broken.json").write_text("{", encoding="utf-8")
+
+    specs = [
+        BucketSpec("movies", ("Х/ф",), tmp_path / "movies", tmp_path / "epg_movies.json"),
+        BucketSpec("cartoons", ("М/ф",), tmp_path / "cartoons", tmp_path / "epg_cartoons.json"),
+    ]
+    stale = specs[0].out_path("11")
+    stale.parent.mkdir(parents=True)
+    stale.write_text("{}", encoding="utf-8")
+
+    summary = classify_channels(sorted(src.glob("*.json")), specs)
+
+    assert summary.processed == 3 and len(summary.errors) == 1
+    assert summary.buckets["movies"].saved == 1 and summary.buckets["cartoons"].saved == 1
+    movies = json.loads((tmp_path / "movies" / "10.movies.json").read_text(encoding="utf-8"))
+    assert [m["id"] for m in movies["epg"]] == [1]
+    aggregate = json.loads((tmp_path / "epg_cartoons.json").read_text(encoding="utf-8"))
+    assert aggregate == [{"id": 2, "title": "Мульт", "category": "М/ф", "our_id": "10"}]
+    assert not stale.exists()
+
+
+def test_process_pool_output_matches_sequential(tmp_path: Path):
+    src = tmp_path / "epg_channels"
+    src.mkdir()
+    for cid in range(12):
+        items = [{"id": cid * 100 + i, "category": "Х/ф" if i % 2 else "М/ф"} for i in range(5)]
+        (src / f"{cid}.json").write_text(json.dumps({"our_id": str(cid), "epg": items}), encoding="utf-8")
+    files = sorted(src.glob("*.json"))
+
+    outputs = []
+    for jobs in (1, 3):
+        out = tmp_path / f"jobs{jobs}"
+        specs = [BucketSpec("movies", ("Х/ф",), out / "movies", out / "epg_movies.json")]
+        summary = classify_channels(files, specs, jobs=jobs)
+        assert summary.processed == 12 and summary.buckets["movies"].saved == 12
+        outputs.append((out / "epg_movies.json").read_bytes())
+    assert outputs[0] == outputs[1]
+
+
+def test_keyword_matcher_is_case_insensitive():
+    matcher = KeywordMatcher(["Х/ф", "feature film", " "])
+    assert matcher.keywords == ("feature film", "х/ф")
+    assert matcher.matches("Премьера. Х/Ф «Кин-дза-дза!»")
+    assert matcher.matches("A FEATURE FILM")
+    assert not matcher.matches("Новости")
+    assert not KeywordMatcher([]) and not KeywordMatcher([]).matches("х/ф")
+
+
+def test_filter_movies_epg_keywords_and_duration():
+    items = [
+        {"id": 1, "category": ["Новости", "Х/ф"]},
+        {"id": 2, "title": "Художественный фильм «Экипаж»"},
+        {"id": 3, "desc": "Смотрите новое кино"},
+        {"id": 4, "title": "Шерлок. 2 сезон", "timestart": 1, "timestop": 1 + 2 * 3600},
+        {"id": 5, "title": "Долгая программа", "timestart": 1, "timestop": 1 + 2 * 3600},
+        {"id": 6, "title": "Короткая", "timestart": 1, "timestop": 600, "genre": 7},
+        "not-a-dict",
+    ]
+    assert [i["id"] for i in filter_movies_epg(items)] == [1, 2, 3]
+    assert [i["id"] for i in filter_movies_epg(items, min_duration_minutes=60)] == [1, 2, 3, 5]
+    assert filter_movies_epg(items, keywords=["", "  "]) == []
+
+
+def test_stream_writer_matches_write_json_and_keeps_old_file_on_error(tmp_path: Path):
+    objs = [{"id": 1, "title": "Фильм", "category": ["Х/ф"]}, 2, {}]
+    for pretty in (False, True):
+        write_json(tmp_path / "a.json", objs, pretty=pretty)
+        with JsonStreamWriter(tmp_path / "b.json", pretty=pretty) as w:
+            w.extend(iter(objs))
+        assert (tmp_path / "a.json").read_bytes() == (tmp_path / "b.json").read_bytes()
+
+    try:
+        with JsonStreamWriter(tmp_path / "b.json") as w:
+            w.write({"id": 3})
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert json.loads((tmp_path / "b.json").read_text(encoding="utf-8")) == objs
+    assert not (tmp_path / "b.json.tmp").exists()
+
+
+def test_classify_channels_jsonl_aggregate(tmp_path: Path):
+    src = tmp_path / "epg_channels"
+    src.mkdir()
+    for cid in ("1", "2"):
+        (src / f"{cid}.json").write_text(
+            json.dumps({"our_id": cid, "epg": [{"id": int(cid), "category": "Х/ф"}]}), encoding="utf-8"
+        )
+    agg = tmp_path / "epg_movies.jsonl"
+    summary = classify_channels(
+        sorted(src.glob("*.json")), [BucketSpec("movies", ("Х/ф",), tmp_path / "movies", agg)], lines=True
+    )
+    assert summary.buckets["movies"].aggregated == 2
+    rows = [json.loads(line) for line in agg.read_text(encoding="utf-8").splitlines()]
+    assert rows == [{"id": 1, "category": "Х/ф", "our_id": "1"}, {"id": 2, "category": "Х/ф", "our_id": "2"}]
+
+
+def test_manifest_skips_unchanged_channels_and_patches_aggregate(tmp_path: Path):
+    src = tmp_path / "epg_channels"
+    src.mkdir()
+    for cid in range(4):
+        items = [{"id": cid, "category": "Х/ф"}, {"id": cid + 100, "category": "Новости"}]
+        (src / f"{cid}.json").write_text(json.dumps({"our_id": str(cid), "epg": items}), encoding="utf-8")
+    files = sorted(src.glob("*.json"))
+    specs = [BucketSpec("movies", ("Х/ф",), tmp_path / "movies", tmp_path / "epg_movies.json")]
+    manifest_path = tmp_path / "manifest.json"
+
+    first = classify_channels(files, specs, manifest=FilterManifest(manifest_path))
+    assert first.skipped == 0 and first.buckets["movies"].aggregated == 4
+    full = (tmp_path / "epg_movies.json").read_bytes()
+
+    second = classify_channels(files, specs, manifest=FilterManifest(manifest_path))
+    assert second.skipped == 4
+    assert (tmp_path / "epg_movies.json").read_bytes() == full
+
+    (src / "2.json").write_text(json.dumps({"our_id": "2", "epg": [{"id": 7, "category": "Новости"}]}), encoding="utf-8")
+    specs[0].out_path("0").unlink()
+    third = classify_channels(files, specs, manifest=FilterManifest(manifest_path))
+    assert third.skipped == 2
+    agg = json.loads((tmp_path / "epg_movies.json").read_text(encoding="utf-8"))
+    assert [(m["our_id"], m["id"]) for m in agg] == [("0", 0), ("1", 1), ("3", 3)]
+
+    other = [BucketSpec("movies", ("Х/ф", "Д/ф"), tmp_path / "movies", tmp_path / "epg_movies.json")]
+    assert classify_channels(files, other, manifest=FilterManifest(manifest_path)).skipped == 0
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from epg_collector.epg_merge import held_days, incremental_window, merge_day_groups
+
+
+def day(d: str, items, title: str = "", current: bool = False):
+    return {"date": d, "title": title or d[:5], "data": items, "current": current}
+
+
+def test_incremental_window_requests_only_missing_tail():
+    today = date(2025, 8, 26)
+    held = {date(2025, 8, 19) + timedelta(days=i) for i in range(13)}  # -7..+5
+    assert incremental_window(held, today, -7, 14) == (6, 1)
+
+
+def test_incremental_window_refetches_trailing_edge_when_complete():
+    today = date(2025, 8, 26)
+    held = {date(2025, 8, 19) + timedelta(days=i) for i in range(14)}  # -7..+6
+    assert incremental_window(held, today, -7, 14, overlap=2) == (5, 2)
+
+
+def test_merge_day_groups_replaces_fresh_days_and_retention():
+    existing = [
+        day("18.08.2025", [{"id": 1, "timestart": 10}]),
+        day("26.08.2025", [{"id": 2, "timestart": 20, "title": "old"}, {"id": 3, "timestart": 30}], title="Сегодня", current=True),
+    ]
+    fresh = [
+        day("26.08.2025", [{"id": 2, "timestart": 20, "title": "new"}, {"id": 4, "timestart": 25}], title="Вчера"),
+        day("27.08.2025", [{"id": 5, "timestart": 40}], title="Сегодня", current=True),
+    ]
+    merged = merge_day_groups(existing, fresh, keep_from=date(2025, 8, 19))
+
+    assert [g["date"] for g in merged] == ["26.08.2025", "27.08.2025"]
+    # День из ответа авторитетен: передача 3 исчезла из сетки
+    assert [it["id"] for it in merged[0]["data"]] == [2, 4]
+    assert merged[0]["data"][0]["title"] == "new"
+    assert merged[0]["title"] == "Вчера"
+    assert merged[1]["current"] is True
+    assert held_days(merged) == {date(2025, 8, 26), date(2025, 8, 27)}
+
+
+def test_merge_relabels_days_missing_from_fresh_response():
+    existing = [day("25.08.2025", [{"id": 1, "timestart": 1}], title="Сегодня", current=True)]
+    merged = merge_day_groups(existing, [], keep_from=date(2025, 8, 19))
+    assert merged[0]["title"] == "25.08 ПН"
+    assert merged[0]["current"] is False
+
+
+def test_merge_drops_replaced_programme_in_same_slot():
+    existing = [day("26.08.2025", [{"id": 1, "timestart": 10, "title": "Отменена"}])]
+    fresh = [day("26.08.2025", [{"id": 2, "timestart": 10, "title": "Замена"}])]
+    merged = merge_day_groups(existing, fresh, keep_from=date(2025, 8, 19))
+    assert [it["id"] for it in merged[0]["data"]] == [2]
+
+
+def test_merge_is_idempotent_for_items_without_id():
+    fresh = [day("26.08.2025", [
+        {"id": 1, "timestart": 10},
+        {"timestart": 20, "title": "Без id"},
+        {"id": 3, "timestart": 30},
+        {"timestart": 40, "title": "Тоже без id"},
+    ])]
+    once = merge_day_groups([], fresh, keep_from=date(2025, 8, 19))
+    twice = merge_day_groups(once, fresh, keep_from=date(2025, 8, 19))
+    assert len(once[0]["data"]) == len(twice[0]["data"]) == 4
+    assert twice == once
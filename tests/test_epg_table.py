@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+pytest.importorskip("numpy")
+
+from epg_collector.epg_table import EPGTable
+from epg_collector.filters import filter_movies_by_category, filter_movies_epg
+
+ITEMS = [
+    {"id": 1, "title": "Экипаж", "category": ["Х/ф", "Драма"], "timestart": 1000, "timestop": 1000 + 120 * 60},
+    {"id": 2, "title": "Новости", "category": "Новости", "timestart": 8200, "timestop": 9000},
+    {"id": 3, "title": "Шерлок. 2 сезон", "category": [], "timestart": 9000, "timestop": 9000 + 90 * 60},
+    {"id": 4, "title": "Концерт", "timestart": "9000", "timestop": "15000"},
+    {"id": "x", "title": "Без времени", "category": [" х/ф "], "timestart": None},
+]
+
+
+def test_masks_match_dict_filters():
+    table = EPGTable.from_channels([("10", ITEMS[:2]), ("11", ITEMS[2:])])
+    assert len(table) == 5 and table.channels == ["10", "11"]
+    assert table.ids.tolist() == [1, 2, 3, 4, 0]
+    assert table.to_items(table.category_mask(["Х/ф"])) == filter_movies_by_category(ITEMS)
+    assert table.duration_minutes().tolist() == [120, 13, 90, 100, 0]
+    assert table.to_items(table.long_non_series_mask(60)) == filter_movies_epg(
+        ITEMS, keywords=["zzz"], min_duration_minutes=60
+    )
+    window = table.time_window_mask(start=8500, end=9001)
+    assert [i["id"] for i in table.to_items(window)] == [2, 3, 4]
+
+
+def test_to_items_with_our_id_and_files(tmp_path: Path):
+    (tmp_path / "10.json").write_text(
+        json.dumps({"our_id": "10", "epg": [{"date": "01.01.2025", "data": ITEMS[:2]}]}, ensure_ascii=False),
+        encoding="utf-8",
+    )
+    (tmp_path / "broken.json").write_text("{", encoding="utf-8")
+    table = EPGTable.from_files(sorted(tmp_path.glob("*.json")))
+    rows = table.to_items(table.channel_mask(["10"]) & table.duration_mask(max_minutes=60), with_our_id=True)
+    assert rows == [dict(ITEMS[1], our_id="10")]
+    assert "our_id" not in ITEMS[1]
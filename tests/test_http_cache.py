@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import sys
+import threading
+from dataclasses import replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import requests_cache
+
+from epg_collector.config import load_config
+from epg_collector.http_cache import parse_cache_rules, sweep_cache
+from epg_collector.http_client import create_session
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path.startswith("/poster"):
+            body, ctype = b"\x89PNG" + b"0" * 4096, "image/png"
+        else:
+            body, ctype = b'{"results": []}' + b" " * 4096, "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_parse_cache_rules():
+    rules = parse_cache_rules("image.tmdb.org=0, api.themoviedb.org=86400,bad=x,noeq")
+    assert rules == {"image.tmdb.org": requests_cache.DO_NOT_CACHE, "api.themoviedb.org": 86400}
+
+
+def test_cached_session_skips_posters_and_sweeps_to_cap(tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    cfg = replace(load_config(), cache_enabled=True, cache_path=str(tmp_path / "http_cache"), cache_rules={})
+    try:
+        session = create_session(cfg)
+        assert not session.get(f"{base}/search?q=1").from_cache
+        assert session.get(f"{base}/search?q=1").from_cache
+        session.get(f"{base}/poster.png", stream=True).content
+        assert not session.get(f"{base}/poster.png", stream=True).from_cache
+
+        backend = session.cache
+        with backend.responses.connection() as con:
+            assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        for i in range(20):
+            session.get(f"{base}/search?q={i + 2}")
+        assert backend.responses.count() == 21
+
+        res = sweep_cache(backend, max_bytes=1)
+        assert res["evicted"] == 21
+        assert backend.responses.count() == 0
+    finally:
+        server.shutdown()
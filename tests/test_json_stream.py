@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from epg_collector.json_stream import ResponseDecoder, detect_encoding, iter_json_items
+
+
+def chunked(text: str, size: int):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class BytesResponse:
+    def __init__(self, body: bytes, url: str = "https://iptv.test/api/v4/epg"):
+        self.content = body
+        self.url = url
+        self.closed = False
+
+    def iter_content(self, chunk_size: int = 1):
+        for i in range(0, len(self.content), 7):
+            yield self.content[i:i + 7]
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def test_iter_json_items_streams_epg_array_with_tiny_chunks():
+    payload = {"status": 1, "epg": [{"id": 1, "title": "Фильм"}, {"id": 2, "timestart": 1234567890}], "tail": [1]}
+    items = list(iter_json_items(chunked(json.dumps(payload, ensure_ascii=False), 3)))
+    assert items == payload["epg"]
+
+
+def test_iter_json_items_root_list_and_fallbacks():
+    assert list(iter_json_items(chunked("[1, 22, 333]", 1))) == [1, 22, 333]
+    single = {"title": "x", "timestart": 1, "timestop": 2}
+    assert list(iter_json_items([json.dumps(single)])) == [single]
+    nested = {"meta": {"a": 1}, "items": [{"id": 5}]}
+    assert list(iter_json_items(chunked(json.dumps(nested), 4))) == [{"id": 5}]
+
+
+def test_detect_encoding():
+    assert detect_encoding("Фильм".encode("utf-8")) == "utf-8"
+    assert detect_encoding("Фильм".encode("cp1251")) == "cp1251"
+    # Многобайтовый символ, обрезанный на границе, не ломает определение
+    assert detect_encoding("Ф".encode("utf-8")[:1]) == "utf-8"
+
+
+def test_decoder_remembers_encoding_per_host():
+    decoder = ResponseDecoder()
+    body = json.dumps({"epg": [{"title": "Кино"}]}, ensure_ascii=False).encode("cp1251")
+    resp = BytesResponse(body)
+    assert list(decoder.iter_items(resp)) == [{"title": "Кино"}]
+    assert resp.closed
+    assert decoder.known_encoding("https://iptv.test/other") == "cp1251"
+    assert decoder.load(BytesResponse(body)) == {"epg": [{"title": "Кино"}]}
+
+
+def test_fetch_epg_cmd_streams_items_to_file(tmp_path: Path, monkeypatch):
+    from epg_collector import cli
+
+    items = [{"id": i, "title": f"Передача {i}"} for i in range(5)]
+    body = json.dumps({"epg": items}, ensure_ascii=False).encode("utf-8")
+
+    class Session:
+        def get(self, url, **kwargs):
+            assert kwargs.get("stream") is True
+            resp = BytesResponse(body)
+            resp.raise_for_status = lambda: None
+            resp.headers = {"Content-Type": "application/json"}
+            return resp
+
+    monkeypatch.setattr(cli, "RAW_PATH", tmp_path / "raw_epg.json")
+    monkeypatch.setattr(cli, "create_session", lambda cfg: Session())
+    cli.fetch_epg_cmd()
+    assert json.loads((tmp_path / "raw_epg.json").read_text(encoding="utf-8")) == items
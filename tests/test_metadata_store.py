@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import json
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+import requests
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from epg_collector.circuit_breaker import CircuitBreaker
+from epg_collector.config import load_config
+from epg_collector.kinopoisk import KinoPoiskClient
+from epg_collector.metadata_store import MetadataStore, TransientLookupError
+from epg_collector.tmdb import TMDBClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class JsonResponse:
+    def __init__(self, payload, status=200):
+        self.payload = payload
+        self.status_code = status
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self.payload
+
+
+class TMDBSession:
+    def __init__(self):
+        self.urls = []
+        self.fail = False
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        if self.fail:
+            raise requests.ConnectionError("down")
+        if "/search/movie" in url:
+            if "query=%D0%AD%D0%BA%D0%B8%D0%BF%D0%B0%D0%B6" in url:
+                return JsonResponse({"results": [
+                    {"id": 7, "title": "Экипаж", "release_date": "1979-01-01", "poster_path": "/p.jpg", "genre_ids": [18, 99]}
+                ]})
+            return JsonResponse({"results": []})
+        if "/genre/movie/list" in url:
+            return JsonResponse({"genres": [{"id": 18, "name": "драма"}, {"id": 28, "name": "боевик"}]})
+        return JsonResponse({
+            "genres": [{"name": "драма"}, {"name": "катастрофа"}],
+            "homepage": "https://example.test",
+            "external_ids": {"imdb_id": "tt0079131"},
+        })
+
+
+def test_store_ttl_negative_ttl_and_normalized_key(tmp_path: Path):
+    clock = FakeClock()
+    store = MetadataStore(tmp_path / "meta.sqlite", ttl=100, negative_ttl=10, clock=clock)
+    store.put("tmdb", "Ёлки!", 2025, {"name": "Ёлки"})
+    store.put("tmdb", "Неизвестное", None, None)
+    assert store.get("tmdb", "елки", 2025) == (True, {"name": "Ёлки"})
+    assert store.get("tmdb", "Ёлки", None) == (False, None)
+    assert store.get("tmdb", "неизвестное") == (True, None)
+
+    clock.now += 11
+    assert store.get("tmdb", "неизвестное") == (False, None)
+    assert store.get("tmdb", "Ёлки", 2025)[0]
+    clock.now += 100
+    assert store.purge_expired() == 2
+
+
+def test_lookup_does_not_store_failures(tmp_path: Path):
+    store = MetadataStore(tmp_path / "meta.sqlite")
+
+    def failing():
+        raise TransientLookupError("blocked")
+
+    with pytest.raises(TransientLookupError):
+        store.lookup("kinopoisk", "Фильм", None, failing)
+    assert store.lookup("kinopoisk", "Фильм", None, lambda: None) is None
+    assert store.lookup("kinopoisk", "Фильм", None, lambda: {"name": "x"}) is None
+    assert store.stats["negative_hits"] == 1 and store.stats["stored_negative"] == 1
+
+
+def test_tmdb_consults_store_before_network(tmp_path: Path):
+    cfg = replace(load_config(), tmdb_api_key="k")
+    store = MetadataStore(tmp_path / "meta.sqlite")
+    session = TMDBSession()
+    tmdb = TMDBClient(cfg, session, store=store)
+
+    info = tmdb.get_movie_info("Экипаж", year=2025)
+    assert info["name"] == "Экипаж" and info["genres"] == ["драма"]
+    assert tmdb.get_movie_info("ЭКИПАЖ", year=2025) == info
+    assert tmdb.get_movie_info("Нет такого") is None
+    assert tmdb.get_movie_info("Нет такого") is None
+    assert len(session.urls) == 3
+
+    session.fail = True
+    assert tmdb.get_poster_url("Другой") is None
+    with pytest.raises(requests.ConnectionError):
+        tmdb.find_poster_url("Другой")
+    session.fail = False
+    assert tmdb.find_poster_url("Экипаж") == cfg.tmdb_image_base.rstrip("/") + "/p.jpg"
+
+
+def test_kinopoisk_caches_definitive_misses_only(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cfg = replace(load_config(), kinopoisk_api_key=None)
+    store = MetadataStore(tmp_path / "meta.sqlite")
+    kp = KinoPoiskClient(cfg, session=None, web_breaker=CircuitBreaker("t", failure_threshold=100), store=store)
+    calls = []
+
+    def blocked(title):
+        calls.append(title)
+        from epg_collector.kinopoisk import _ScrapeBlocked
+
+        raise _ScrapeBlocked("search blocked by anti-bot")
+
+    monkeypatch.setattr(kp, "_scrape_web_once", blocked)
+    assert kp.get_movie_info("Фильм") is None
+    assert kp.get_movie_info("Фильм") is None
+    assert len(calls) == 2
+
+    monkeypatch.setattr(kp, "_scrape_web_once", lambda title: calls.append(title))
+    assert kp.get_movie_info("Фильм") is None
+    assert kp.get_movie_info("фильм") is None
+    assert len(calls) == 3
+
+
+def test_kinopoisk_migrates_file_cache_once(tmp_path: Path, monkeypatch):
+    from epg_collector.kinopoisk import LEGACY_SOURCE, _legacy_key
+
+    monkeypatch.chdir(tmp_path)
+    legacy = tmp_path / "cache" / "kinopoisk"
+    legacy.mkdir(parents=True)
+    good = {"name": "Экипаж", "year": 1979}
+    (legacy / f"{_legacy_key('Экипаж')}.json").write_text(json.dumps(good, ensure_ascii=False), encoding="utf-8")
+    (legacy / f"{_legacy_key('Капча')}.json").write_text(
+        json.dumps({"name": "Подтвердите, что запросы отправляли вы, а не робот"}, ensure_ascii=False),
+        encoding="utf-8",
+    )
+    (legacy / "broken.json").write_text("{", encoding="utf-8")
+
+    cfg = replace(load_config(), kinopoisk_api_key=None)
+    store = MetadataStore(tmp_path / "meta.sqlite")
+    kp = KinoPoiskClient(cfg, session=None, web_breaker=CircuitBreaker("t", failure_threshold=100), store=store)
+    assert not legacy.exists() and (tmp_path / "cache" / "kinopoisk.migrated").is_dir()
+    assert store.get(LEGACY_SOURCE, _legacy_key("Капча"), count=False) == (False, None)
+    # Перенесённые записи не истекают вместе с METADATA_TTL_DAYS
+    store._clock = lambda: 1e10
+    assert store.get(LEGACY_SOURCE, _legacy_key("Экипаж"), count=False) == (True, good)
+    store._clock = time.time
+
+    calls = []
+    monkeypatch.setattr(kp, "_scrape_web_once", lambda title: calls.append(title))
+    assert kp.get_movie_info("  экипаж ") == good
+    assert kp.get_movie_info("Капча") is None
+    assert calls == ["Капча"]
+
+
+def test_export_import_round_trip(tmp_path: Path):
+    clock = FakeClock()
+    src = MetadataStore(tmp_path / "a.sqlite", ttl=100, negative_ttl=10, clock=clock)
+    src.put("tmdb:ru-RU", "Экипаж", 1979, {"name": "Экипаж"})
+    src.put("kinopoisk", "Нет такого", None, None)
+    src.put("kinopoisk", "Экипаж", None, {"name": "Экипаж"})
+    assert src.export_jsonl(tmp_path / "kp.jsonl", source="kinopoisk") == 2
+    assert src.export_jsonl(tmp_path / "all.jsonl") == 3
+
+    dst = MetadataStore(tmp_path / "b.sqlite", clock=clock)
+    assert dst.import_jsonl(tmp_path / "all.jsonl") == 3
+    assert dst.get("tmdb:ru-RU", "экипаж", 1979) == (True, {"name": "Экипаж"})
+    assert dst.get("kinopoisk", "Нет такого") == (True, None)
+    # Сроки жизни переносятся как есть, а не отсчитываются заново
+    clock.now += 11
+    assert dst.get("kinopoisk", "Нет такого") == (False, None)
+    assert dst.get("kinopoisk", "Экипаж") == (True, {"name": "Экипаж"})
+
+
+def test_tmdb_memo_serves_poster_and_info_from_one_search(tmp_path: Path):
+    cfg = replace(load_config(), tmdb_api_key="k")
+    session = TMDBSession()
+    tmdb = TMDBClient(cfg, session, store=MetadataStore(tmp_path / "meta.sqlite"))
+
+    assert tmdb.get_movie_info("Экипаж")["poster_url"].endswith("/p.jpg")
+    assert tmdb.get_poster_url("экипаж ").endswith("/p.jpg")
+    assert len(session.urls) == 2
+    assert tmdb.memo.stats() == {"requests": 2, "saved": 1}
+
+    # Ошибки не запоминаются: после восстановления сети запрос повторяется
+    session.fail = True
+    with pytest.raises(requests.ConnectionError):
+        tmdb.find_poster_url("Другой")
+    session.fail = False
+    assert tmdb.find_poster_url("Другой") is None
+    assert tmdb.memo.stats() == {"requests": 4, "saved": 1}
+
+
+def test_tmdb_memo_single_flight_across_threads():
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    from epg_collector.tmdb import TMDBLookupMemo
+
+    memo = TMDBLookupMemo()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return ["result"]
+
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        futures = [ex.submit(memo.get, ("search", "q", None, "ru-RU"), fetch) for _ in range(4)]
+        release.set()
+        assert [f.result() for f in futures] == [["result"]] * 4
+    assert len(calls) == 1
+    assert memo.stats() == {"requests": 1, "saved": 3}
+
+
+def test_tmdb_genres_from_cached_list_and_details_opt_in(tmp_path: Path):
+    cfg = replace(load_config(), tmdb_api_key="k", tmdb_details=False)
+    store = MetadataStore(tmp_path / "meta.sqlite")
+    session = TMDBSession()
+    info = TMDBClient(cfg, session, store=store).get_movie_info("Экипаж")
+    assert info["genres"] == ["драма"] and info["url"] is None and "imdb_id" not in info
+    assert not any("/movie/7" in u for u in session.urls)
+
+    # Список жанров берётся из хранилища и в следующем прогоне не запрашивается
+    session.urls.clear()
+    TMDBClient(cfg, session, store=store).get_movie_info("Экипаж", year=1979)
+    assert len(session.urls) == 1 and "/search/movie" in session.urls[0]
+
+    session.urls.clear()
+    detailed = TMDBClient(replace(cfg, tmdb_details=True), session, store=store).get_movie_info("Экипаж", year=1980)
+    assert detailed["genres"] == ["драма", "катастрофа"]
+    assert detailed["url"] == "https://example.test" and detailed["imdb_id"] == "tt0079131"
+    assert sum("append_to_response=external_ids" in u for u in session.urls) == 1
+
+
+def test_tmdb_partial_info_is_not_stored_when_genre_list_fails(tmp_path: Path):
+    cfg = replace(load_config(), tmdb_api_key="k", tmdb_details=False)
+    store = MetadataStore(tmp_path / "meta.sqlite")
+
+    class GenresDown(TMDBSession):
+        def get(self, url, **kwargs):
+            if "/genre/movie/list" in url and self.genres_down:
+                self.urls.append(url)
+                raise requests.ConnectionError("down")
+            return super().get(url, **kwargs)
+
+    session = GenresDown()
+    session.genres_down = True
+    info = TMDBClient(cfg, session, store=store).get_movie_info("Экипаж")
+    # Неполная запись доступна в этом прогоне, но не сохраняется
+    assert info["name"] == "Экипаж" and info["genres"] is None
+    assert store.get("tmdb:ru-RU", "Экипаж", None, count=False) == (False, None)
+
+    session.genres_down = False
+    info = TMDBClient(cfg, session, store=store).get_movie_info("Экипаж")
+    assert info["genres"] == ["драма"]
+    assert store.get("tmdb:ru-RU", "Экипаж", None, count=False)[0]
+
+
+def test_kinopoisk_migration_failure_falls_back_to_network(tmp_path: Path, monkeypatch, caplog):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "cache" / "kinopoisk").mkdir(parents=True)
+    (tmp_path / "cache" / "kinopoisk" / "x.json").write_text('{"name": "X"}', encoding="utf-8")
+
+    class BrokenStore(MetadataStore):
+        def put_many(self, *args, **kwargs):
+            raise RuntimeError("database is locked")
+
+    cfg = replace(load_config(), kinopoisk_api_key=None)
+    kp = KinoPoiskClient(cfg, session=None, store=BrokenStore(tmp_path / "meta.sqlite"))
+    monkeypatch.setattr(kp, "_scrape_web_once", lambda title: {"name": title})
+    assert kp.get_movie_info("Фильм") == {"name": "Фильм"}
+    assert "Не удалось перенести" in caplog.text
+    assert (tmp_path / "cache" / "kinopoisk").is_dir()
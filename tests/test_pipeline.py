@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from epg_collector.pipeline import Pipeline, Stage
+
+
+def test_pipeline_runs_all_stages_and_collects_stats():
+    pipeline = Pipeline([
+        Stage("lookup", lambda x: x * 10, workers=3),
+        Stage("select", lambda x: x + 1),
+        Stage("download", lambda x: -x, workers=2),
+    ])
+    results = dict(pipeline.run(range(20)))
+    assert results == {i: -(i * 10 + 1) for i in range(20)}
+    metrics = pipeline.metrics()
+    assert list(metrics) == ["lookup", "select", "download"]
+    assert all(m["processed"] == 20 and m["errors"] == 0 for m in metrics.values())
+    assert metrics["lookup"]["workers"] == 3
+    assert len(pipeline.describe()) == 3
+
+
+def test_slow_download_backpressures_lookup():
+    looked_up = []
+    release = threading.Event()
+
+    def lookup(x):
+        looked_up.append(x)
+        return x
+
+    def download(x):
+        release.wait(5)
+        return x
+
+    pipeline = Pipeline([
+        Stage("lookup", lookup, workers=2, queue_size=2),
+        Stage("download", download, workers=1, queue_size=2),
+    ])
+    results = []
+
+    def consume():
+        results.extend(pipeline.run(range(50)))
+
+    t = threading.Thread(target=consume)
+    t.start()
+    time.sleep(0.5)
+    # Поиск упёрся в заполненную очередь загрузки, а не прочитал весь вход
+    assert len(looked_up) < 10
+    release.set()
+    t.join(10)
+    assert sorted(i for i, _ in results) == list(range(50))
+    assert pipeline.stats["download"].max_depth <= 2
+
+
+def test_stage_error_propagates_and_stops_pipeline():
+    def boom(x):
+        if x == 3:
+            raise ValueError("плохой элемент")
+        return x
+
+    pipeline = Pipeline([Stage("lookup", boom, workers=2), Stage("write", lambda x: x)])
+    with pytest.raises(ValueError, match="плохой элемент"):
+        for _ in pipeline.run(range(100)):
+            pass
+    assert pipeline.stats["lookup"].errors == 1
+
+
+def test_ordered_run_keeps_input_order_within_window():
+    fed = []
+
+    def source():
+        for i in range(40):
+            fed.append(i)
+            yield i
+
+    def lookup(x):
+        # Первый элемент заметно медленнее остальных
+        time.sleep(0.3 if x == 0 else 0.001)
+        return x
+
+    pipeline = Pipeline([Stage("lookup", lookup, workers=4), Stage("download", lambda x: x * 2, workers=2)])
+    results = []
+    for i, value in pipeline.run(source(), ordered=True, window=5):
+        if i == 0:
+            # Пока нулевой элемент не выдан, источник не ушёл дальше окна
+            assert len(fed) <= 5
+        results.append((i, value))
+    assert results == [(i, i * 2) for i in range(40)]
+    assert 1 <= pipeline.reorder_max <= 5
+
+
+def test_enrich_movies_parallel_streams_in_input_order(tmp_path: Path):
+    from epg_collector.services.enrichment_service import EnrichmentService
+
+    class FakeKinoPoisk:
+        def get_movie_info(self, title):
+            if title == "Сломанный":
+                raise RuntimeError("нет ответа")
+            time.sleep(0.05 if title == "Первый" else 0.001)
+            return {"name": title}
+
+    service = EnrichmentService.__new__(EnrichmentService)
+    service.data_dir = tmp_path
+    service.session = None
+    service.tmdb_client = None
+    service.kinopoisk_client = FakeKinoPoisk()
+    service.pipeline_metrics = None
+    service._save_run_metrics = lambda: None
+    movies = [{"id": 0, "title": "Первый"}, {"id": 1, "title": "Сломанный"}, {"id": 2, "title": ""}]
+    movies += [{"id": i, "title": f"Фильм {i}"} for i in range(3, 20)]
+
+    assert service.enrich_movies_parallel(movies, max_workers=4, window=6) == 20
+    out = json.loads((tmp_path / "enriched_movies.json").read_text(encoding="utf-8"))
+    assert [m["id"] for m in out] == list(range(20))
+    assert out[0]["kinopoisk"] == {"name": "Первый"}
+    assert "kinopoisk" not in out[1] and "kinopoisk" not in out[2]
+    assert service.pipeline_metrics["reorder"]["window"] == 6
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import io
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from epg_collector.http_client import RateLimitedAdapter
+from epg_collector.rate_limit import HostRateLimiter, TokenBucket, parse_rate_limits, parse_retry_after
+
+
+def test_parse_helpers():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_rate_limits("api.themoviedb.org=40, image.tmdb.org=100,bad") == {
+        "api.themoviedb.org": 40.0,
+        "image.tmdb.org": 100.0,
+    }
+
+
+def test_token_bucket_paces_after_burst():
+    bucket = TokenBucket(rate=50, burst=1)
+    started = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    # 1 токен сразу + 5 по 20 мс
+    assert time.monotonic() - started >= 0.09
+
+
+def test_throttle_pauses_whole_host():
+    limiter = HostRateLimiter()
+    limiter.acquire("https://api.themoviedb.org/3/search/movie")
+    limiter.throttled("https://api.themoviedb.org/3/x", "0.2", default=1.0)
+    started = time.monotonic()
+    limiter.acquire("https://api.themoviedb.org/3/movie/1")
+    assert time.monotonic() - started >= 0.15
+    stats = limiter.stats["api.themoviedb.org"]
+    assert stats["requests"] == 2 and stats["throttled"] == 1
+    # Другие хосты паузой не затронуты
+    started = time.monotonic()
+    limiter.acquire("https://image.tmdb.org/t/p/w500/x.jpg")
+    assert time.monotonic() - started < 0.05
+
+
+def test_adapter_retries_429_with_retry_after(monkeypatch):
+    statuses = [429, 200]
+
+    def fake_send(self, request, **kwargs):
+        resp = requests.Response()
+        resp.status_code = statuses.pop(0)
+        resp.headers["Retry-After"] = "0"
+        resp.url = request.url
+        resp.raw = io.BytesIO(b"")
+        return resp
+
+    monkeypatch.setattr(HTTPAdapter, "send", fake_send)
+    limiter = HostRateLimiter()
+    session = requests.Session()
+    session.mount("https://", RateLimitedAdapter(limiter, throttle_retries=2))
+    resp = session.get("https://api.themoviedb.org/3/search/movie")
+    assert resp.status_code == 200
+    assert limiter.stats["api.themoviedb.org"]["throttled"] == 1
+
+
+def test_session_from_directly_built_config():
+    from epg_collector.config import Config
+    from epg_collector.http_client import create_session
+
+    cfg = Config(
+        iptv_base_url="https://iptv.test", iptv_params={}, iptv_headers={},
+        playlist_base_url="https://pl.test", playlist_params={}, playlist_headers={}, playlist_form={},
+        cache_enabled=False,
+    )
+    assert cfg.rate_limits == {} and cfg.cache_rules == {} and cfg.epg_buckets == {}
+    create_session(cfg).close()
+    HostRateLimiter().configure(None)
+
+
+def test_session_retries_429_with_retry_after_only_in_adapter():
+    import threading
+    from dataclasses import replace
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    from epg_collector.config import load_config
+    from epg_collector.http_client import create_session
+    from epg_collector.rate_limit import get_rate_limiter
+
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            hits.append(self.path)
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = f"127.0.0.1:{server.server_address[1]}"
+    cfg = replace(load_config(), cache_enabled=False, http_retries=2, http_backoff=0, rate_limits={}, rate_limit_default=0.0)
+    try:
+        resp = create_session(cfg).get(f"http://{host}/x")
+    finally:
+        server.shutdown()
+    assert resp.status_code == 429
+    # Первая попытка и два повтора адаптера — urllib3 сам ничего не повторяет
+    assert len(hits) == 3
+    stats = get_rate_limiter().stats[host]
+    assert stats["requests"] == 3 and stats["throttled"] == 2
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from epg_collector import serialization
+
+
+def test_write_json_compact_by_default_and_roundtrip(tmp_path: Path):
+    obj = {"our_id": "10", "epg": [{"id": 1, "title": "Фильм", "category": ["Х/ф"]}]}
+    path = tmp_path / "out.json"
+    serialization.write_json(path, obj)
+
+    raw = path.read_text(encoding="utf-8")
+    assert "\n" not in raw
+    assert "Фильм" in raw  # без \u-экранирования
+    assert serialization.read_json(path) == obj
+    assert json.loads(raw) == obj
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_pretty_mode_is_opt_in(tmp_path: Path):
+    try:
+        serialization.set_pretty(True)
+        assert b"\n  " in serialization.dumps({"a": [1]})
+        assert b"\n" not in serialization.dumps({"a": [1]}, pretty=False)
+    finally:
+        serialization.set_pretty(False)
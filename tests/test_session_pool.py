@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from epg_collector.config import load_config
+from epg_collector.http_client import SessionPool
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"{}"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_pool_reuses_connections_across_files():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/x"
+    cfg = replace(load_config(), cache_enabled=False)
+    pool = SessionPool(cfg, size=2)
+
+    def process_file(_i: int) -> None:
+        with pool.session() as sess:
+            for _ in range(5):
+                sess.get(url).content
+
+    try:
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            list(ex.map(process_file, range(10)))
+        stats = pool.connection_stats()["127.0.0.1"]
+        assert len(pool._sessions) <= 2
+        assert stats["requests"] == 50
+        # Не больше одного соединения на сессию, а не на каждый «файл»
+        assert stats["connections"] <= 2
+    finally:
+        pool.close()
+        server.shutdown()